@@ -5,11 +5,24 @@ Web interface for querying the animal shelter database with natural language
 
 import streamlit as st
 import json
-import duckdb
 import requests
-import re
+import time
+import uuid
 from pathlib import Path
 
+import ollama_client
+import result_export
+from db_pool import DuckDBCursorPool, PoolExhaustedError
+from llm_scheduler import LLMScheduler, SchedulerBusyError
+from ollama_client import OLLAMA_MODEL, OLLAMA_URL, OllamaClient
+from prompt_retrieval import PromptRetriever
+from query_executor import GuardedExecutor, QueryRejectedError, QueryTimeoutError
+from request_metrics import RequestMetrics, RequestTrace
+from result_cache import QueryResultCache, sql_hash
+from result_digest import build_result_digest
+from rollups import RollupRouter
+from sql_cache import QuestionSQLCache, normalize_question
+
 # Set page config
 st.set_page_config(
     page_title="Animal Shelter Analytics Agent",
@@ -40,8 +53,27 @@ DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
 SCHEMA_PATH = PROJECT_DIR / "MINDSDB_SCHEMA_CONTEXT.txt"
 AGENT_CONFIG_PATH = PROJECT_DIR / "mindsdb_agent_config.json"
 
-OLLAMA_URL = "http://127.0.0.1:11434"
-OLLAMA_MODEL = "mistral:latest"
+OLLAMA_STREAM = True  # Stream tokens and stop generation once the SQL is complete
+REUSE_PROMPT_PREFIX = True  # Evaluate the system prompt once and reuse its context tokens
+USE_PROMPT_RETRIEVAL = True  # Send only the schema/rules/examples relevant to each question
+USE_ROLLUPS = True  # Answer matching aggregate queries from the pre-aggregated rollup tables
+
+# Guardrails for LLM-generated SQL
+QUERY_TIMEOUT_SECONDS = 30
+QUERY_MEMORY_LIMIT = "2GB"
+MAX_DISPLAY_ROWS = 10_000
+
+# LLM scheduler shared by all sessions
+LLM_MAX_CONCURRENT = 2  # generations sent to Ollama at the same time
+LLM_MAX_QUEUED = 32  # waiting requests before new ones are refused
+
+# DuckDB cursor pool shared by all sessions
+DB_POOL_SIZE = 8  # queries that can run at the same time
+DB_THREADS = None  # DuckDB worker threads shared by all queries (None = one per core)
+
+# Per-request latency instrumentation
+METRICS_LOG_PATH = PROJECT_DIR / "logs" / "request_metrics.jsonl"  # rotated JSON lines
+METRICS_PORT = 9464  # Prometheus text endpoint at http://127.0.0.1:9464/metrics (None = off)
 
 # Load configuration
 @st.cache_resource
@@ -69,19 +101,15 @@ def load_configuration():
 
 # Connect to database with retry logic
 @st.cache_resource
-def get_db_connection():
-    """Create and cache database connection with retry logic"""
-    import time
-    
+def get_db_pool():
+    """Open the database read-only once and create the cursor pool, with retry logic"""
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            # Try to connect in read-only mode first
-            conn = duckdb.connect(str(DB_PATH), read_only=True)
-            # Test the connection
-            conn.execute("SELECT 1").fetchone()
+            # The pool opens the database read-only and tests the connection
+            pool = DuckDBCursorPool(DB_PATH, max_cursors=DB_POOL_SIZE, threads=DB_THREADS)
             st.success("✓ Database connected successfully")
-            return conn
+            return pool
         except Exception as e:
             if attempt < max_retries - 1:
                 st.warning(f"Attempt {attempt + 1} failed, retrying in 2 seconds...")
@@ -91,82 +119,127 @@ def get_db_connection():
                 st.info("**Solution**: Close the Jupyter notebook in VS Code and refresh this page")
                 return None
 
-# ==============================================================================
-# SQL POST-PROCESSING TO FIX COMMON MISTRAL ERRORS
-# ==============================================================================
+# Persistent question -> SQL cache shared by all sessions
+@st.cache_resource
+def get_sql_cache(prompt_version):
+    """Create the question -> SQL cache and drop entries from older prompt versions"""
+    cache = QuestionSQLCache()
+    cache.purge_other_versions(prompt_version)
+    return cache
 
-def fix_common_sql_errors(sql):
-    """Fix common column name mistakes made by Mistral"""
-    import re
-    
-    # Fix gender-related column errors
-    # s.gender -> s.sex_upon_outcome
-    sql = re.sub(r'\bs\.gender\b', 's.sex_upon_outcome', sql, flags=re.IGNORECASE)
-    # s.sex_name -> s.sex_upon_outcome
-    sql = re.sub(r'\bs\.sex_name\b', 's.sex_upon_outcome', sql, flags=re.IGNORECASE)
-    # s.sex_on_outcome -> s.sex_upon_outcome
-    sql = re.sub(r'\bs\.sex_on_outcome\b', 's.sex_upon_outcome', sql, flags=re.IGNORECASE)
-    
-    # Fix ambiguous sex_key references (add table prefix if missing)
-    # GROUP BY sex_key -> GROUP BY s.sex_key (when s alias is used)
-    sql = re.sub(r'GROUP BY\s+sex_key\b', 'GROUP BY s.sex_key', sql, flags=re.IGNORECASE)
-    
-    # Fix date_key issues for date joins
-    # f.date_key -> f.outcome_date_key
-    sql = re.sub(r'\bf\.date_key\b', 'f.outcome_date_key', sql, flags=re.IGNORECASE)
-    
-    return sql
+# Query result cache, invalidated whenever the DuckDB file is rebuilt
+@st.cache_resource
+def get_result_cache():
+    """Create the query result cache tied to the database fingerprint"""
+    return QueryResultCache(DB_PATH)
+
+# Guarded executor: plan pre-check, timeout, memory limit and row cap
+@st.cache_resource
+def get_query_executor():
+    """Create the guarded executor for generated SQL"""
+    return GuardedExecutor(
+        timeout_seconds=QUERY_TIMEOUT_SECONDS,
+        memory_limit=QUERY_MEMORY_LIMIT,
+        max_rows=MAX_DISPLAY_ROWS
+    )
+
+# Router to the rollup tables built by build_star_schema_tables.ipynb
+@st.cache_resource
+def get_rollup_router():
+    """Load the rollup catalog once; the router is disabled if no rollups exist"""
+    with get_db_pool().cursor() as cursor:
+        return RollupRouter(cursor)
+
+# Shared Ollama client: pooled session, background health probe, preloaded model
+@st.cache_resource
+def get_ollama_client():
+    """Create the Ollama client once per server process and warm up the model"""
+    client = OllamaClient(OLLAMA_URL, OLLAMA_MODEL)
+    client.check_health()
+    client.start_health_probe(interval=15)
+    client.preload_model_async()
+    return client
+
+# Retrieval index over schema sections, rules and few-shot examples
+@st.cache_resource
+def get_prompt_retriever(system_prompt, schema_context):
+    """Build the BM25 prompt index once per prompt / schema text"""
+    return PromptRetriever(system_prompt, schema_context)
+
+# Evaluate the static system prompt once per config version
+@st.cache_resource
+def warm_prompt_prefix(static_prompt, prompt_version):
+    """Prime the cached system prompt context in the background"""
+    return get_ollama_client().prime_prefix_async(
+        ollama_client.build_sql_prefix(static_prompt), prompt_version
+    )
+
+# Every LLM call goes through one scheduler: bounded, fair, deduplicated
+@st.cache_resource
+def get_llm_scheduler():
+    """Create the scheduler in front of Ollama once per server process"""
+    return LLMScheduler(max_concurrent=LLM_MAX_CONCURRENT, max_queued=LLM_MAX_QUEUED)
+
+# Request timings shared by all sessions: JSONL log, Prometheus endpoint, sidebar panel
+@st.cache_resource
+def get_request_metrics():
+    """Create the metrics collector and start its /metrics endpoint once per server process"""
+    metrics = RequestMetrics(METRICS_LOG_PATH)
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+    return metrics
+
+def get_session_id():
+    """Identifier of the browser session, used for fair queueing"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def wait_for_flight(flight, placeholder, poll_interval=0.2):
+    """Show the queue position while a scheduled LLM call waits, then return its result"""
+    while not flight.done():
+        ahead = flight.position()
+        if ahead:
+            placeholder.info(f"⏳ Waiting for the model - {ahead} request(s) ahead of you")
+        else:
+            placeholder.empty()
+        time.sleep(poll_interval)
+    placeholder.empty()
+    return flight.result()
 
 # ==============================================================================
 # MISTRAL TEXT-TO-SQL FUNCTION
 # ==============================================================================
 
-def mistral_text_to_sql(question, schema_context, system_prompt):
+def mistral_text_to_sql(question, schema_context, system_prompt, prompt_version=None, retriever=None,
+                        trace=None):
     """Generate SQL from natural language using Mistral via Ollama"""
     
-    prompt = f"""{system_prompt}
-
-Question: {question}
-
-Generate SQL query:"""
-    
+    # Filled in by the worker thread; stays empty if this request joined another one's generation
+    stats = {}
     try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "temperature": 0.3
-        }
-        
-        response = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json=payload,
-            timeout=60
+        # Streams and stops as soon as a complete statement has arrived;
+        # common Mistral column mistakes are fixed by the shared helper.
+        # Identical questions in flight from other sessions share one generation.
+        flight = get_llm_scheduler().submit(
+            ("sql", prompt_version, normalize_question(question)),
+            ollama_client.mistral_text_to_sql,
+            get_ollama_client(), question, system_prompt, timeout=60, stream=OLLAMA_STREAM,
+            prefix_version=prompt_version if REUSE_PROMPT_PREFIX else None,
+            retriever=retriever,
+            stats=stats,
+            session=get_session_id()
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            generated_text = result['response'].strip()
-            
-            # Extract SQL from response
-            sql_match = re.search(r'```(?:sql)?\s*(SELECT.*?);?\s*```', generated_text, re.DOTALL | re.IGNORECASE)
-            
-            if not sql_match:
-                sql_match = re.search(r'(SELECT\s+.*?;)', generated_text, re.DOTALL | re.IGNORECASE)
-            
-            if sql_match:
-                sql = sql_match.group(1)
-                sql = sql.replace('```', '').strip()
-                if not sql.endswith(';'):
-                    sql += ';'
-                # Post-process SQL to fix common Mistral mistakes
-                sql = fix_common_sql_errors(sql)
-                return sql
-            else:
-                return None
-        else:
-            return None
+        generated_sql = wait_for_flight(flight, st.empty())
+        if trace is not None:
+            trace.add_stage("llm_queue", flight.started_at - flight.submitted_at)
+            trace.add_llm_call("sql", stats, split_stages=True)
+            trace.set(sql_generation_shared=not stats)
+        return generated_sql
             
+    except SchedulerBusyError as e:
+        st.error(str(e))
+        return None
     except requests.exceptions.ConnectionError:
         st.error("Cannot connect to Ollama. Make sure Ollama server is running on port 11434")
         return None
@@ -178,15 +251,16 @@ Generate SQL query:"""
 # NATURAL LANGUAGE RESPONSE GENERATION
 # ==============================================================================
 
-def generate_natural_language_response(question, sql_query, result_df):
-    """Generate a natural language summary of the query results"""
+def generate_natural_language_response(client, question, sql_query, result_df, on_token=None, stats=None):
+    """Generate a natural language summary of the query results
     
-    # Convert dataframe to a readable format for the prompt
-    results_summary = result_df.to_string(index=False)
+    `client` is passed in explicitly because this runs on a worker thread.
+    `on_token` receives the partial summary as it streams in, so the UI can
+    render it progressively. `stats` receives the generation stats.
+    """
     
-    # Limit the results if too large
-    if len(results_summary) > 2000:
-        results_summary = results_summary[:2000] + "\n... (truncated)"
+    # Shape, types, top rows and statistics instead of the formatted table
+    results_summary = build_result_digest(result_df)
     
     prompt = f"""You are a helpful data analyst. A user asked this question:
 "{question}"
@@ -194,7 +268,7 @@ def generate_natural_language_response(question, sql_query, result_df):
 This SQL query was executed:
 {sql_query}
 
-And produced these results:
+And produced these results (digest):
 {results_summary}
 
 Provide a clear, concise, and human-friendly summary of what these results show. 
@@ -204,31 +278,102 @@ Provide a clear, concise, and human-friendly summary of what these results show.
 - Include specific numbers/percentages where relevant"""
     
     try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "temperature": 0.5  # Slightly higher temp for more natural language
-        }
-        
-        response = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            summary = result['response'].strip()
-            return summary
-        else:
-            return None
+        # Slightly higher temp for more natural language
+        return client.generate(
+            prompt, temperature=0.5, timeout=60, stream=OLLAMA_STREAM, on_token=on_token, stats=stats
+        ) or None
             
     except requests.exceptions.ConnectionError:
         return None
     except Exception as e:
         return None
 
+def start_summary(question, sql_query, result_df, stats=None):
+    """Schedule summary generation in the background
+    
+    Returns the scheduler flight; its `partial` attribute holds the text
+    streamed so far. The worker thread never touches Streamlit elements;
+    the script thread reads the partial text and renders it. Returns None
+    if the scheduler queue is full.
+    """
+    try:
+        return get_llm_scheduler().submit(
+            ("summary", question, sql_query),
+            generate_natural_language_response,
+            get_ollama_client(), question, sql_query, result_df,
+            stats=stats, session=get_session_id(), track_partial=True
+        )
+    except SchedulerBusyError:
+        return None
+
+def render_summary_when_ready(flight, placeholder, trace=None, stats=None, poll_interval=0.2):
+    """Fill the summary placeholder progressively until the background call finishes
+    
+    The time until the summary is complete is booked on `trace` as the summary stage.
+    """
+    if flight is None:
+        placeholder.info("(The model is busy - no summary this time)")
+        return
+    shown = ""
+    while not flight.done():
+        ahead = flight.position()
+        if ahead:
+            placeholder.info(f"⏳ Summary queued - {ahead} request(s) ahead of you")
+        elif flight.partial != shown:
+            shown = flight.partial
+            placeholder.info(shown + " ▌")
+        time.sleep(poll_interval)
+    
+    summary = flight.result()
+    if trace is not None:
+        # Measured from submission: the summary runs while the rest of the page renders
+        trace.add_stage("summary", time.monotonic() - flight.submitted_at)
+        trace.add_llm_call("summary", stats)
+    if summary:
+        placeholder.info(summary)
+    else:
+        placeholder.info("(Unable to generate summary at this time)")
+
+@st.fragment
+def render_export_controls(sql_query):
+    """Export the full query result on demand
+    
+    Nothing is serialized until the user asks for a download. Running as a
+    fragment, the buttons rerun only this block instead of the whole page.
+    """
+    key = sql_hash(sql_query)
+    col_format, col_action = st.columns([1, 3])
+    with col_format:
+        export_format = st.selectbox(
+            "Export format", result_export.available_formats(),
+            key=f"export_format_{key}", label_visibility="collapsed"
+        )
+    with col_action:
+        path = result_export.export_path(DB_PATH, sql_query, export_format)
+        if not path.exists():
+            if not st.button("📦 Prepare download", key=f"export_{key}"):
+                return
+            try:
+                with st.spinner(f"Exporting results as {export_format}..."):
+                    result_export.cleanup_exports(DB_PATH)
+                    with get_db_pool().cursor() as cursor:
+                        path = result_export.export_query(
+                            cursor, sql_query, export_format, DB_PATH,
+                            executor=get_query_executor()
+                        )
+            except Exception as e:
+                st.error(f"Export failed: {str(e)[:200]}")
+                return
+        extension, mime = result_export.EXPORT_FORMATS[export_format]
+        with open(path, "rb") as f:
+            st.download_button(
+                label=f"📥 Download Results as {export_format}",
+                data=f,
+                file_name=f"query_results{extension}",
+                mime=mime,
+                key=f"download_{key}"
+            )
+
 # ==============================================================================
 # PAGE LAYOUT
 # ==============================================================================
@@ -242,11 +387,25 @@ try:
     config = load_configuration()
     if config is None:
         st.stop()
-    conn = get_db_connection()
-    if conn is None:
+    db_pool = get_db_pool()
+    if db_pool is None:
         st.stop()
     system_prompt = config['agent_config']['system_prompt']
     schema_context = config['schema_context']
+    if USE_PROMPT_RETRIEVAL:
+        prompt_retriever = get_prompt_retriever(system_prompt, schema_context)
+        static_prompt = prompt_retriever.static_prompt
+        # Retrieval changes the prompt layout, so it gets its own cache namespace
+        prompt_version = f"{config['agent_config'].get('version', 'unknown')}+retrieval"
+    else:
+        prompt_retriever = None
+        static_prompt = system_prompt
+        prompt_version = config['agent_config'].get('version', 'unknown')
+    sql_cache = get_sql_cache(prompt_version)
+    result_cache = get_result_cache()
+    query_executor = get_query_executor()
+    if REUSE_PROMPT_PREFIX:
+        warm_prompt_prefix(static_prompt, prompt_version)
 except Exception as e:
     st.error(f"Error loading configuration: {e}")
     st.info("**Solution**: \n1. Close the Jupyter notebook (`create_mindsdb_agent.ipynb`) in VS Code\n2. Refresh this browser page\n3. Try again")
@@ -277,25 +436,43 @@ with col1:
 
 with col2:
     st.markdown("#### System Status")
-    try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=2)
-        if response.status_code == 200:
-            st.success("✓ Ollama Ready")
-        else:
-            st.error("✗ Ollama Error")
-    except:
+    # Health state is refreshed by the client's background prober
+    ollama_health = get_ollama_client().health()
+    if ollama_health['ok']:
+        st.success("✓ Ollama Ready")
+    elif ollama_health['error'] and ollama_health['error'].startswith("HTTP"):
+        st.error("✗ Ollama Error")
+    else:
         st.error("✗ Ollama Down")
 
 st.markdown("---")
 
+# Summary still being generated in the background (filled in at the end of the script)
+pending_summary = None
+# Timings of the question being answered (recorded at the end of the script)
+request_trace = None
+
 # Process question
 if question:
+    request_trace = RequestTrace(question)
     with st.spinner("🔄 Generating SQL query..."):
-        # Generate SQL
-        generated_sql = mistral_text_to_sql(question, schema_context, system_prompt)
+        # Reuse SQL generated earlier for the same question and prompt version
+        generated_sql = sql_cache.get(question, prompt_version)
+        sql_from_cache = generated_sql is not None
+        request_trace.set(sql_cache_hit=sql_from_cache)
+        if not sql_from_cache:
+            generated_sql = mistral_text_to_sql(
+                question, schema_context, system_prompt, prompt_version, prompt_retriever,
+                trace=request_trace
+            )
+            if generated_sql:
+                sql_cache.put(question, prompt_version, generated_sql)
         
         if generated_sql:
-            st.success("✓ SQL generated successfully!")
+            if sql_from_cache:
+                st.success("✓ SQL loaded from cache!")
+            else:
+                st.success("✓ SQL generated successfully!")
             
             # Display the generated SQL
             with st.expander("📝 View Generated SQL", expanded=False):
@@ -303,44 +480,66 @@ if question:
             
             # Execute the query
             try:
-                with st.spinner("📊 Executing query..."):
-                    if conn is None:
-                        st.error("Database connection lost")
-                    else:
-                        result_df = conn.execute(generated_sql).df()
+                with st.spinner("📊 Executing query..."), request_trace.stage("execution"):
+                    result_df = result_cache.get(generated_sql)
+                    request_trace.set(result_cache_hit=result_df is not None)
+                    if result_df is None:
+                        # Read a pre-aggregated rollup instead of the fact table when possible
+                        routed = get_rollup_router().route(generated_sql) if USE_ROLLUPS else None
+                        if routed is not None:
+                            executed_sql, rollup_name = routed
+                            request_trace.set(rollup=rollup_name)
+                            st.caption(f"⚡ Answered from pre-aggregated table `{rollup_name}`")
+                        else:
+                            executed_sql = generated_sql
+                        # Each query runs on its own pooled cursor, in parallel with other sessions
+                        with db_pool.cursor() as cursor:
+                            result_df, truncated = query_executor.execute(cursor, executed_sql)
+                        result_df.attrs['truncated'] = truncated
+                        result_cache.put(generated_sql, result_df)
+                request_trace.set(rows=len(result_df), truncated=bool(result_df.attrs.get('truncated')),
+                                  status="ok" if len(result_df) else "empty")
                 
                 if len(result_df) == 0:
                     st.warning("Query returned no results")
                 else:
-                    st.success(f"✓ Query returned {len(result_df)} rows")
+                    if result_df.attrs.get('truncated'):
+                        st.success(f"✓ Query returned more than {MAX_DISPLAY_ROWS:,} rows - showing the first {len(result_df):,}")
+                    else:
+                        st.success(f"✓ Query returned {len(result_df)} rows")
                     
-                    # Generate and display natural language summary FIRST
+                    # Start the summary in the background; its placeholder stays at the top
                     st.markdown("### 💬 Summary")
-                    with st.spinner("✨ Generating summary..."):
-                        summary = generate_natural_language_response(question, generated_sql, result_df)
-                        if summary:
-                            st.info(summary)
-                        else:
-                            st.info("(Unable to generate summary at this time)")
+                    summary_placeholder = st.empty()
+                    summary_placeholder.info("✨ Generating summary...")
+                    summary_stats = {}
+                    summary_flight = start_summary(question, generated_sql, result_df, summary_stats)
+                    pending_summary = (summary_flight, summary_placeholder, request_trace, summary_stats)
                     
                     st.markdown("---")
                     
                     # Display results table
                     st.markdown("### Results")
-                    st.dataframe(result_df, use_container_width=True)
+                    with request_trace.stage("render"):
+                        st.dataframe(result_df, use_container_width=True)
                     
-                    # Download button
-                    csv = result_df.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Download Results as CSV",
-                        data=csv,
-                        file_name="query_results.csv",
-                        mime="text/csv"
-                    )
+                    # Export the full result (not just the displayed rows) on demand
+                    render_export_controls(generated_sql)
                     
+            except QueryRejectedError as e:
+                request_trace.set(status="rejected")
+                st.error(f"Query rejected before execution: {e}")
+            except QueryTimeoutError as e:
+                request_trace.set(status="timeout")
+                st.error(f"Query took too long: {e}")
+            except PoolExhaustedError as e:
+                request_trace.set(status="db_busy")
+                st.error(f"Database is busy: {e}")
             except Exception as e:
+                request_trace.set(status="sql_error")
                 st.error(f"Error executing SQL: {str(e)[:200]}")
         else:
+            request_trace.set(status="no_sql")
             st.error("Failed to generate SQL. Please try a different question.")
 
 st.markdown("---")
@@ -393,19 +592,62 @@ with st.sidebar:
     # Database stats
     st.subheader("Database")
     try:
-        fact_count = conn.execute("SELECT COUNT(*) FROM fact_animal_outcome").fetchone()[0]
+        with db_pool.cursor(timeout=5) as cursor:
+            fact_count = cursor.execute("SELECT COUNT(*) FROM fact_animal_outcome").fetchone()[0]
         st.metric("Fact Table Rows", f"{fact_count:,}")
+        pool_stats = db_pool.stats()
+        st.caption(
+            f"Cursor pool: {pool_stats['in_use']} in use / {pool_stats['open']} open "
+            f"(max {pool_stats['max_cursors']}) · {pool_stats['threads']} threads"
+        )
     except:
         st.error("Cannot connect to database")
     
+    # Cache stats
+    st.subheader("Caches")
+    try:
+        cache_stats = sql_cache.stats()
+        st.metric("Cached Questions", f"{cache_stats['entries']:,}")
+        st.caption(f"Prompt version {prompt_version} · {cache_stats['hits']:,} cache hits")
+        result_stats = result_cache.stats()
+        st.caption(
+            f"Result cache: {result_stats['hits']:,} hits / {result_stats['misses']:,} misses · "
+            f"{result_stats['memory_bytes'] / 1024 / 1024:.1f} MB in memory"
+        )
+        if st.button("Clear caches"):
+            sql_cache.clear()
+            result_cache.clear()
+            st.rerun()
+    except Exception:
+        st.warning("Caches unavailable")
+    
     # Ollama status
     st.subheader("Ollama")
-    try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=2)
-        if response.status_code == 200:
-            st.success("Connected")
-    except:
+    if ollama_health['ok']:
+        st.success("Connected")
+        if not ollama_health['model_available']:
+            st.warning(f"Model {OLLAMA_MODEL} not found - run `ollama pull mistral`")
+    else:
         st.warning("Not running - web app may not work properly")
+    scheduler_stats = get_llm_scheduler().stats()
+    st.caption(
+        f"LLM queue: {scheduler_stats['running']} running / {scheduler_stats['queued']} waiting · "
+        f"{scheduler_stats['coalesced']:,} duplicate requests shared"
+    )
+    
+    # Latency breakdown of the last request and of the recent ones
+    st.subheader("Latency")
+    request_metrics = get_request_metrics()
+    stage_rows = request_metrics.stage_table()
+    if stage_rows:
+        st.dataframe(stage_rows, hide_index=True, use_container_width=True)
+        st.caption(
+            f"Last request vs. the last {stage_rows[-1]['requests']} · "
+            + (f"[/metrics](http://127.0.0.1:{METRICS_PORT}/metrics) · " if METRICS_PORT else "")
+            + f"log: {METRICS_LOG_PATH.name}"
+        )
+    else:
+        st.caption("No requests timed yet")
 
 # ==============================================================================
 # FOOTER
@@ -417,3 +659,16 @@ st.markdown("""
     🐾 Austin Animal Shelter Analytics Agent | Powered by Mistral LLM
 </div>
 """, unsafe_allow_html=True)
+
+# ==============================================================================
+# DEFERRED SUMMARY
+# ==============================================================================
+
+# Everything above (results, examples, sidebar) is already on screen;
+# now wait for the background summary and fill in its placeholder
+if pending_summary is not None:
+    render_summary_when_ready(*pending_summary)
+
+# The request is complete once its summary is; log and aggregate its timings
+if request_trace is not None:
+    get_request_metrics().record(request_trace)
@@ -0,0 +1,190 @@
+"""
+Benchmark for the intake/outcome matching in step_2_5_length_of_stay_features.
+
+The original view matched each outcome to its intake with
+
+    LEFT JOIN raw_animal_intakes i
+        ON o."Animal ID" = i."Animal ID" AND i."DateTime" <= o."DateTime"
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY o."Animal ID", o."DateTime" ORDER BY i."DateTime" DESC) = 1
+
+which pairs every outcome with every earlier intake of the same animal
+before keeping the latest, so an animal with n visits produces ~n^2/2
+pairs. The pipeline now uses an ASOF LEFT JOIN, which finds
+the latest intake at or before each outcome in one sort-merge pass. The
+ROW_NUMBER() filter also collapsed duplicate outcome rows (same Animal ID
+and DateTime) to one; the ASOF version keeps that behaviour by running the
+window over the few duplicated keys only.
+
+This script runs both versions on the current data and on scaled copies
+where a subset of animals gets `factor` times their history (shifted
+past the end of the data), keeping the row count roughly constant while
+visits per animal grow. Results are compared row for row. Among duplicate
+outcome rows, or duplicate intakes at the matched time, both versions
+pick an arbitrary one, so those rows are compared by key only.
+
+    python benchmark_intake_matching.py [path/to/animal_shelter.duckdb]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+
+HISTORY_FACTORS = (1, 16, 64)
+
+MATCHED_COLUMNS = """
+            o.*,
+            i."DateTime" as intake_date,
+            i."Intake Type",
+            i."Intake Condition",
+            DATEDIFF('day', i."DateTime", o."DateTime") as days_in_shelter"""
+
+LEGACY_MATCH_SQL = f"""
+        SELECT{MATCHED_COLUMNS}
+        FROM {{outcomes}} o
+        LEFT JOIN {{intakes}} i
+            ON o."Animal ID" = i."Animal ID"
+            AND i."DateTime" <= o."DateTime"
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY o."Animal ID", o."DateTime"
+            ORDER BY i."DateTime" DESC
+        ) = 1
+"""
+
+# Matching logic of the step_2_5_length_of_stay_features stage in feature_pipeline.py
+ASOF_MATCH_SQL = f"""
+        WITH duplicate_outcomes AS (
+            SELECT "Animal ID", "DateTime" FROM {{outcomes}}
+            GROUP BY ALL HAVING COUNT(*) > 1
+        ),
+        unique_outcomes AS (
+            SELECT * FROM {{outcomes}} ANTI JOIN duplicate_outcomes USING ("Animal ID", "DateTime")
+            UNION ALL
+            SELECT * FROM (
+                SELECT * FROM {{outcomes}} SEMI JOIN duplicate_outcomes USING ("Animal ID", "DateTime")
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY "Animal ID", "DateTime") = 1
+            )
+        )
+        SELECT{MATCHED_COLUMNS}
+        FROM unique_outcomes o
+        ASOF LEFT JOIN {{intakes}} i
+            ON o."Animal ID" = i."Animal ID"
+            AND o."DateTime" >= i."DateTime"
+"""
+
+LENGTH_OF_STAY_SQL = """
+    WITH intake_outcome_matched AS ({matched})
+    SELECT
+        *,
+        CASE
+            WHEN days_in_shelter = 0 THEN 'Same Day'
+            WHEN days_in_shelter BETWEEN 1 AND 7 THEN 'Under 1 Week'
+            WHEN days_in_shelter BETWEEN 8 AND 28 THEN '1-4 Weeks'
+            WHEN days_in_shelter BETWEEN 29 AND 90 THEN '1-3 Months'
+            WHEN days_in_shelter BETWEEN 91 AND 180 THEN '3-6 Months'
+            WHEN days_in_shelter BETWEEN 181 AND 365 THEN '6-12 Months'
+            WHEN days_in_shelter > 365 THEN '1-1.6 Years'
+            ELSE 'Unknown'
+        END as stay_duration_category
+    FROM intake_outcome_matched
+    WHERE days_in_shelter >= 0 AND days_in_shelter <= 577
+"""
+
+METHODS = {"legacy join": LEGACY_MATCH_SQL, "asof join": ASOF_MATCH_SQL}
+
+
+def length_of_stay_sql(method, outcomes="raw_animal_outcomes", intakes="raw_animal_intakes"):
+    matched = METHODS[method].format(outcomes=outcomes, intakes=intakes)
+    return LENGTH_OF_STAY_SQL.format(matched=matched)
+
+
+def create_history_copy(conn, factor, outcomes="raw_animal_outcomes", intakes="raw_animal_intakes"):
+    """Temp tables where 1/factor of the animals repeat their history `factor` times
+
+    Returns the (outcomes, intakes) table names.
+    """
+    span_years = conn.execute(f"""
+        SELECT date_diff('year', MIN("DateTime"), MAX("DateTime")) + 1 FROM {intakes}
+    """).fetchone()[0]
+    for source, target in [(outcomes, "history_outcomes"), (intakes, "history_intakes")]:
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE {target} AS
+            SELECT * REPLACE ("DateTime" + to_years({span_years} * copy) AS "DateTime")
+            FROM {source}, range({factor}) AS copies(copy)
+            WHERE hash("Animal ID") % {factor} = 0
+        """)
+    return "history_outcomes", "history_intakes"
+
+
+def compare_results(conn, left, right, outcomes, intakes):
+    """Rows that differ between two result tables, ignoring arbitrary choices among ties
+
+    Ties are duplicate outcome rows (either may be kept) and duplicate
+    intakes at the matched timestamp (either may be joined).
+    """
+    duplicate_outcomes = f"""
+        SELECT "Animal ID", "DateTime" FROM {outcomes} GROUP BY ALL HAVING COUNT(*) > 1
+    """
+    duplicate_intakes = f"""
+        SELECT "Animal ID", "DateTime" AS intake_date FROM {intakes} GROUP BY ALL HAVING COUNT(*) > 1
+    """
+    differing = 0
+    for a, b in [(left, right), (right, left)]:
+        differing += conn.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT * FROM {a}
+                ANTI JOIN ({duplicate_outcomes}) d USING ("Animal ID", "DateTime")
+                ANTI JOIN ({duplicate_intakes}) t USING ("Animal ID", intake_date)
+                EXCEPT ALL
+                SELECT * FROM {b}
+            )
+        """).fetchone()[0]
+        differing += conn.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT "Animal ID", "DateTime" FROM {a}
+                EXCEPT ALL
+                SELECT "Animal ID", "DateTime" FROM {b}
+            )
+        """).fetchone()[0]
+    return differing
+
+
+def benchmark(conn, outcomes="raw_animal_outcomes", intakes="raw_animal_intakes"):
+    """{method: (rows, seconds)} plus the number of differing rows"""
+    timings = {}
+    for method in METHODS:
+        table = "matched_" + method.split()[0]
+        started = time.perf_counter()
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE {table} AS {length_of_stay_sql(method, outcomes, intakes)}")
+        seconds = time.perf_counter() - started
+        timings[method] = (conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0], seconds)
+    differing = compare_results(conn, "matched_legacy", "matched_asof", outcomes, intakes)
+    return timings, differing
+
+
+def main(db_path=DEFAULT_DB_PATH, factors=HISTORY_FACTORS):
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        print(f"{'Data':28s} {'visits/animal':>13s} {'rows':>10s} {'legacy s':>9s} {'asof s':>8s} {'speedup':>8s} {'diff':>5s}")
+        for factor in factors:
+            if factor == 1:
+                label, outcomes, intakes = "current", "raw_animal_outcomes", "raw_animal_intakes"
+            else:
+                label = f"history x{factor}"
+                outcomes, intakes = create_history_copy(conn, factor)
+            visits = conn.execute(f'SELECT COUNT(*) / COUNT(DISTINCT "Animal ID") FROM {intakes}').fetchone()[0]
+            timings, differing = benchmark(conn, outcomes, intakes)
+            rows, legacy_seconds = timings["legacy join"]
+            asof_seconds = timings["asof join"][1]
+            print(f"{label:28s} {visits:13.1f} {rows:10,} {legacy_seconds:9.2f} {asof_seconds:8.2f} "
+                  f"{legacy_seconds / asof_seconds:7.2f}x {differing:5d}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH)
@@ -0,0 +1,239 @@
+"""
+Scaling benchmark of the ground-truth query set on synthetic star schemas.
+
+Runs the queries of generate_test_cases.py against the current database
+and its scale_up.py copies (10x, 100x, 1000x the fact rows by default,
+generated on first use) for each DuckDB thread count of the sweep:
+- cold: each query on a freshly opened database, so DuckDB's buffer pool
+  is empty (the OS page cache is not dropped; for disk-cold numbers drop
+  it between runs, e.g. `echo 3 > /proc/sys/vm/drop_caches` as root)
+- warm: after one untimed run, the median of `repeat` runs on the same
+  connection
+- memory: DuckDB's profiler reports the peak buffer memory and the peak
+  temp-directory spill of each query (highest of all its runs), plus the
+  bytes read from the database file on the cold run
+
+The report shows, per scale and thread count, the total latency; per
+query, the warm latency at each scale and its cost per fact row relative
+to the smallest scale (the first scale where that ratio passes
+SUPERLINEAR_RATIO is flagged as where the query stops scaling
+linearly); and per query, the speedup from the fewest to the most threads
+on the largest scale. Every measurement is also written to
+scaled/benchmark_results.csv.
+
+    python benchmark_scaling.py [--db path/to/animal_shelter.duckdb] [--scales 1,10,100,1000]
+                                [--threads 1,2,4,8] [--repeat 3] [--memory-limit 4GB] [--force]
+"""
+
+import csv
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+from scale_up import DEFAULT_DB_PATH, FACT_TABLE, SCALE_FACTORS, SCALED_DIR, ensure_scaled_copy
+
+DEFAULT_SCALES = (1,) + SCALE_FACTORS
+DEFAULT_REPEAT = 3
+RESULTS_PATH = SCALED_DIR / "benchmark_results.csv"
+
+SUPERLINEAR_RATIO = 1.5  # cost per fact row vs. the smallest scale
+
+RESULT_FIELDS = [
+    "scale", "fact_rows", "threads", "query", "name",
+    "cold_ms", "warm_ms", "peak_memory_mb", "spill_mb", "read_mb", "result_rows",
+]
+
+
+def default_thread_counts():
+    """1, 2, 4, ... up to the number of cores (which is always included)"""
+    cores = os.cpu_count() or 1
+    counts = []
+    threads = 1
+    while threads < cores:
+        counts.append(threads)
+        threads *= 2
+    return counts + [cores]
+
+
+def load_queries():
+    """[(label, name, SQL)] of the ground-truth test cases"""
+    from generate_test_cases import test_cases_config
+
+    return [(f"Q{case['id']}", case["name"], case["sql"]) for case in test_cases_config]
+
+
+# ==============================================================================
+# MEASUREMENT
+# ==============================================================================
+
+def _connect(db_path, threads, memory_limit=None):
+    config = {"threads": threads}
+    if memory_limit:
+        config["memory_limit"] = memory_limit
+    conn = duckdb.connect(str(db_path), read_only=True, config=config)
+    conn.execute("SET enable_profiling = 'no_output'")
+    return conn
+
+
+def run_profiled(conn, sql):
+    """Run a query to completion: {ms, peak_memory_mb, spill_mb, read_mb, result_rows}"""
+    started = time.perf_counter()
+    rows = conn.execute(sql).fetchall()
+    ms = (time.perf_counter() - started) * 1000
+    profile = json.loads(conn.get_profiling_information(format="json"))
+    return {
+        "ms": ms,
+        "peak_memory_mb": profile.get("system_peak_buffer_memory", 0) / 1024 ** 2,
+        "spill_mb": profile.get("system_peak_temp_dir_size", 0) / 1024 ** 2,
+        "read_mb": profile.get("total_bytes_read", 0) / 1024 ** 2,
+        "result_rows": len(rows),
+    }
+
+
+def benchmark_database(db_path, queries, threads, repeat=DEFAULT_REPEAT, memory_limit=None):
+    """Cold and warm measurements of every query on one database and thread count"""
+    results = {}
+    for label, name, sql in queries:
+        conn = _connect(db_path, threads, memory_limit)
+        try:
+            cold = run_profiled(conn, sql)
+        finally:
+            conn.close()
+        results[label] = {"query": label, "name": name, "cold_ms": cold["ms"], "read_mb": cold["read_mb"],
+                          "result_rows": cold["result_rows"], "runs": [cold]}
+
+    conn = _connect(db_path, threads, memory_limit)
+    try:
+        for label, _, sql in queries:
+            conn.execute(sql).fetchall()
+            runs = [run_profiled(conn, sql) for _ in range(repeat)]
+            result = results[label]
+            result["warm_ms"] = statistics.median(run["ms"] for run in runs)
+            result["runs"] += runs
+    finally:
+        conn.close()
+
+    for result in results.values():
+        runs = result.pop("runs")
+        result["peak_memory_mb"] = max(run["peak_memory_mb"] for run in runs)
+        result["spill_mb"] = max(run["spill_mb"] for run in runs)
+    return list(results.values())
+
+
+def run_benchmark(db_path=DEFAULT_DB_PATH, scales=DEFAULT_SCALES, thread_counts=None,
+                  repeat=DEFAULT_REPEAT, memory_limit=None, force=False):
+    """Benchmark every scale and thread count; returns rows with RESULT_FIELDS"""
+    thread_counts = thread_counts or default_thread_counts()
+    queries = load_queries()
+    rows = []
+    for scale in scales:
+        started = time.perf_counter()
+        path = ensure_scaled_copy(db_path, scale, force=force)
+        conn = duckdb.connect(str(path), read_only=True)
+        try:
+            fact_rows = conn.execute(f"SELECT COUNT(*) FROM {FACT_TABLE}").fetchone()[0]
+        finally:
+            conn.close()
+        print(f"x{scale}: {fact_rows:,} fact rows in {path.name} (ready in {time.perf_counter() - started:.1f}s)")
+        for threads in thread_counts:
+            started = time.perf_counter()
+            for result in benchmark_database(path, queries, threads, repeat, memory_limit):
+                rows.append({"scale": scale, "fact_rows": fact_rows, "threads": threads, **result})
+            print(f"  {threads:>3} thread(s) measured in {time.perf_counter() - started:.1f}s")
+    return rows
+
+
+def write_results(rows, path=RESULTS_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: round(value, 3) if isinstance(value, float) else value
+                             for field, value in row.items()})
+
+
+# ==============================================================================
+# REPORT
+# ==============================================================================
+
+def print_report(rows):
+    scales = sorted({row["scale"] for row in rows})
+    thread_counts = sorted({row["threads"] for row in rows})
+    queries = list(dict.fromkeys(row["query"] for row in rows))
+    by_key = {(row["scale"], row["threads"], row["query"]): row for row in rows}
+
+    print(f"\n{'Scale':>6s} {'threads':>7s} {'cold ms':>10s} {'warm ms':>10s} {'peak MB':>9s} {'spill MB':>9s}")
+    for scale in scales:
+        for threads in thread_counts:
+            group = [by_key[(scale, threads, q)] for q in queries]
+            print(f"{'x' + str(scale):>6s} {threads:7d} {sum(r['cold_ms'] for r in group):10.1f} "
+                  f"{sum(r['warm_ms'] for r in group):10.1f} {max(r['peak_memory_mb'] for r in group):9.1f} "
+                  f"{max(r['spill_mb'] for r in group):9.1f}")
+
+    # Cost per fact row relative to the smallest scale, at the largest thread count
+    threads = thread_counts[-1]
+    base = scales[0]
+    print(f"\nWarm ms at {threads} thread(s); (x) = cost per fact row relative to x{base}")
+    print(f"{'Query':6s} " + " ".join(f"{'x' + str(s):>16s}" for s in scales) + "  stops scaling at")
+    for query in queries:
+        base_row = by_key[(base, threads, query)]
+        base_cost = base_row["warm_ms"] / base_row["fact_rows"]
+        cells = []
+        stops_at = None
+        for scale in scales:
+            row = by_key[(scale, threads, query)]
+            ratio = (row["warm_ms"] / row["fact_rows"]) / base_cost if base_cost else 0.0
+            cells.append(f"{row['warm_ms']:9.1f} ({ratio:4.2f})")
+            if stops_at is None and ratio > SUPERLINEAR_RATIO:
+                stops_at = f"x{scale}"
+        print(f"{query:6s} " + " ".join(f"{cell:>16s}" for cell in cells) + f"  {stops_at or '-'}")
+
+    if len(thread_counts) > 1:
+        scale = scales[-1]
+        fewest, most = thread_counts[0], thread_counts[-1]
+        print(f"\nThread speedup on x{scale}: {fewest} -> {most} thread(s) (ideal {most / fewest:.0f}x)")
+        for query in queries:
+            slow = by_key[(scale, fewest, query)]["warm_ms"]
+            fast = by_key[(scale, most, query)]["warm_ms"]
+            print(f"{query:6s} {slow:10.1f} ms -> {fast:10.1f} ms  {slow / fast:5.2f}x")
+
+
+def _pop_option(args, name, default=None):
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = args[index + 1]
+    del args[index:index + 2]
+    return value
+
+
+def main(argv):
+    args = list(argv)
+    force = "--force" in args
+    args = [arg for arg in args if arg != "--force"]
+    db_path = _pop_option(args, "--db", DEFAULT_DB_PATH)
+    scales = tuple(int(s) for s in _pop_option(args, "--scales", ",".join(map(str, DEFAULT_SCALES))).split(","))
+    threads = _pop_option(args, "--threads")
+    thread_counts = [int(t) for t in threads.split(",")] if threads else None
+    repeat = int(_pop_option(args, "--repeat", DEFAULT_REPEAT))
+    memory_limit = _pop_option(args, "--memory-limit")
+    if args:
+        print(__doc__)
+        return 1
+
+    rows = run_benchmark(db_path, scales, thread_counts, repeat, memory_limit, force)
+    write_results(rows)
+    print_report(rows)
+    print(f"\nResults: {RESULTS_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
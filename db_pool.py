@@ -0,0 +1,181 @@
+"""
+Bounded pool of DuckDB cursors over one read-only database handle.
+
+A single DuckDB connection object must not be used by several threads at
+once, and sharing one across Streamlit sessions serializes every query
+behind it. The pool opens the database once (read-only) and hands out
+`connection.cursor()` children - each an independent connection to the
+same database instance - so queries from different sessions run in
+parallel. At most `max_cursors` cursors exist; callers wait for a free one
+(up to `acquire_timeout` seconds) when all are in use.
+
+Idle cursors are health-checked with `SELECT 1` before being reused if they
+have not been used for a while; broken cursors are replaced, and the root
+handle is reopened if it stops working.
+
+DuckDB's `threads` setting applies to the whole database instance (it
+cannot be set per connection), so the thread count is configured once for
+the pool and shared by all concurrently running queries.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import duckdb
+
+DEFAULT_MAX_CURSORS = 8
+DEFAULT_ACQUIRE_TIMEOUT_SECONDS = 30
+DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS = 60
+
+
+class PoolExhaustedError(Exception):
+    """No cursor became free within the acquire timeout"""
+
+
+class DuckDBCursorPool:
+    """Hands out cursors of a single read-only DuckDB handle, one per running query"""
+
+    def __init__(self, db_path, max_cursors=DEFAULT_MAX_CURSORS, threads=None,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT_SECONDS,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS):
+        self.db_path = Path(db_path)
+        self.max_cursors = max_cursors
+        self.threads = threads
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_cursors)
+        self._idle = queue.LifoQueue()  # (cursor, last used) - most recently used first
+        self._open = 0
+        self._in_use = 0
+        self._root = None
+        self._connect()
+
+    # --------------------------------------------------------------------------
+    # Root handle / cursor lifecycle
+    # --------------------------------------------------------------------------
+
+    def _connect(self):
+        config = {"threads": self.threads} if self.threads else {}
+        root = duckdb.connect(str(self.db_path), read_only=True, config=config)
+        root.execute("SELECT 1").fetchone()
+        self._root = root
+
+    def _new_cursor(self):
+        with self._lock:
+            try:
+                cursor = self._root.cursor()
+            except duckdb.Error:
+                # The root handle itself is broken - reopen it
+                self._close_idle()
+                self._connect()
+                cursor = self._root.cursor()
+            self._open += 1
+        return cursor
+
+    def _discard(self, cursor):
+        try:
+            cursor.close()
+        except duckdb.Error:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    def _close_idle(self):
+        while True:
+            try:
+                cursor, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                cursor.close()
+            except duckdb.Error:
+                pass
+            self._open -= 1
+
+    def _healthy(self, cursor):
+        try:
+            cursor.execute("SELECT 1").fetchone()
+            return True
+        except duckdb.Error:
+            return False
+
+    def _checkout(self):
+        while True:
+            try:
+                cursor, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new_cursor()
+            if time.monotonic() - last_used < self.health_check_interval or self._healthy(cursor):
+                return cursor
+            self._discard(cursor)
+
+    # --------------------------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------------------------
+
+    @contextmanager
+    def cursor(self, timeout=None):
+        """Borrow a cursor for the duration of the block
+
+        Raises PoolExhaustedError if none becomes free within the timeout.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolExhaustedError(
+                f"All {self.max_cursors} database cursors are busy; try again in a moment"
+            )
+        cursor = None
+        try:
+            cursor = self._checkout()
+            with self._lock:
+                self._in_use += 1
+            try:
+                yield cursor
+            finally:
+                with self._lock:
+                    self._in_use -= 1
+        except BaseException:
+            # The cursor may be mid-query or interrupted: only keep it if it still works
+            if cursor is not None and not self._healthy(cursor):
+                self._discard(cursor)
+                cursor = None
+            raise
+        finally:
+            if cursor is not None:
+                self._idle.put((cursor, time.monotonic()))
+            self._slots.release()
+
+    def check_health(self):
+        """Run a trivial query on a pooled cursor; returns True if the database answers"""
+        try:
+            with self.cursor(timeout=5) as cursor:
+                return self._healthy(cursor)
+        except (PoolExhaustedError, duckdb.Error):
+            return False
+
+    def stats(self):
+        """Return pool usage for display"""
+        with self._lock:
+            stats = {
+                "max_cursors": self.max_cursors,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+            }
+            try:
+                stats["threads"] = self._root.execute("SELECT current_setting('threads')").fetchone()[0]
+            except duckdb.Error:
+                stats["threads"] = None
+        return stats
+
+    def close(self):
+        """Close every idle cursor and the root handle"""
+        with self._lock:
+            self._close_idle()
+            if self._root is not None:
+                self._root.close()
+                self._root = None
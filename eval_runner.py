@@ -0,0 +1,387 @@
+"""
+Concurrent, resumable evaluation of the agent on the ground-truth suite.
+
+quick_validation.py asks the 11 questions from
+agent_ground_truth_test_cases.json one after another; the v2 validation
+notebook is designed for 20 iterations per case, so evaluating a prompt
+change that way means 220 serial LLM calls. This runner:
+- runs `concurrency` generations at a time per Ollama endpoint, with
+  every endpoint's workers pulling (case, iteration) items from one shared
+  queue, so faster endpoints take more of the work
+- checkpoints every finished item as one JSON line, so an interrupted run
+  picks up where it stopped; the checkpoint file is named after a
+  fingerprint of the prompt, schema context, model and suite, so a prompt
+  change made with update_agent_config.py starts a fresh run automatically
+- executes the generated SQL through the same guards as the web app
+  (query_executor) on a pool of read-only DuckDB cursors
+- takes the expected results from the Parquet ground-truth store and
+  refuses to start while any case is stale (its SQL or tables changed
+  since it was generated); refreshing the expectations is an explicit
+  step (python generate_test_cases.py), so data drift is never absorbed
+  silently
+- reports pass rate and p50/p95 latency per case
+
+An item passes when the generated SQL returns the expected rows
+(result_equivalence: order-insensitive, alias-insensitive, numbers within
+the ground-truth rounding); the mismatch diff is stored as its detail.
+Items whose LLM call fails with a connection error or an HTTP error status
+go back on the queue for another endpoint (an endpoint is retired for the
+run after MAX_ENDPOINT_ERRORS failures in a row, an item is given up after
+MAX_ITEM_ATTEMPTS) and are never checkpointed, so whatever is left is
+retried on the next run.
+
+    python eval_runner.py [--iterations 20] [--concurrency 2]
+                          [--endpoints http://host1:11434,http://host2:11434]
+                          [--cases 1,5,11] [--run NAME] [--db path/to/animal_shelter.duckdb]
+"""
+
+import hashlib
+import json
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from db_pool import DuckDBCursorPool
+from generate_test_cases import test_cases_config
+from ground_truth_store import StaleGroundTruthError, ensure_current, load_cases, load_expected
+from ollama_client import OLLAMA_MODEL, OLLAMA_URL, OllamaClient, mistral_text_to_sql
+from prompt_retrieval import PromptRetriever
+from query_executor import GuardedExecutor
+from request_metrics import percentile
+from result_equivalence import compare_results
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+AGENT_CONFIG_PATH = PROJECT_DIR / "mindsdb_agent_config.json"
+SCHEMA_CONTEXT_PATH = PROJECT_DIR / "MINDSDB_SCHEMA_CONTEXT.txt"
+RUNS_DIR = PROJECT_DIR / "eval_runs"
+
+DEFAULT_ITERATIONS = 20  # per case, as in test_validate_mindsdb_agent_v2.ipynb
+DEFAULT_CONCURRENCY = 2  # generations in flight per endpoint
+GENERATION_TIMEOUT_SECONDS = 90
+SQL_TIMEOUT_SECONDS = 30
+MAX_ENDPOINT_ERRORS = 3  # failed LLM calls in a row before an endpoint is retired for the run
+MAX_ITEM_ATTEMPTS = 3  # failed LLM calls of one item before it is left for the next run
+
+
+# ==============================================================================
+# SUITE / CHECKPOINTS
+# ==============================================================================
+
+def load_suite(conn):
+    """(test cases, system prompt, schema context, prompt version)
+
+    Raises StaleGroundTruthError if any ground-truth case no longer matches
+    its SQL or the data; each test case carries its expected result as
+    "expected".
+    """
+    ensure_current(conn, test_cases_config)
+    test_cases = load_cases()
+    for case in test_cases:
+        case["expected"] = load_expected(case)
+    with open(AGENT_CONFIG_PATH, "r", encoding="utf-8-sig") as f:
+        agent_config = json.load(f)
+    with open(SCHEMA_CONTEXT_PATH, "r", encoding="utf-8") as f:
+        schema_context = f.read()
+    prompt_version = f"{agent_config.get('version', 'unknown')}+retrieval"
+    return test_cases, agent_config["system_prompt"], schema_context, prompt_version
+
+
+def run_fingerprint(test_cases, system_prompt, schema_context, model=OLLAMA_MODEL):
+    """Short hash of everything that changes what the agent is asked and how it is scored"""
+    digest = hashlib.sha256()
+    for part in (model, system_prompt, schema_context):
+        digest.update(part.encode("utf-8") + b"\0")
+    for case in test_cases:
+        digest.update(json.dumps(
+            [case["id"], case["natural_language_question"], case["sql_hash"], case["data_fingerprint"]]
+        ).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def load_checkpoint(path):
+    """{(case id, iteration): record} of the items already finished"""
+    done = {}
+    if not path.exists():
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interrupted write
+            done[(record["case_id"], record["iteration"])] = record
+    return done
+
+
+class CheckpointWriter:
+    """Appends records as JSON lines, flushed one at a time"""
+
+    def __init__(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# ==============================================================================
+# EVALUATION
+# ==============================================================================
+
+def check_result(conn, df, test_case):
+    """(passed, detail) for the result of one generated query"""
+    comparison = compare_results(conn, df, test_case["expected"])
+    if comparison:
+        return True, f"{len(df)} rows match"
+    return False, comparison.diff(limit=5)
+
+
+def evaluate_item(client, pool, executor, retriever, system_prompt, prompt_version, test_case, iteration):
+    """Ask one question once and score the answer; returns the checkpoint record
+
+    Connection errors from the LLM call propagate, and an HTTP error status
+    is raised as requests.HTTPError, so the item is not recorded.
+    """
+    record = {"case_id": test_case["id"], "iteration": iteration, "endpoint": client.base_url,
+              "generated_sql": None, "llm_seconds": None, "sql_seconds": None}
+    started = time.perf_counter()
+    stats = {}
+    generated_sql = mistral_text_to_sql(client, test_case["natural_language_question"], system_prompt,
+                                        timeout=GENERATION_TIMEOUT_SECONDS,
+                                        prefix_version=prompt_version, retriever=retriever, stats=stats)
+    if generated_sql is None and stats.get("http_status", 200) != 200:
+        # A transient 5xx must not be scored as the model failing to write SQL
+        raise requests.exceptions.HTTPError(f"Ollama answered HTTP {stats['http_status']}")
+    record["llm_seconds"] = time.perf_counter() - started
+    record["generated_sql"] = generated_sql
+
+    if not generated_sql:
+        record.update(status="no_sql", passed=False, detail="could not generate SQL")
+    else:
+        sql_started = time.perf_counter()
+        try:
+            with pool.cursor() as cursor:
+                df, _ = executor.execute(cursor, generated_sql)
+                passed, detail = check_result(cursor, df, test_case)
+            record.update(status="passed" if passed else "failed", passed=passed, detail=detail)
+        except Exception as e:
+            record.update(status="sql_error", passed=False, detail=str(e)[:200])
+        record["sql_seconds"] = time.perf_counter() - sql_started
+
+    record["seconds"] = time.perf_counter() - started
+    record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return record
+
+
+def run_evaluation(db_path=DEFAULT_DB_PATH, endpoints=(OLLAMA_URL,), iterations=DEFAULT_ITERATIONS,
+                   concurrency=DEFAULT_CONCURRENCY, case_ids=None, run_name=None, progress=print):
+    """Evaluate every (case, iteration) not yet in the run's checkpoint
+
+    Returns (checkpoint path, {(case id, iteration): record} of all finished
+    items, number of items left unfinished by connection errors).
+    """
+    pool = DuckDBCursorPool(db_path, max_cursors=max(len(endpoints) * concurrency, 1))
+    try:
+        with pool.cursor() as cursor:
+            test_cases, system_prompt, schema_context, prompt_version = load_suite(cursor)
+        if case_ids is not None:
+            test_cases = [case for case in test_cases if case["id"] in case_ids]
+        run_name = run_name or run_fingerprint(test_cases, system_prompt, schema_context)
+        checkpoint_path = RUNS_DIR / f"{run_name}.jsonl"
+
+        done = load_checkpoint(checkpoint_path)
+        pending = queue.Queue()
+        for case in test_cases:
+            for iteration in range(iterations):
+                if (case["id"], iteration) not in done:
+                    pending.put((case, iteration))
+        total = pending.qsize()
+        progress(f"Run {run_name}: {len(done)} item(s) already done, {total} to go "
+                 f"on {len(endpoints)} endpoint(s) x {concurrency}")
+        if not total:
+            return checkpoint_path, done, 0
+        unfinished = _run_items(pool, pending, done, checkpoint_path, endpoints, concurrency,
+                                system_prompt, schema_context, prompt_version, progress)
+    finally:
+        pool.close()
+    return checkpoint_path, done, unfinished
+
+
+def _run_items(pool, pending, done, checkpoint_path, endpoints, concurrency,
+               system_prompt, schema_context, prompt_version, progress):
+    """Work through `pending` with `concurrency` threads per endpoint; returns the unfinished count"""
+    retriever = PromptRetriever(system_prompt, schema_context)
+    clients = [OllamaClient(base_url=url, pool_size=max(concurrency, 1)) for url in endpoints]
+    preloads = [client.preload_model_async() for client in clients]
+    for thread in preloads:
+        thread.join()
+
+    executor = GuardedExecutor(timeout_seconds=SQL_TIMEOUT_SECONDS)
+    writer = CheckpointWriter(checkpoint_path)
+    lock = threading.Lock()
+    stop = threading.Event()
+    unfinished = [0]
+    in_progress = [0]  # items taken off the queue that may still be put back
+    errors = {client.base_url: 0 for client in clients}  # failed calls in a row, per endpoint
+    retired = set()
+    attempts = {}
+
+    def work(client):
+        while not stop.is_set() and client.base_url not in retired:
+            try:
+                case, iteration = pending.get(timeout=0.2)
+            except queue.Empty:
+                with lock:
+                    if not in_progress[0]:
+                        return  # nothing queued and nothing that could come back
+                continue
+            with lock:
+                in_progress[0] += 1
+            try:
+                record = evaluate_item(client, pool, executor, retriever, system_prompt, prompt_version,
+                                       case, iteration)
+            except requests.exceptions.RequestException as e:
+                key = (case["id"], iteration)
+                with lock:
+                    errors[client.base_url] += 1
+                    attempts[key] = attempts.get(key, 0) + 1
+                    just_retired = (errors[client.base_url] >= MAX_ENDPOINT_ERRORS
+                                    and client.base_url not in retired)
+                    if just_retired:
+                        retired.add(client.base_url)
+                    if attempts[key] < MAX_ITEM_ATTEMPTS and len(retired) < len(clients):
+                        pending.put((case, iteration))  # another endpoint (or a retry) takes it
+                        requeued = True
+                    else:
+                        unfinished[0] += 1
+                        requeued = False
+                    in_progress[0] -= 1
+                progress(f"  Q{case['id']} #{iteration} on {client.base_url}: {e}"
+                         + (" - requeued" if requeued else " - left for the next run"))
+                if just_retired:
+                    progress(f"  {client.base_url} retired after {MAX_ENDPOINT_ERRORS} failures in a row")
+                continue
+            writer.write(record)
+            with lock:
+                errors[client.base_url] = 0
+                done[(case["id"], iteration)] = record
+                finished = len(done)
+                in_progress[0] -= 1
+            progress(f"  [{finished}] Q{case['id']} #{iteration} {record['status']:9s} "
+                     f"{record['seconds']:6.1f}s  {client.base_url}")
+
+    workers = [threading.Thread(target=work, args=(client,), name=f"eval-{n}", daemon=True)
+               for client in clients for n in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(0.5)  # short joins keep Ctrl-C responsive
+    except KeyboardInterrupt:
+        stop.set()
+        progress("Interrupted - finished items are checkpointed; run again to resume")
+        raise
+    finally:
+        writer.close()
+    # Items still queued when every endpoint was retired
+    return unfinished[0] + pending.qsize()
+
+
+# ==============================================================================
+# REPORT
+# ==============================================================================
+
+def summarize(records):
+    """{case id: {"runs", "passed", "pass_rate", "p50_seconds", "p95_seconds"}}"""
+    by_case = {}
+    for record in records:
+        by_case.setdefault(record["case_id"], []).append(record)
+    summary = {}
+    for case_id, case_records in sorted(by_case.items()):
+        seconds = [r["seconds"] for r in case_records]
+        passed = sum(1 for r in case_records if r["passed"])
+        summary[case_id] = {
+            "runs": len(case_records),
+            "passed": passed,
+            "pass_rate": 100 * passed / len(case_records),
+            "p50_seconds": percentile(seconds, 0.50),
+            "p95_seconds": percentile(seconds, 0.95),
+        }
+    return summary
+
+
+def print_report(records, test_cases):
+    names = {case["id"]: case["name"] for case in test_cases}
+    summary = summarize(records)
+    print(f"\n{'Case':45s} {'passed':>9s} {'rate':>7s} {'p50 s':>7s} {'p95 s':>7s}")
+    print("-" * 79)
+    for case_id, s in summary.items():
+        label = f"Q{case_id}: {names.get(case_id, '')}"[:45]
+        print(f"{label:45s} {s['passed']:>4}/{s['runs']:<4} {s['pass_rate']:6.1f}% "
+              f"{s['p50_seconds']:7.1f} {s['p95_seconds']:7.1f}")
+    if records:
+        seconds = [r["seconds"] for r in records]
+        passed = sum(1 for r in records if r["passed"])
+        print("-" * 79)
+        print(f"{'OVERALL':45s} {passed:>4}/{len(records):<4} {100 * passed / len(records):6.1f}% "
+              f"{percentile(seconds, 0.50):7.1f} {percentile(seconds, 0.95):7.1f}")
+    return summary
+
+
+def _pop_option(args, name, default=None):
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = args[index + 1]
+    del args[index:index + 2]
+    return value
+
+
+def main(argv):
+    args = list(argv)
+    db_path = _pop_option(args, "--db", DEFAULT_DB_PATH)
+    iterations = int(_pop_option(args, "--iterations", DEFAULT_ITERATIONS))
+    concurrency = int(_pop_option(args, "--concurrency", DEFAULT_CONCURRENCY))
+    endpoints = _pop_option(args, "--endpoints", OLLAMA_URL).split(",")
+    cases = _pop_option(args, "--cases")
+    case_ids = {int(c) for c in cases.split(",")} if cases else None
+    run_name = _pop_option(args, "--run")
+    if args:
+        print(__doc__)
+        return 1
+
+    started = time.perf_counter()
+    try:
+        checkpoint_path, done, unfinished = run_evaluation(
+            db_path, endpoints, iterations, concurrency, case_ids, run_name
+        )
+    except KeyboardInterrupt:
+        return 130
+    except StaleGroundTruthError as e:
+        print(e)
+        return 1
+    test_cases = load_cases()
+    records = [r for r in done.values() if case_ids is None or r["case_id"] in case_ids]
+    print_report(records, test_cases)
+    print(f"\nCheckpoint: {checkpoint_path}")
+    print(f"Finished in {time.perf_counter() - started:.1f}s"
+          + (f"; {unfinished} item(s) hit connection errors and will be retried on the next run"
+             if unfinished else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,424 @@
+"""
+Materialized feature pipeline for animal_outcomes_consolidated.
+
+Each feature stage of the consolidation is a table holding only the
+columns it derives, keyed by `outcome_row` (the rowid of the source row in
+raw_animal_outcomes). The final stage joins the raw outcomes with every
+feature table into animal_outcomes_consolidated and applies the NULL
+cleaning, so changing one feature (e.g. the breed grouping) rebuilds that
+feature table and the join - not the date, age or length-of-stay logic.
+
+Breeds are classified through a lookup table rather than per row:
+breed_dictionary holds one row per distinct (Animal Type, Breed) with its
+primary/secondary breed, mix flag and breed group, the group coming from
+the first matching rule in breed_group_rules (built from
+BREED_GROUP_RULES). Step 2.2 joins the dictionary back to the outcomes.
+
+Every stage is fingerprinted from its SQL and the fingerprints of its
+inputs. Pipeline tables contribute the fingerprint they were built with;
+external tables (the raw exports) contribute a hash of their rows. A stage
+is rebuilt only when its fingerprint differs from the one recorded in
+pipeline_stage_log (or its table is missing). Each build is logged there
+with its row count and duration.
+
+    python feature_pipeline.py [path/to/animal_shelter.duckdb] [--force]
+"""
+
+import hashlib
+import re
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+LOG_TABLE = "pipeline_stage_log"
+OUTPUT_TABLE = "animal_outcomes_consolidated"
+
+# Breed group rules in precedence order: (breed group, Animal Type the rule is
+# limited to or None for any, substrings of "Breed"). A breed takes the group
+# of the first rule with a matching substring, or 'Other' if none matches.
+# Species-specific exceptions go before the general rule they override.
+BREED_GROUP_RULES = [
+    ("Toy", None, ["Toy", "Miniature", "Pomeranian", "Yorkshire", "Chihuahua"]),
+    ("Terrier", None, ["Terrier"]),
+    ("Sporting", None, ["Labrador", "Retriever", "Poodle"]),
+    ("Working", None, ["German Shepherd", "Husky", "Collie", "Cattle", "Boxer", "Mastiff", "Pit Bull"]),
+    ("Hound", None, ["Beagle", "Hound", "Dachshund"]),
+    ("Mixed", None, ["Mix", "Cross"]),
+]
+
+
+def _sql_literal(value):
+    return "NULL" if value is None else "'" + str(value).replace("'", "''") + "'"
+
+
+def _breed_group_rules_sql(rules=BREED_GROUP_RULES):
+    """SELECT of one row per (rule, substring) with the rule's precedence"""
+    values = ",\n            ".join(
+        f"({precedence}, {_sql_literal(group)}, {_sql_literal(animal_type)}, {_sql_literal(pattern)})"
+        for precedence, (group, animal_type, patterns) in enumerate(rules, start=1)
+        for pattern in patterns
+    )
+    return f"""
+        SELECT
+            CAST(precedence AS INTEGER) AS precedence,
+            CAST(breed_group AS VARCHAR) AS breed_group,
+            CAST(animal_type AS VARCHAR) AS animal_type,
+            CAST(pattern AS VARCHAR) AS pattern
+        FROM (VALUES
+            {values}
+        ) AS rules(precedence, breed_group, animal_type, pattern)
+    """
+
+
+# stage -> (input tables, SELECT producing the stage table), in dependency order
+STAGES = {
+    # Step 2.1: temporal features of the outcome DateTime
+    "step_2_1_date_features": (["raw_animal_outcomes"], """
+        SELECT
+            rowid AS outcome_row,
+            EXTRACT(YEAR FROM "DateTime") as outcome_year,
+            EXTRACT(MONTH FROM "DateTime") as outcome_month,
+            EXTRACT(DAY FROM "DateTime") as outcome_day_of_month,
+            EXTRACT(DOW FROM "DateTime") as outcome_day_of_week,
+            EXTRACT(WEEK FROM "DateTime") as outcome_week_of_year,
+            EXTRACT(QUARTER FROM "DateTime") as outcome_quarter,
+            CASE
+                WHEN EXTRACT(DOW FROM "DateTime") IN (0, 6) THEN 1
+                ELSE 0
+            END as outcome_is_weekend
+        FROM raw_animal_outcomes
+    """),
+
+    # Breed group rules as a table, so the precedence can be inspected in SQL
+    "breed_group_rules": ([], _breed_group_rules_sql()),
+
+    # Each distinct (Animal Type, Breed) classified once: primary/secondary
+    # breed, mix flag and the first matching breed group rule
+    "breed_dictionary": (["raw_animal_outcomes", "breed_group_rules"], """
+        SELECT
+            k."Animal Type",
+            k."Breed",
+            CASE
+                WHEN k."Breed" LIKE '%/%' THEN TRIM(SUBSTRING(k."Breed", 1, POSITION('/' IN k."Breed") - 1))
+                ELSE k."Breed"
+            END as primary_breed,
+            CASE
+                WHEN k."Breed" LIKE '%/%' THEN TRIM(SUBSTRING(k."Breed", POSITION('/' IN k."Breed") + 1))
+                ELSE NULL
+            END as secondary_breed,
+            CASE
+                WHEN k."Breed" LIKE '%/%' THEN 1
+                ELSE 0
+            END as is_mixed_breed,
+            COALESCE(r.breed_group, 'Other') as breed_group,
+            r.precedence as matched_rule,
+            r.pattern as matched_pattern
+        FROM (SELECT DISTINCT "Animal Type", "Breed" FROM raw_animal_outcomes) k
+        LEFT JOIN breed_group_rules r
+            ON contains(k."Breed", r.pattern)
+            AND (r.animal_type IS NULL OR r.animal_type = k."Animal Type")
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY k."Animal Type", k."Breed"
+            ORDER BY r.precedence NULLS LAST, r.pattern
+        ) = 1
+    """),
+
+    # Step 2.2: primary/secondary breed and breed group, looked up in breed_dictionary
+    "step_2_2_breed_features": (["raw_animal_outcomes", "breed_dictionary"], """
+        SELECT
+            o.rowid AS outcome_row,
+            b.primary_breed,
+            b.secondary_breed,
+            b.is_mixed_breed,
+            b.breed_group
+        FROM raw_animal_outcomes o
+        JOIN breed_dictionary b
+            ON o."Breed" IS NOT DISTINCT FROM b."Breed"
+            AND o."Animal Type" IS NOT DISTINCT FROM b."Animal Type"
+    """),
+
+    # Step 2.3: age at outcome in days/years and age group
+    "step_2_3_age_features": (["raw_animal_outcomes"], """
+        SELECT
+            rowid AS outcome_row,
+            CAST(DATEDIFF('day', CAST("Date of Birth" AS TIMESTAMP), "DateTime") AS INTEGER) as age_at_outcome_days,
+            CASE
+                WHEN "Date of Birth" IS NULL THEN NULL
+                ELSE DATEDIFF('year', CAST("Date of Birth" AS TIMESTAMP), "DateTime") -
+                     CASE
+                        WHEN EXTRACT(MONTH FROM "Date of Birth") > EXTRACT(MONTH FROM "DateTime") OR
+                             (EXTRACT(MONTH FROM "Date of Birth") = EXTRACT(MONTH FROM "DateTime") AND
+                              EXTRACT(DAY FROM "Date of Birth") > EXTRACT(DAY FROM "DateTime"))
+                        THEN 1
+                        ELSE 0
+                     END
+            END as age_at_outcome_years,
+            CASE
+                WHEN "Date of Birth" IS NULL THEN 'Unknown'
+                WHEN DATEDIFF('day', CAST("Date of Birth" AS TIMESTAMP), "DateTime") < 365 THEN 'Under 1 Year'
+                WHEN DATEDIFF('day', CAST("Date of Birth" AS TIMESTAMP), "DateTime") < 1825 THEN '1-5 Years'
+                WHEN DATEDIFF('day', CAST("Date of Birth" AS TIMESTAMP), "DateTime") < 3650 THEN '5-10 Years'
+                ELSE 'Over 10 Years'
+            END as age_group
+        FROM raw_animal_outcomes
+    """),
+
+    # Step 2.3A: reproductive status and sex flags
+    "step_2_3a_sex_features": (["raw_animal_outcomes"], """
+        SELECT
+            rowid AS outcome_row,
+            CASE
+                WHEN "Sex upon Outcome" LIKE '%Intact%' THEN 1
+                WHEN "Sex upon Outcome" LIKE '%Spayed%' OR "Sex upon Outcome" LIKE '%Neutered%' THEN 0
+                ELSE NULL
+            END as is_intact,
+            CASE
+                WHEN "Sex upon Outcome" LIKE '%Male%' THEN 1
+                ELSE 0
+            END as is_male,
+            CASE
+                WHEN "Sex upon Outcome" LIKE '%Female%' THEN 1
+                ELSE 0
+            END as is_female
+        FROM raw_animal_outcomes
+    """),
+
+    # Step 2.4: live outcome flag
+    "step_2_4_outcome_features": (["raw_animal_outcomes"], """
+        SELECT
+            rowid AS outcome_row,
+            CASE
+                WHEN "Outcome Type" IN ('Adoption', 'Return to Owner', 'Transfer') THEN 1
+                ELSE 0
+            END as is_live_outcome
+        FROM raw_animal_outcomes
+    """),
+
+    # Step 2.5: latest intake at or before each outcome (ASOF join), length
+    # of stay, and the P99.9 outlier filter. Outcomes recorded more than once
+    # (same Animal ID and DateTime) keep their first row.
+    "step_2_5_length_of_stay_features": (["raw_animal_outcomes", "raw_animal_intakes"], """
+        WITH outcomes AS (
+            SELECT rowid AS outcome_row, "Animal ID", "DateTime" FROM raw_animal_outcomes
+        ),
+        duplicate_outcomes AS (
+            SELECT "Animal ID", "DateTime" FROM outcomes
+            GROUP BY ALL HAVING COUNT(*) > 1
+        ),
+        unique_outcomes AS (
+            SELECT * FROM outcomes ANTI JOIN duplicate_outcomes USING ("Animal ID", "DateTime")
+            UNION ALL
+            SELECT * FROM (
+                SELECT * FROM outcomes SEMI JOIN duplicate_outcomes USING ("Animal ID", "DateTime")
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY "Animal ID", "DateTime" ORDER BY outcome_row) = 1
+            )
+        ),
+        intake_outcome_matched AS (
+            SELECT
+                o.outcome_row,
+                i."DateTime" as intake_date,
+                i."Intake Type",
+                i."Intake Condition",
+                DATEDIFF('day', i."DateTime", o."DateTime") as days_in_shelter
+            FROM unique_outcomes o
+            ASOF LEFT JOIN raw_animal_intakes i
+                ON o."Animal ID" = i."Animal ID"
+                AND o."DateTime" >= i."DateTime"
+        )
+        SELECT
+            *,
+            CASE
+                WHEN days_in_shelter = 0 THEN 'Same Day'
+                WHEN days_in_shelter BETWEEN 1 AND 7 THEN 'Under 1 Week'
+                WHEN days_in_shelter BETWEEN 8 AND 28 THEN '1-4 Weeks'
+                WHEN days_in_shelter BETWEEN 29 AND 90 THEN '1-3 Months'
+                WHEN days_in_shelter BETWEEN 91 AND 180 THEN '3-6 Months'
+                WHEN days_in_shelter BETWEEN 181 AND 365 THEN '6-12 Months'
+                WHEN days_in_shelter > 365 THEN '1-1.6 Years'
+                ELSE 'Unknown'
+            END as stay_duration_category
+        FROM intake_outcome_matched
+        WHERE days_in_shelter >= 0 AND days_in_shelter <= 577
+    """),
+
+    # All original outcome columns plus every feature, one row per matched outcome.
+    # NULL Outcome Type becomes 'Unknown' and NULL sex flags become 0 (unknown).
+    OUTPUT_TABLE: ([
+        "raw_animal_outcomes", "step_2_1_date_features", "step_2_2_breed_features",
+        "step_2_3_age_features", "step_2_3a_sex_features", "step_2_4_outcome_features",
+        "step_2_5_length_of_stay_features",
+    ], """
+        SELECT
+            o.* EXCLUDE (outcome_row) REPLACE (COALESCE("Outcome Type", 'Unknown') AS "Outcome Type"),
+            d.* EXCLUDE (outcome_row),
+            b.* EXCLUDE (outcome_row),
+            a.* EXCLUDE (outcome_row),
+            s.* EXCLUDE (outcome_row) REPLACE (
+                COALESCE(is_intact, 0) AS is_intact,
+                COALESCE(is_male, 0) AS is_male,
+                COALESCE(is_female, 0) AS is_female
+            ),
+            f.* EXCLUDE (outcome_row),
+            l.* EXCLUDE (outcome_row)
+        FROM (SELECT rowid AS outcome_row, * FROM raw_animal_outcomes) o
+        JOIN step_2_5_length_of_stay_features l USING (outcome_row)
+        JOIN step_2_1_date_features d USING (outcome_row)
+        JOIN step_2_2_breed_features b USING (outcome_row)
+        JOIN step_2_3_age_features a USING (outcome_row)
+        JOIN step_2_3a_sex_features s USING (outcome_row)
+        JOIN step_2_4_outcome_features f USING (outcome_row)
+        ORDER BY outcome_row
+    """),
+}
+
+
+# ==============================================================================
+# FINGERPRINTS
+# ==============================================================================
+
+def _relation_kind(conn, name):
+    """'table', 'view' or None"""
+    if conn.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [name]).fetchone()[0]:
+        return "table"
+    if conn.execute("SELECT COUNT(*) FROM duckdb_views() WHERE view_name = ?", [name]).fetchone()[0]:
+        return "view"
+    return None
+
+
+def recorded_fingerprints(conn):
+    """{stage: fingerprint of its latest build}"""
+    if _relation_kind(conn, LOG_TABLE) is None:
+        return {}
+    return dict(conn.execute(f"""
+        SELECT stage_name, arg_max(fingerprint, built_at) FROM {LOG_TABLE} GROUP BY stage_name
+    """).fetchall())
+
+
+def table_fingerprint(conn, table):
+    """Row count and an order-independent hash of every row and its rowid"""
+    count, total = conn.execute(f"SELECT COUNT(*), SUM(hash(t.rowid, t)) FROM {table} t").fetchone()
+    return f"{count}:{total}"
+
+
+def stage_fingerprint(stage, input_fingerprints):
+    """Hash of the stage SQL (whitespace-insensitive) and its inputs' fingerprints"""
+    _, sql = STAGES[stage]
+    digest = hashlib.sha256(re.sub(r"\s+", " ", sql).strip().encode("utf-8"))
+    for name in sorted(input_fingerprints):
+        digest.update(f"|{name}={input_fingerprints[name]}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def current_fingerprint(conn, stage, recorded=None, external=None):
+    """Fingerprint `stage` would be built with now
+
+    Pipeline inputs contribute their recorded fingerprint. `external`
+    caches the fingerprints of external tables across calls.
+    """
+    recorded = recorded_fingerprints(conn) if recorded is None else recorded
+    external = {} if external is None else external
+    inputs, _ = STAGES[stage]
+    input_fingerprints = {}
+    for name in inputs:
+        if name in STAGES:
+            input_fingerprints[name] = recorded.get(name)
+        else:
+            if name not in external:
+                external[name] = table_fingerprint(conn, name)
+            input_fingerprints[name] = external[name]
+    return stage_fingerprint(stage, input_fingerprints)
+
+
+# ==============================================================================
+# RUNNER
+# ==============================================================================
+
+def _ensure_log(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LOG_TABLE} (
+            stage_name VARCHAR,
+            fingerprint VARCHAR,
+            row_count BIGINT,
+            seconds DOUBLE,
+            built_at TIMESTAMP
+        )
+    """)
+
+
+def record_stage(conn, stage, fingerprint, row_count, seconds):
+    """Log a build of `stage` (also used when a stage is brought up to date another way)"""
+    _ensure_log(conn)
+    conn.execute(
+        f"INSERT INTO {LOG_TABLE} VALUES (?, ?, ?, ?, current_timestamp::TIMESTAMP)",
+        [stage, fingerprint, row_count, seconds]
+    )
+
+
+def build_stage(conn, stage, fingerprint):
+    """Materialize one stage and log it; returns (row count, seconds)"""
+    _, sql = STAGES[stage]
+    started = time.perf_counter()
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        if _relation_kind(conn, stage) == "view":
+            conn.execute(f"DROP VIEW {stage}")  # left over from the view-based notebook
+        conn.execute(f"CREATE OR REPLACE TABLE {stage} AS {sql}")
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {stage}").fetchone()[0]
+        seconds = time.perf_counter() - started
+        record_stage(conn, stage, fingerprint, row_count, seconds)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row_count, seconds
+
+
+def run_pipeline(conn, stages=None, force=False):
+    """Bring stages up to date, in dependency order
+
+    `stages` limits the run to the named stages (their inputs must already
+    be current). Returns {stage: (built, row count, seconds)}; `built` is
+    False for stages that were already current.
+    """
+    stages = list(STAGES) if stages is None else stages
+    recorded = recorded_fingerprints(conn)
+    external = {}
+    results = {}
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        # Computed in order, so upstream rebuilds change downstream fingerprints
+        fingerprint = current_fingerprint(conn, stage, recorded, external)
+        if not force and recorded.get(stage) == fingerprint and _relation_kind(conn, stage) == "table":
+            row_count = conn.execute(f"SELECT COUNT(*) FROM {stage}").fetchone()[0]
+            results[stage] = (False, row_count, 0.0)
+            continue
+        row_count, seconds = build_stage(conn, stage, fingerprint)
+        recorded[stage] = fingerprint
+        results[stage] = (True, row_count, seconds)
+    return results
+
+
+def print_run(results):
+    for stage, (built, row_count, seconds) in results.items():
+        status = f"built in {seconds:.2f}s" if built else "up to date"
+        print(f"  {stage:34s} {row_count:>10,} rows  {status}")
+
+
+def main(db_path=DEFAULT_DB_PATH, force=False):
+    conn = duckdb.connect(str(db_path))
+    try:
+        started = time.perf_counter()
+        print_run(run_pipeline(conn, force=force))
+        print(f"\nPipeline finished in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    main(args[0] if args else DEFAULT_DB_PATH, force="--force" in sys.argv[1:])
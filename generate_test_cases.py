@@ -1,15 +1,18 @@
 """
 Generate ground truth test cases by executing queries against DuckDB
-and storing results in JSON format for agent validation.
+and storing results for agent validation.
+
+Expected results go to the Parquet ground-truth store (ground_truth_store.py),
+regenerating only the cases whose SQL or underlying tables changed; the
+JSON file agent_ground_truth_test_cases.json is then exported from the
+store for the notebooks that read it.
 """
 
-import json
+import sys
 import duckdb
 from pathlib import Path
 
-# Connect to DuckDB
-db_path = Path('animal_shelter.duckdb')
-conn = duckdb.connect(str(db_path))
+from ground_truth_store import export_json, refresh_store
 
 # Define test cases with their ground truth SQL
 test_cases_config = [
@@ -221,63 +224,36 @@ test_cases_config = [
     }
 ]
 
-# Execute queries and build test cases with results
-test_cases = []
 
-print("Generating ground truth test cases...")
-print("=" * 80)
+def main(db_path='animal_shelter.duckdb', force=False):
+    conn = duckdb.connect(str(Path(db_path)), read_only=True)
+
+    print("Generating ground truth test cases...")
+    print("=" * 80)
 
-for test_config in test_cases_config:
-    print(f"\nTest {test_config['id']}: {test_config['name']}")
-    
     try:
-        # Execute the query
-        results = conn.execute(test_config['sql']).fetchall()
-        columns = [desc[0] for desc in conn.description]
-        
-        # Convert to list of dicts
-        result_dicts = [dict(zip(columns, row)) for row in results]
-        
-        # Convert any float values to proper format for JSON
-        for result in result_dicts:
-            for key, value in result.items():
-                if isinstance(value, float):
-                    result[key] = round(value, 2)
-        
-        # Build test case
-        test_case = {
-            "id": test_config['id'],
-            "name": test_config['name'],
-            "business_scenario": test_config['business_scenario'],
-            "natural_language_question": test_config['natural_language_question'],
-            "ground_truth_sql": test_config['sql'].strip(),
-            "expected_columns": columns,
-            "expected_results": result_dicts,
-            "result_count": len(result_dicts)
-        }
-        
-        test_cases.append(test_case)
-        print(f"  ✓ Executed successfully - {len(result_dicts)} rows")
-        print(f"  Columns: {', '.join(columns)}")
-        
-    except Exception as e:
-        print(f"  ✗ Error: {e}")
+        results = refresh_store(conn, test_cases_config, force=force)
+    finally:
+        # Close connection
+        conn.close()
+
+    for test_config in test_cases_config:
+        reason = results[test_config['id']]
+        print(f"\nTest {test_config['id']}: {test_config['name']}")
+        if reason:
+            print(f"  ✓ Executed successfully ({reason})")
+        else:
+            print(f"  ✓ Up to date - SQL and data unchanged")
 
-# Save to JSON file
-output = {
-    "project": "Austin Animal Shelter",
-    "description": "Ground truth test cases for MindsDB agent validation",
-    "total_test_cases": len(test_cases),
-    "test_cases": test_cases
-}
+    # Save to JSON file
+    count = export_json()
 
-with open('agent_ground_truth_test_cases.json', 'w', encoding='utf-8') as f:
-    json.dump(output, f, indent=2, ensure_ascii=False)
+    print("\n" + "=" * 80)
+    print(f"✓ Generated {count} test cases")
+    print("✓ Saved to: ground_truth/ and agent_ground_truth_test_cases.json")
+    print("=" * 80)
 
-print("\n" + "=" * 80)
-print(f"✓ Generated {len(test_cases)} test cases")
-print("✓ Saved to: agent_ground_truth_test_cases.json")
-print("=" * 80)
 
-# Close connection
-conn.close()
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    main(args[0] if args else 'animal_shelter.duckdb', force="--force" in sys.argv[1:])
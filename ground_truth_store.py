@@ -0,0 +1,283 @@
+"""
+Fingerprinted store of the expected results of the agent test cases.
+
+agent_ground_truth_test_cases.json holds every expected row as a JSON
+dict, has to be parsed as a whole by each validator and silently goes
+stale when the star schema is rebuilt. The store keeps instead:
+- ground_truth/case_NN.parquet: the result of each case's ground-truth SQL,
+  written by DuckDB's COPY with the query's own column types
+- ground_truth/manifest.json: the case metadata (question, SQL, columns,
+  row count) plus, per case, the hash of its canonical SQL, the tables it
+  reads and a content fingerprint of those tables
+
+refresh_store() regenerates only the cases whose SQL changed, whose file
+is missing or whose tables' contents changed. The database file's
+mtime/size fingerprint (result_cache.database_fingerprint) is recorded
+too, so when the file has not been touched no table is hashed at all;
+when it has, the referenced tables are hashed (the same row hash as
+feature_pipeline.table_fingerprint) and cases over unchanged tables are
+kept. stale_cases() reports what refresh_store() would regenerate, so a
+validator can refuse to score against outdated expectations.
+
+load_expected() memory-maps a case's Parquet file into an Arrow table
+(zero-copy; pandas via DuckDB when pyarrow is missing), which
+result_equivalence.compare_results registers in DuckDB as-is.
+
+    python ground_truth_store.py [path/to/animal_shelter.duckdb] [--force]
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+
+from feature_pipeline import table_fingerprint
+from result_cache import database_fingerprint, sql_hash
+
+try:
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+STORE_DIR = PROJECT_DIR / "ground_truth"
+MANIFEST_NAME = "manifest.json"
+LEGACY_JSON_PATH = PROJECT_DIR / "agent_ground_truth_test_cases.json"
+
+CASE_FIELDS = ["id", "name", "business_scenario", "natural_language_question"]
+
+
+class StaleGroundTruthError(Exception):
+    """Expected results were generated from other data or SQL than the current ones"""
+
+
+# ==============================================================================
+# MANIFEST / FINGERPRINTS
+# ==============================================================================
+
+def load_manifest(store_dir=STORE_DIR):
+    """The manifest dict; an empty one if the store does not exist yet"""
+    path = Path(store_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {"database_fingerprint": None, "cases": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest, store_dir):
+    path = Path(store_dir) / MANIFEST_NAME
+    temp_path = path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)  # readers never see a half-written manifest
+
+
+def _database_path(conn):
+    return conn.execute("SELECT file FROM pragma_database_list WHERE name = current_database()").fetchone()[0]
+
+
+def referenced_tables(conn, sql):
+    """Sorted names of the database tables the SQL mentions"""
+    tables = [row[0] for row in conn.execute("SELECT table_name FROM duckdb_tables()").fetchall()]
+    return sorted(t for t in tables if re.search(rf"\b{re.escape(t)}\b", sql, re.IGNORECASE))
+
+
+def data_fingerprint(conn, tables, cache=None):
+    """Fingerprint of the contents of `tables`; `cache` shares table hashes across cases"""
+    cache = {} if cache is None else cache
+    parts = []
+    for table in tables:
+        if table not in cache:
+            cache[table] = table_fingerprint(conn, table)
+        parts.append(f"{table}={cache[table]}")
+    return "|".join(parts)
+
+
+def _quote(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def _case_file(case_id):
+    return f"case_{int(case_id):02d}.parquet"
+
+
+def _stale_reason(conn, case, entry, store_dir, file_unchanged, cache):
+    """Why a stored case no longer matches `case` and the data, or None"""
+    if entry is None:
+        return "not generated yet"
+    if entry["sql_hash"] != sql_hash(case["sql"]):
+        return "SQL changed"
+    if not (Path(store_dir) / entry["file"]).exists():
+        return "result file missing"
+    if file_unchanged:
+        return None
+    tables = referenced_tables(conn, case["sql"])
+    if tables != entry["tables"] or data_fingerprint(conn, tables, cache) != entry["data_fingerprint"]:
+        return "data changed (" + ", ".join(tables) + ")"
+    return None
+
+
+def stale_cases(conn, cases, store_dir=STORE_DIR):
+    """{case id: reason} for the cases refresh_store() would regenerate"""
+    manifest = load_manifest(store_dir)
+    file_unchanged = manifest["database_fingerprint"] == database_fingerprint(_database_path(conn))
+    cache = {}
+    stale = {}
+    for case in cases:
+        reason = _stale_reason(conn, case, manifest["cases"].get(str(case["id"])), store_dir,
+                               file_unchanged, cache)
+        if reason:
+            stale[case["id"]] = reason
+    return stale
+
+
+# ==============================================================================
+# GENERATION
+# ==============================================================================
+
+def generate_case(conn, case, store_dir=STORE_DIR, cache=None):
+    """Run one case's SQL into its Parquet file; returns its manifest entry"""
+    sql = case["sql"].strip().rstrip(";")
+    file_name = _case_file(case["id"])
+    path = Path(store_dir) / file_name
+    temp_path = path.with_suffix(".tmp")
+    conn.execute(f"COPY ({sql}) TO {_quote(temp_path)} (FORMAT PARQUET)")
+    os.replace(temp_path, path)
+
+    described = conn.execute(f"DESCRIBE SELECT * FROM read_parquet({_quote(path)})").fetchall()
+    row_count = conn.execute(f"SELECT COUNT(*) FROM read_parquet({_quote(path)})").fetchone()[0]
+    tables = referenced_tables(conn, case["sql"])
+    entry = {field: case[field] for field in CASE_FIELDS}
+    entry.update({
+        "ground_truth_sql": case["sql"].strip(),
+        "expected_columns": [row[0] for row in described],
+        "column_types": [row[1] for row in described],
+        "result_count": row_count,
+        "file": file_name,
+        "sql_hash": sql_hash(case["sql"]),
+        "tables": tables,
+        "data_fingerprint": data_fingerprint(conn, tables, cache),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+    })
+    return entry
+
+
+def refresh_store(conn, cases, store_dir=STORE_DIR, force=False):
+    """Regenerate the stale cases (all with `force`) and drop removed ones
+
+    `cases` are dicts with id, name, business_scenario,
+    natural_language_question and sql (generate_test_cases.test_cases_config).
+    Returns {case id: reason it was regenerated, or None if it was current}.
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(store_dir)
+    current_file = database_fingerprint(_database_path(conn))
+    file_unchanged = manifest["database_fingerprint"] == current_file
+    cache = {}
+    results = {}
+    entries = {}
+    for case in cases:
+        key = str(case["id"])
+        entry = manifest["cases"].get(key)
+        reason = "forced" if force else _stale_reason(conn, case, entry, store_dir, file_unchanged, cache)
+        if reason:
+            entry = generate_case(conn, case, store_dir, cache)
+        elif any(entry.get(field) != case[field] for field in CASE_FIELDS):
+            entry.update({field: case[field] for field in CASE_FIELDS})  # wording only, results still valid
+        entries[key] = entry
+        results[case["id"]] = reason
+
+    for key, entry in manifest["cases"].items():
+        if key not in entries:
+            (store_dir / entry["file"]).unlink(missing_ok=True)
+    manifest["cases"] = entries
+    manifest["database_fingerprint"] = current_file
+    _save_manifest(manifest, store_dir)
+    return results
+
+
+# ==============================================================================
+# LOADING
+# ==============================================================================
+
+def load_cases(store_dir=STORE_DIR):
+    """Manifest entries of every stored case, by id (no result rows are read)"""
+    cases = load_manifest(store_dir)["cases"]
+    return [cases[key] for key in sorted(cases, key=int)]
+
+
+def load_expected(case, store_dir=STORE_DIR):
+    """Expected result of a case: a memory-mapped Arrow table (a DataFrame without pyarrow)"""
+    path = Path(store_dir) / case["file"]
+    if PYARROW_AVAILABLE:
+        return pq.read_table(path, memory_map=True)
+    return duckdb.read_parquet(str(path)).df()
+
+
+def ensure_current(conn, cases, store_dir=STORE_DIR):
+    """Raise StaleGroundTruthError naming every stale case"""
+    stale = stale_cases(conn, cases, store_dir)
+    if stale:
+        details = "; ".join(f"Q{case_id}: {reason}" for case_id, reason in stale.items())
+        raise StaleGroundTruthError(
+            f"Ground truth is out of date ({details}); run python generate_test_cases.py"
+        )
+
+
+def export_json(store_dir=STORE_DIR, path=LEGACY_JSON_PATH):
+    """Write the legacy agent_ground_truth_test_cases.json from the store
+
+    Kept for the notebooks that still read it. Floats are rounded to two
+    decimals as before.
+    """
+    test_cases = []
+    for entry in load_cases(store_dir):
+        relation = duckdb.read_parquet(str(Path(store_dir) / entry["file"]))
+        rows = [
+            {column: round(value, 2) if isinstance(value, float) else value
+             for column, value in zip(relation.columns, row)}
+            for row in relation.fetchall()
+        ]
+        test_cases.append({
+            **{field: entry[field] for field in CASE_FIELDS},
+            "ground_truth_sql": entry["ground_truth_sql"],
+            "expected_columns": entry["expected_columns"],
+            "expected_results": rows,
+            "result_count": entry["result_count"],
+        })
+    output = {
+        "project": "Austin Animal Shelter",
+        "description": "Ground truth test cases for MindsDB agent validation",
+        "total_test_cases": len(test_cases),
+        "test_cases": test_cases,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False, default=str)
+    return len(test_cases)
+
+
+def main(db_path=DEFAULT_DB_PATH, force=False):
+    from generate_test_cases import test_cases_config
+
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        started = time.perf_counter()
+        results = refresh_store(conn, test_cases_config, force=force)
+        for case_id, reason in results.items():
+            print(f"  Q{case_id:<3} {'regenerated (' + reason + ')' if reason else 'up to date'}")
+        print(f"\nGround truth store refreshed in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    main(args[0] if args else DEFAULT_DB_PATH, force="--force" in sys.argv[1:])
@@ -0,0 +1,182 @@
+"""
+Scheduler in front of the Ollama calls made by the Streamlit app.
+
+A single local model can only work on a few generations at a time, and
+several analysts clicking the same example question would otherwise start
+identical generations side by side. Every LLM call from the app therefore
+goes through one scheduler that provides:
+- bounded concurrency: at most `max_concurrent` calls run at once
+- admission control: at most `max_queued` calls wait; more are refused
+- a fair queue: waiting calls are dispatched round-robin across sessions,
+  so one session submitting many requests cannot starve the others
+- queue positions, so the UI can tell users how many requests are ahead
+- single-flight coalescing: a call whose key matches one that is queued or
+  running joins it and receives the same result instead of generating again
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+DEFAULT_MAX_CONCURRENT = 2
+DEFAULT_MAX_QUEUED = 32
+
+
+class SchedulerBusyError(Exception):
+    """The queue is full; the request was not admitted"""
+
+
+class Flight:
+    """One scheduled call, shared by every request coalesced into it"""
+
+    def __init__(self, scheduler, key, session, fn, args, kwargs, track_partial):
+        self._scheduler = scheduler
+        self.key = key
+        self.session = session
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.track_partial = track_partial
+        self.future = Future()
+        self.partial = ""  # text streamed so far (track_partial=True only)
+        self.waiters = 1
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+    def _on_token(self, text):
+        self.partial = text
+
+    def position(self):
+        """Number of queued calls that will be dispatched before this one (0 once running)"""
+        return self._scheduler.position(self)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class LLMScheduler:
+    """Bounded, fair, deduplicating executor for LLM calls"""
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, max_queued=DEFAULT_MAX_QUEUED):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # session -> deque of waiting flights, in round-robin order
+        self._in_flight = {}  # key -> flight (queued or running)
+        self._running = 0
+        self._queued = 0
+        self._workers = []
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    # --------------------------------------------------------------------------
+    # Submission
+    # --------------------------------------------------------------------------
+
+    def submit(self, key, fn, *args, session=None, track_partial=False, **kwargs):
+        """Schedule fn(*args, **kwargs) and return its Flight
+
+        Calls with the same `key` share one execution while it is queued or
+        running. With `track_partial=True`, `fn` receives an `on_token`
+        callback and the text streamed so far is available as
+        `flight.partial`; every other keyword (`stream` included) is passed
+        to `fn` unchanged. Raises SchedulerBusyError when the queue is full.
+        """
+        with self._cond:
+            self.submitted += 1
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                return flight
+            if self._queued >= self.max_queued:
+                self.rejected += 1
+                raise SchedulerBusyError(
+                    f"The model is busy ({self._queued} requests waiting); please try again shortly"
+                )
+            flight = Flight(self, key, session, fn, args, kwargs, track_partial)
+            self._in_flight[key] = flight
+            self._queues.setdefault(session, deque()).append(flight)
+            self._queued += 1
+            self._ensure_workers()
+            self._cond.notify()
+            return flight
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_concurrent:
+            worker = threading.Thread(
+                target=self._work, name=f"llm-scheduler-{len(self._workers)}", daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    # --------------------------------------------------------------------------
+    # Dispatch
+    # --------------------------------------------------------------------------
+
+    def _next_flight(self):
+        """Pop the next flight round-robin across sessions (caller holds the lock)"""
+        session, waiting = next(iter(self._queues.items()))
+        flight = waiting.popleft()
+        del self._queues[session]
+        if waiting:
+            self._queues[session] = waiting  # back of the rotation
+        self._queued -= 1
+        return flight
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+                flight = self._next_flight()
+                self._running += 1
+                flight.started_at = time.monotonic()
+
+            if flight.future.set_running_or_notify_cancel():
+                kwargs = dict(flight.kwargs)
+                if flight.track_partial:
+                    kwargs["on_token"] = flight._on_token
+                try:
+                    result = flight.fn(*flight.args, **kwargs)
+                except BaseException as e:
+                    flight.future.set_exception(e)
+                else:
+                    flight.future.set_result(result)
+
+            with self._cond:
+                self._running -= 1
+                if self._in_flight.get(flight.key) is flight:
+                    del self._in_flight[flight.key]
+
+    def position(self, flight):
+        """Dispatch position of a queued flight under the round-robin order"""
+        with self._cond:
+            if flight.started_at is not None or flight.future.done():
+                return 0
+            queues = [deque(waiting) for waiting in self._queues.values()]
+            ahead = 0
+            while queues:
+                for waiting in list(queues):
+                    if waiting.popleft() is flight:
+                        return ahead
+                    ahead += 1
+                    if not waiting:
+                        queues.remove(waiting)
+            return 0
+
+    def stats(self):
+        """Return queue and deduplication counters for display"""
+        with self._cond:
+            return {
+                "running": self._running,
+                "queued": self._queued,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,416 @@
+"""
+Shared Ollama client for the animal shelter agent.
+
+Used by the Streamlit app, quick_validation.py and the notebooks so they
+all talk to Ollama the same way:
+- one pooled keep-alive HTTP session instead of a new connection per call
+- health state refreshed by a background prober instead of inline /api/tags calls
+- model preloading with keep_alive pinning so the first question skips the cold load
+- bounded retries with exponential backoff for connection errors and 5xx answers
+- streaming generation with an early stop once the SQL statement is complete
+- reuse of the evaluated system prompt (Ollama `context` tokens) across questions
+- per-call timings and Ollama token counts for request_metrics.py
+"""
+
+import json
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OLLAMA_URL = "http://127.0.0.1:11434"
+OLLAMA_MODEL = "mistral:latest"
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps the model loaded after each request
+
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+# Mistral instruction template, applied by hand when sending raw prompts
+# that continue from a cached prefix context
+MISTRAL_INST_OPEN = "[INST] "
+MISTRAL_INST_CLOSE = " [/INST]"
+
+
+class OllamaClient:
+    """Pooled, retrying client for the Ollama HTTP API"""
+
+    def __init__(self, base_url=OLLAMA_URL, model=OLLAMA_MODEL, keep_alive=OLLAMA_KEEP_ALIVE,
+                 max_retries=2, backoff_seconds=0.5, pool_size=8):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.keep_alive = keep_alive
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._health_lock = threading.Lock()
+        self._health = {"ok": False, "models": [], "model_available": False,
+                        "error": "not checked yet", "checked_at": None}
+        self._prober = None
+        self._stop_probe = threading.Event()
+
+        # (model, prefix version) -> context tokens of the evaluated prefix
+        self._prefix_lock = threading.Lock()
+        self._prefix_contexts = {}
+
+    # --------------------------------------------------------------------------
+    # HTTP helpers
+    # --------------------------------------------------------------------------
+
+    def _request(self, method, path, **kwargs):
+        """Send a request, retrying connection errors and 5xx answers with backoff"""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    return response
+                response.close()
+            time.sleep(self.backoff_seconds * (2 ** attempt))
+
+    # --------------------------------------------------------------------------
+    # Health probing
+    # --------------------------------------------------------------------------
+
+    def check_health(self, timeout=2):
+        """Query /api/tags once and update the cached health state"""
+        try:
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
+            if response.status_code == 200:
+                models = [m['name'] for m in response.json().get('models', [])]
+                health = {"ok": True, "models": models, "model_available": self.model in models,
+                          "error": None}
+            else:
+                health = {"ok": False, "models": [], "model_available": False,
+                          "error": f"HTTP {response.status_code}"}
+        except Exception as e:
+            health = {"ok": False, "models": [], "model_available": False, "error": str(e)}
+        health["checked_at"] = time.time()
+        with self._health_lock:
+            self._health = health
+        return health["ok"]
+
+    def health(self):
+        """Return the most recent health state without touching the network"""
+        with self._health_lock:
+            return dict(self._health)
+
+    def start_health_probe(self, interval=15):
+        """Refresh the health state from a daemon thread every `interval` seconds"""
+        if self._prober is not None and self._prober.is_alive():
+            return
+
+        def probe():
+            while not self._stop_probe.is_set():
+                self.check_health()
+                self._stop_probe.wait(interval)
+
+        self._stop_probe.clear()
+        self._prober = threading.Thread(target=probe, name="ollama-health-probe", daemon=True)
+        self._prober.start()
+
+    def stop_health_probe(self):
+        self._stop_probe.set()
+
+    # --------------------------------------------------------------------------
+    # Model management
+    # --------------------------------------------------------------------------
+
+    def preload_model(self, timeout=300):
+        """Load the model into memory and pin it with keep_alive
+
+        An empty prompt makes Ollama load the model without generating.
+        Returns True when the model is ready.
+        """
+        try:
+            response = self._request(
+                "POST", "/api/generate",
+                json={"model": self.model, "prompt": "", "keep_alive": self.keep_alive},
+                timeout=timeout
+            )
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    def preload_model_async(self):
+        """Preload the model in a daemon thread so startup is not blocked"""
+        thread = threading.Thread(target=self.preload_model, name="ollama-preload", daemon=True)
+        thread.start()
+        return thread
+
+    # --------------------------------------------------------------------------
+    # Static prompt prefix reuse
+    # --------------------------------------------------------------------------
+
+    def prime_prefix(self, prefix, version, timeout=300):
+        """Evaluate a static prompt prefix once and cache Ollama's context tokens
+
+        The prefix is sent raw (already wrapped in the instruction template)
+        with a single predicted token; that token is trimmed from the returned
+        context so later requests continue exactly after the prefix. Only the
+        current `version` is kept, so a config version bump invalidates the
+        cached prefix. Returns the context tokens, or None on failure.
+        """
+        key = (self.model, str(version))
+        with self._prefix_lock:
+            if key in self._prefix_contexts:
+                return self._prefix_contexts[key]
+
+        try:
+            response = self._request(
+                "POST", "/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": prefix,
+                    "raw": True,
+                    "stream": False,
+                    "keep_alive": self.keep_alive,
+                    "options": {"num_predict": 1}
+                },
+                timeout=timeout
+            )
+        except Exception:
+            return None
+        if response.status_code != 200:
+            return None
+
+        result = response.json()
+        context = result.get('context')
+        if not context:
+            return None
+        generated = result.get('eval_count', 0)
+        if generated:
+            context = context[:-generated]
+
+        with self._prefix_lock:
+            self._prefix_contexts = {key: context}
+        return context
+
+    def prime_prefix_async(self, prefix, version):
+        """Evaluate the prefix in a daemon thread (e.g. right after startup)"""
+        thread = threading.Thread(target=self.prime_prefix, args=(prefix, version),
+                                  name="ollama-prime-prefix", daemon=True)
+        thread.start()
+        return thread
+
+    def clear_prefix_cache(self):
+        with self._prefix_lock:
+            self._prefix_contexts = {}
+
+    # --------------------------------------------------------------------------
+    # Generation
+    # --------------------------------------------------------------------------
+
+    def generate(self, prompt, temperature, timeout=60, stream=True, stop_when=None, on_token=None,
+                 context=None, raw=False, stats=None):
+        """Call /api/generate and return the generated text
+
+        In streaming mode tokens are read incrementally: `on_token(text_so_far)`
+        is called as text arrives and, once `stop_when(text_so_far)` returns True,
+        the connection is closed, which makes Ollama cancel the rest of the
+        generation. `context` continues from previously evaluated tokens and
+        `raw` skips Ollama's prompt template. Returns None if Ollama answers
+        with an error status. Connection errors are raised to the caller after
+        the retries are spent.
+
+        A `stats` dict is filled with the HTTP status and the call's timings:
+        http_status, seconds, first_token_seconds (streaming), chunks,
+        stopped_early and, when
+        Ollama sent its final chunk, prompt_eval_count, eval_count and the
+        load/prompt_eval/eval/total durations in seconds.
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "temperature": temperature,
+            "keep_alive": self.keep_alive
+        }
+        if context is not None:
+            payload["context"] = context
+        if raw:
+            payload["raw"] = True
+
+        stats = {} if stats is None else stats
+        started = time.perf_counter()
+        response = self._request("POST", "/api/generate", json=payload, timeout=timeout, stream=stream)
+        stats["http_status"] = response.status_code
+
+        if not stream:
+            stats["seconds"] = time.perf_counter() - started
+            if response.status_code != 200:
+                return None
+            result = response.json()
+            _record_ollama_stats(stats, result)
+            return result['response'].strip()
+
+        generated_text = ""
+        stats.update(chunks=0, stopped_early=False)
+        with response:
+            if response.status_code != 200:
+                stats["seconds"] = time.perf_counter() - started
+                return None
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if not stats["chunks"]:
+                    stats["first_token_seconds"] = time.perf_counter() - started
+                stats["chunks"] += 1
+                generated_text += chunk.get('response', '')
+                if on_token is not None:
+                    on_token(generated_text)
+                if chunk.get('done'):
+                    _record_ollama_stats(stats, chunk)
+                    break
+                if stop_when is not None and stop_when(generated_text):
+                    # Leaving the `with` block closes the connection and cancels generation
+                    stats["stopped_early"] = True
+                    break
+        stats["seconds"] = time.perf_counter() - started
+        return generated_text.strip()
+
+
+def _record_ollama_stats(stats, final_chunk):
+    """Copy Ollama's token counts and durations (nanoseconds -> seconds) into `stats`"""
+    for field in ("prompt_eval_count", "eval_count"):
+        if field in final_chunk:
+            stats[field] = final_chunk[field]
+    for field in ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration"):
+        if field in final_chunk:
+            stats[field] = final_chunk[field] / 1e9
+
+
+# ==============================================================================
+# TEXT-TO-SQL HELPERS
+# ==============================================================================
+
+def extract_sql(generated_text):
+    """Extract the first complete SELECT statement from model output, or None"""
+    sql_match = re.search(r'```(?:sql)?\s*(SELECT.*?);?\s*```', generated_text, re.DOTALL | re.IGNORECASE)
+
+    if not sql_match:
+        sql_match = re.search(r'(SELECT\s+.*?;)', generated_text, re.DOTALL | re.IGNORECASE)
+
+    if not sql_match:
+        return None
+
+    sql = sql_match.group(1)
+    sql = sql.replace('```', '').strip()
+    if not sql.endswith(';'):
+        sql += ';'
+    return sql
+
+
+def fix_common_sql_errors(sql):
+    """Fix common column name mistakes made by Mistral"""
+
+    # Fix gender-related column errors
+    # s.gender -> s.sex_upon_outcome
+    sql = re.sub(r'\bs\.gender\b', 's.sex_upon_outcome', sql, flags=re.IGNORECASE)
+    # s.sex_name -> s.sex_upon_outcome
+    sql = re.sub(r'\bs\.sex_name\b', 's.sex_upon_outcome', sql, flags=re.IGNORECASE)
+    # s.sex_on_outcome -> s.sex_upon_outcome
+    sql = re.sub(r'\bs\.sex_on_outcome\b', 's.sex_upon_outcome', sql, flags=re.IGNORECASE)
+
+    # Fix ambiguous sex_key references (add table prefix if missing)
+    # GROUP BY sex_key -> GROUP BY s.sex_key (when s alias is used)
+    sql = re.sub(r'GROUP BY\s+sex_key\b', 'GROUP BY s.sex_key', sql, flags=re.IGNORECASE)
+
+    # Fix date_key issues for date joins
+    # f.date_key -> f.outcome_date_key
+    sql = re.sub(r'\bf\.date_key\b', 'f.outcome_date_key', sql, flags=re.IGNORECASE)
+
+    return sql
+
+
+def build_sql_prompt(question, system_prompt, question_context=""):
+    """Prompt used for every text-to-SQL call"""
+    return f"{system_prompt}\n\n{build_sql_question(question, question_context)}"
+
+
+def build_sql_prefix(system_prompt):
+    """Static part of the text-to-SQL prompt, wrapped for raw mode"""
+    return f"{MISTRAL_INST_OPEN}{system_prompt}\n\n"
+
+
+def build_sql_question(question, question_context=""):
+    """Per-question part of the prompt: retrieved context (if any) and the question"""
+    context_block = f"{question_context}\n\n" if question_context else ""
+    return f"""{context_block}Question: {question}
+
+Generate SQL query:"""
+
+
+def build_sql_suffix(question, question_context=""):
+    """Per-question part of the text-to-SQL prompt, closing the instruction"""
+    return f"{build_sql_question(question, question_context)}{MISTRAL_INST_CLOSE}"
+
+
+def mistral_text_to_sql(client, question, system_prompt, timeout=60, stream=True, prefix_version=None,
+                        retriever=None, stats=None, on_token=None):
+    """Generate SQL from natural language using Mistral via the shared client
+
+    Streams the answer and stops as soon as a complete statement (closing
+    fence or `;`) has arrived. When `prefix_version` is given (the config
+    version), the system prompt is evaluated once and its context tokens are
+    reused, so each question only pays for its own tokens; if priming fails
+    the full prompt is sent as before. Returns None if no SQL could be
+    extracted; connection errors propagate so callers can report them.
+
+    With a `retriever` (prompt_retrieval.PromptRetriever) the static prefix
+    is the retriever's preamble + pinned schema, and only the schema
+    sections, rules and examples relevant to the question are appended.
+
+    A `stats` dict receives the generation stats (see OllamaClient.generate),
+    prefix_reused and fix_seconds (time spent in fix_common_sql_errors).
+    `on_token` is passed on to OllamaClient.generate.
+    """
+    if retriever is not None:
+        static_prompt, question_context = retriever.build_prompt_parts(question)
+    else:
+        static_prompt, question_context = system_prompt, ""
+
+    context = None
+    if prefix_version is not None:
+        context = client.prime_prefix(build_sql_prefix(static_prompt), prefix_version)
+
+    if context:
+        prompt, raw = build_sql_suffix(question, question_context), True
+    else:
+        prompt, raw = build_sql_prompt(question, static_prompt, question_context), False
+
+    stats = {} if stats is None else stats
+    stats["prefix_reused"] = bool(context)
+    generated_text = client.generate(
+        prompt,
+        temperature=0.3,
+        timeout=timeout,
+        stream=stream,
+        stop_when=lambda text: extract_sql(text) is not None,
+        on_token=on_token,
+        context=context,
+        raw=raw,
+        stats=stats
+    )
+    if generated_text is None:
+        return None
+
+    sql = extract_sql(generated_text)
+    if sql is None:
+        return None
+
+    # Post-process SQL to fix common Mistral mistakes
+    fix_started = time.perf_counter()
+    sql = fix_common_sql_errors(sql)
+    stats["fix_seconds"] = time.perf_counter() - fix_started
+    return sql
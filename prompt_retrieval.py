@@ -0,0 +1,244 @@
+"""
+Question-aware prompt assembly for text-to-SQL.
+
+Instead of sending the whole schema context, every rule and every few-shot
+example with each question, the prompt is split into retrievable pieces:
+- schema sections from MINDSDB_SCHEMA_CONTEXT.txt (one per table / topic)
+- the numbered IMPORTANT RULES from the agent system prompt
+- the FEW-SHOT EXAMPLES (question + SQL) from the agent system prompt
+
+A small BM25 index (NumPy, no network) ranks the pieces per question and
+only the relevant tables, rules and top-k examples are included, within a
+token budget. The preamble and the pinned sections (fact table, join
+syntax) form a static prefix that is identical for every question, so it
+can still be evaluated once and reused by the Ollama client.
+"""
+
+import re
+
+import numpy as np
+
+# Schema sections always included (matched against the section heading)
+PINNED_SECTION_KEYWORDS = ("FACT TABLE", "JOIN SYNTAX")
+
+DEFAULT_TOKEN_BUDGET = 1500  # tokens for the question-specific part of the prompt
+DEFAULT_TOP_K_EXAMPLES = 3
+DEFAULT_TOP_K_RULES = 6
+CHARS_PER_TOKEN = 4  # rough estimate for Mistral's tokenizer on English/SQL
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "each", "for", "from",
+    "how", "in", "is", "it", "many", "me", "of", "on", "or", "show", "that", "the", "their",
+    "there", "these", "this", "to", "us", "was", "were", "what", "when", "which", "who",
+    "with", "would", "you",
+}
+
+
+def tokenize(text):
+    """Lowercase word tokens with a crude suffix stemmer ("adopted" -> "adopt")"""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(word) > 4 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        tokens.append(word)
+    return tokens
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents, vectorized with NumPy"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        tokenized = [tokenize(doc) for doc in documents]
+        vocabulary = {}
+        for tokens in tokenized:
+            for token in tokens:
+                vocabulary.setdefault(token, len(vocabulary))
+        self.vocabulary = vocabulary
+
+        self.term_freqs = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(tokenized):
+            for token in tokens:
+                self.term_freqs[row, vocabulary[token]] += 1
+
+        self.doc_lengths = self.term_freqs.sum(axis=1)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(documents) else 0.0
+        doc_freqs = (self.term_freqs > 0).sum(axis=0)
+        n_docs = len(documents)
+        self.idf = np.log(1 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+    def scores(self, query):
+        """BM25 score of every document for the query"""
+        columns = [self.vocabulary[t] for t in set(tokenize(query)) if t in self.vocabulary]
+        if not columns or self.avg_doc_length == 0:
+            return np.zeros(len(self.term_freqs), dtype=np.float32)
+        tf = self.term_freqs[:, columns]
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avg_doc_length)
+        weighted = tf * (self.k1 + 1) / (tf + norm[:, None])
+        return weighted @ self.idf[columns]
+
+
+# ==============================================================================
+# PROMPT PARSING
+# ==============================================================================
+
+def split_schema_sections(schema_context):
+    """Split the schema context markdown into (heading, text) sections"""
+    sections = []
+    current_heading, current_lines = None, []
+    for line in schema_context.replace('\r\n', '\n').split('\n'):
+        if re.match(r"^#{2,3} ", line):
+            if current_heading is not None and any(l.strip() for l in current_lines):
+                sections.append((current_heading, "\n".join([current_heading] + current_lines).strip()))
+            current_heading, current_lines = line.strip(), []
+        elif current_heading is not None:
+            current_lines.append(line)
+    if current_heading is not None and any(l.strip() for l in current_lines):
+        sections.append((current_heading, "\n".join([current_heading] + current_lines).strip()))
+    return sections
+
+
+def split_system_prompt(system_prompt):
+    """Split the agent system prompt into preamble, rules and few-shot examples
+
+    Returns None if the prompt does not have the expected layout
+    ("Schema Overview:", "IMPORTANT RULES:", "FEW-SHOT EXAMPLES:").
+    """
+    text = system_prompt.replace('\r\n', '\n')
+    try:
+        schema_start = text.index("Schema Overview:")
+        rules_start = text.index("IMPORTANT RULES:")
+        examples_start = text.index("FEW-SHOT EXAMPLES:")
+    except ValueError:
+        return None
+
+    preamble = text[:schema_start].strip()
+
+    rules = []
+    for line in text[rules_start + len("IMPORTANT RULES:"):examples_start].strip().split('\n'):
+        if re.match(r"^\d+\.\s", line):
+            rules.append(line.rstrip())
+        elif rules and line.strip():
+            rules[-1] += "\n" + line.rstrip()  # continuation / sub-bullet of the previous rule
+
+    examples = []
+    for block in re.split(r"\n-{20,}\n?", text[examples_start + len("FEW-SHOT EXAMPLES:"):]):
+        block = block.strip().strip('=').strip()
+        if block.startswith("Example") and "SQL:" in block:
+            # Numbering is reassigned when the prompt is assembled
+            examples.append(re.sub(r"^Example \d+\s*", "", block))
+
+    return {"preamble": preamble, "rules": rules, "examples": examples}
+
+
+# ==============================================================================
+# RETRIEVER
+# ==============================================================================
+
+class PromptRetriever:
+    """Builds a question-specific prompt from the schema, rules and examples"""
+
+    def __init__(self, system_prompt, schema_context, token_budget=DEFAULT_TOKEN_BUDGET,
+                 top_k_examples=DEFAULT_TOP_K_EXAMPLES, top_k_rules=DEFAULT_TOP_K_RULES):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.top_k_examples = top_k_examples
+        self.top_k_rules = top_k_rules
+
+        parts = split_system_prompt(system_prompt)
+        self.enabled = parts is not None
+        if not self.enabled:
+            # Unknown prompt layout: fall back to the full system prompt
+            self.static_prompt = system_prompt
+            return
+
+        sections = split_schema_sections(schema_context)
+        pinned = [text for heading, text in sections
+                  if any(k in heading.upper() for k in PINNED_SECTION_KEYWORDS)]
+        self.static_prompt = parts["preamble"] + "\n\nSchema Overview:\n\n" + "\n\n".join(pinned)
+
+        # Candidate pieces: (kind, original position, text)
+        self.pieces = []
+        for position, (heading, text) in enumerate(sections):
+            if text not in pinned:
+                self.pieces.append(("schema", position, text))
+        for position, rule in enumerate(parts["rules"]):
+            self.pieces.append(("rule", position, rule))
+        for position, example in enumerate(parts["examples"]):
+            self.pieces.append(("example", position, example))
+
+        self.index = BM25Index([text for _, _, text in self.pieces])
+
+    def retrieve(self, question):
+        """Select the pieces relevant to the question within the token budget"""
+        if not self.enabled or not self.pieces:
+            return []
+
+        scores = self.index.scores(question)
+        limits = {"example": self.top_k_examples, "rule": self.top_k_rules, "schema": len(self.pieces)}
+        counts = {"example": 0, "rule": 0, "schema": 0}
+        used_tokens = 0
+        selected = []
+        for idx in np.argsort(-scores, kind="stable"):
+            if scores[idx] <= 0:
+                break
+            kind, position, text = self.pieces[idx]
+            cost = estimate_tokens(text)
+            if counts[kind] >= limits[kind] or used_tokens + cost > self.token_budget:
+                continue
+            counts[kind] += 1
+            used_tokens += cost
+            selected.append((kind, position, text, float(scores[idx])))
+
+        # Pull in the table sections referenced by the selected examples and rules
+        referenced = set()
+        for kind, _, text, _ in selected:
+            if kind != "schema":
+                referenced.update(re.findall(r"\bdim_[a-z_]+", text))
+        chosen = {id(text) for _, _, text, _ in selected}
+        for kind, position, text in self.pieces:
+            if kind != "schema" or id(text) in chosen:
+                continue
+            heading = text.split("\n", 1)[0]
+            tables = set(re.findall(r"\bdim_[a-z_]+", heading))
+            cost = estimate_tokens(text)
+            if tables & referenced and used_tokens + cost <= self.token_budget:
+                used_tokens += cost
+                selected.append((kind, position, text, 0.0))
+        return selected
+
+    def question_context(self, question):
+        """Render the retrieved schema sections, rules and examples for a question"""
+        if not self.enabled:
+            return ""
+        selected = self.retrieve(question)
+
+        schema = sorted((p, t) for k, p, t, _ in selected if k == "schema")
+        rules = sorted((p, t) for k, p, t, _ in selected if k == "rule")
+        # Examples stay in relevance order, most relevant first
+        examples = [t for k, _, t, _ in selected if k == "example"]
+
+        blocks = []
+        if schema:
+            blocks.append("\n\n".join(text for _, text in schema))
+        if rules:
+            blocks.append("IMPORTANT RULES:\n" + "\n".join(text for _, text in rules))
+        if examples:
+            rendered = "FEW-SHOT EXAMPLES:\n" + "=" * 80 + "\n"
+            for number, example in enumerate(examples, 1):
+                rendered += f"\nExample {number} {example}\n" + "-" * 80 + "\n"
+            blocks.append(rendered.rstrip())
+        return "\n\n".join(blocks)
+
+    def build_prompt_parts(self, question):
+        """Return (static prefix, question-specific context) for a question"""
+        return self.static_prompt, self.question_context(question)
@@ -0,0 +1,204 @@
+"""
+Guarded execution of LLM-generated SQL against DuckDB.
+
+Generated SQL is untrusted: a bad join (for example on the role-playing
+dim_date keys) can multiply the 172k fact rows into billions and freeze
+the connection. Every query therefore goes through:
+- an EXPLAIN-based pre-check that rejects plans whose estimated cardinality
+  explodes or that contain a cross product / nested loop / inequality join
+  over large inputs. DuckDB prints no estimate for a CROSS_PRODUCT, so the
+  output of these operators is estimated as the product of their inputs.
+- a DuckDB memory limit on the executing connection
+- a wall-clock timeout enforced with `connection.interrupt()`
+- a row cap, so at most `max_rows` rows are fetched for display
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import duckdb
+import pandas as pd
+
+from result_cache import SQL_TOKEN_PATTERN
+
+DEFAULT_TIMEOUT_SECONDS = 30
+DEFAULT_MEMORY_LIMIT = "2GB"
+DEFAULT_MAX_ROWS = 10_000
+DEFAULT_MAX_ESTIMATED_ROWS = 50_000_000
+DEFAULT_MAX_CROSS_PRODUCT_ROWS = 1_000_000
+
+# Operators whose output size can approach the product of their inputs
+CROSS_PRODUCT_OPERATORS = (
+    "CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN", "PIECEWISE_MERGE_JOIN", "IE_JOIN",
+)
+
+
+class QueryGuardError(Exception):
+    """Base class for queries stopped by the guardrails"""
+
+
+class QueryRejectedError(QueryGuardError):
+    """The query plan was rejected before execution"""
+
+
+class QueryTimeoutError(QueryGuardError):
+    """The query ran longer than the wall-clock limit and was interrupted"""
+
+
+def strip_sql_tail(sql):
+    """SQL without trailing whitespace, semicolons and comments
+
+    Safe to wrap in parentheses or prefix with EXPLAIN: a trailing `-- ...`
+    comment would otherwise swallow the closing parenthesis.
+    """
+    end = 0  # end of the last character that is neither a comment nor a trailing ';'
+    position = 0
+    for match in SQL_TOKEN_PATTERN.finditer(sql):
+        code = sql[position:match.start()].rstrip(" \t\r\n;")
+        if code:
+            end = position + len(code)
+        if match.group("comment") is None:
+            end = match.end()
+        position = match.end()
+    code = sql[position:].rstrip(" \t\r\n;")
+    if code:
+        end = position + len(code)
+    return sql[:end].strip()
+
+
+def explain_tree(conn, sql):
+    """Root operators of a query's physical plan (EXPLAIN (FORMAT JSON))"""
+    rows = conn.execute(f"EXPLAIN (FORMAT JSON) {strip_sql_tail(sql)}").fetchall()
+    return json.loads(rows[0][1])
+
+
+def _own_estimate(node):
+    value = node.get("extra_info", {}).get("Estimated Cardinality")
+    try:
+        return int(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def estimate_operators(nodes):
+    """[(operator name, estimated output rows)] of every operator in a plan tree
+
+    Operators without their own estimate take the largest of their inputs,
+    except the cross-product-like ones, which take the product of their
+    inputs (the worst case, also when DuckDB's own estimate is lower).
+    """
+    operators = []
+
+    def visit(node):
+        children = [visit(child) for child in node.get("children", [])]
+        estimate = _own_estimate(node)
+        if node["name"] in CROSS_PRODUCT_OPERATORS and children:
+            estimate = max(estimate or 0, math.prod(children))
+        elif estimate is None:
+            estimate = max(children, default=0)
+        operators.append((node["name"], estimate))
+        return estimate
+
+    for node in nodes:
+        visit(node)
+    return operators
+
+
+class GuardedExecutor:
+    """Runs SQL with a plan pre-check, timeout, memory limit and row cap"""
+
+    def __init__(self, timeout_seconds=DEFAULT_TIMEOUT_SECONDS, memory_limit=DEFAULT_MEMORY_LIMIT,
+                 max_rows=DEFAULT_MAX_ROWS, max_estimated_rows=DEFAULT_MAX_ESTIMATED_ROWS,
+                 max_cross_product_rows=DEFAULT_MAX_CROSS_PRODUCT_ROWS):
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit = memory_limit
+        self.max_rows = max_rows
+        self.max_estimated_rows = max_estimated_rows
+        self.max_cross_product_rows = max_cross_product_rows
+
+    def check_plan(self, conn, sql):
+        """Reject obviously explosive plans; returns the largest estimated cardinality"""
+        operators = estimate_operators(explain_tree(conn, sql))
+        largest = max((estimate for _, estimate in operators), default=0)
+
+        if largest > self.max_estimated_rows:
+            raise QueryRejectedError(
+                f"Query plan is estimated to produce ~{largest:,} intermediate rows "
+                f"(limit {self.max_estimated_rows:,}). Check the join conditions."
+            )
+        for name, estimate in operators:
+            if name in CROSS_PRODUCT_OPERATORS and estimate > self.max_cross_product_rows:
+                raise QueryRejectedError(
+                    f"Query plan contains a cross product / nested loop join ({name}) producing "
+                    f"~{estimate:,} rows. Every dimension must be joined on its key."
+                )
+        return largest
+
+    def apply_settings(self, conn):
+        """Apply the memory limit to the connection the query runs on
+
+        DuckDB limits memory per database instance rather than per query, so
+        this bounds every query running on that instance.
+        """
+        if self.memory_limit:
+            conn.execute(f"SET memory_limit = '{self.memory_limit}'")
+
+    @contextmanager
+    def deadline(self, conn):
+        """Interrupt whatever runs on `conn` inside the block after the timeout"""
+        timed_out = threading.Event()
+
+        def interrupt():
+            timed_out.set()
+            conn.interrupt()
+
+        timer = threading.Timer(self.timeout_seconds, interrupt)
+        timer.daemon = True
+        started = time.perf_counter()
+        timer.start()
+        try:
+            yield
+        except duckdb.InterruptException as e:
+            if timed_out.is_set():
+                raise QueryTimeoutError(
+                    f"Query was cancelled after {time.perf_counter() - started:.0f}s "
+                    f"(limit {self.timeout_seconds}s)"
+                ) from e
+            raise
+        finally:
+            timer.cancel()
+
+    def execute(self, conn, sql, max_rows=None):
+        """Run a query under the guardrails
+
+        Returns (DataFrame, truncated) where `truncated` is True when the
+        result had more than `max_rows` rows and only the first ones were
+        fetched. Raises QueryRejectedError or QueryTimeoutError.
+        """
+        max_rows = self.max_rows if max_rows is None else max_rows
+
+        self.check_plan(conn, sql)
+        self.apply_settings(conn)
+
+        with self.deadline(conn):
+            conn.execute(sql)
+            chunks, fetched = [], 0
+            while fetched <= max_rows:
+                chunk = conn.fetch_df_chunk()
+                if len(chunk) == 0:
+                    break
+                chunks.append(chunk)
+                fetched += len(chunk)
+
+        if chunks:
+            df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        else:
+            df = pd.DataFrame(columns=[desc[0] for desc in conn.description or []])
+
+        truncated = len(df) > max_rows
+        if truncated:
+            df = df.head(max_rows)
+        return df, truncated
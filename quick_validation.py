@@ -1,46 +1,43 @@
 import json
+import sys
 import duckdb
-import requests
-import re
 from pathlib import Path
 
+from generate_test_cases import test_cases_config
+from ground_truth_store import StaleGroundTruthError, ensure_current, load_cases, load_expected
+from ollama_client import OllamaClient, mistral_text_to_sql
+from prompt_retrieval import PromptRetriever
+from result_equivalence import compare_results
+
 PROJECT_DIR = Path.cwd()
 db_path = PROJECT_DIR / 'animal_shelter.duckdb'
 conn = duckdb.connect(str(db_path), read_only=True)
 
-# Load all 11 tests
-with open(PROJECT_DIR / 'agent_ground_truth_test_cases.json', 'r') as f:
-    test_cases = json.load(f)['test_cases']
+# Load all 11 tests from the ground-truth store; stale expectations are refreshed
+# explicitly with generate_test_cases.py, never silently from the current data
+try:
+    ensure_current(conn, test_cases_config)
+except StaleGroundTruthError as e:
+    print(e)
+    sys.exit(1)
+test_cases = load_cases()
 
 with open(PROJECT_DIR / 'mindsdb_agent_config.json', 'r') as f:
-    system_prompt = json.load(f)['system_prompt']
+    agent_config = json.load(f)
+system_prompt = agent_config['system_prompt']
 
-def mistral_text_to_sql(question, system_prompt):
-    OLLAMA_URL = "http://127.0.0.1:11434"
-    OLLAMA_MODEL = "mistral:latest"
-    
-    prompt = f"""{system_prompt}
+with open(PROJECT_DIR / 'MINDSDB_SCHEMA_CONTEXT.txt', 'r', encoding='utf-8') as f:
+    schema_context = f.read()
 
-Question: {question}
+# Same question-aware prompt as the web app (built once for all cases)
+retriever = PromptRetriever(system_prompt, schema_context)
+prompt_version = f"{agent_config.get('version', 'unknown')}+retrieval"
 
-Generate SQL query:"""
-    
-    try:
-        payload = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "temperature": 0.3}
-        response = requests.post(f"{OLLAMA_URL}/api/generate", json=payload, timeout=90)
-        
-        if response.status_code == 200:
-            generated_text = response.json()['response'].strip()
-            sql_match = re.search(r'```(?:sql)?\s*(SELECT.*?);?\s*```', generated_text, re.DOTALL | re.IGNORECASE)
-            if not sql_match:
-                sql_match = re.search(r'(SELECT\s+.*?;)', generated_text, re.DOTALL | re.IGNORECASE)
-            if sql_match:
-                sql = sql_match.group(1).replace('```', '').strip()
-                return sql + ';' if not sql.endswith(';') else sql
-        return None
-    except Exception as e:
-        print(f"Exception: {e}")
-        return None
+# Shared Ollama client (pooled session, retries, model preloaded before the first case)
+client = OllamaClient()
+if not client.check_health():
+    print(f"WARNING: Ollama not reachable at {client.base_url}")
+client.preload_model()
 
 print("\nFULL VALIDATION - ALL 11 TEST CASES")
 print("="*80)
@@ -50,26 +47,35 @@ for test_case in test_cases:
     test_id = test_case['id']
     test_name = test_case['name']
     question = test_case['natural_language_question']
-    expected_rows = len(test_case['expected_results'])
     
     print(f"\nQ{test_id}: {test_name}")
     print(f"  Question: {question[:60]}...")
     
-    generated_sql = mistral_text_to_sql(question, system_prompt)
+    try:
+        # The system prompt is evaluated once and its context reused for every case
+        generated_sql = mistral_text_to_sql(client, question, system_prompt, timeout=90,
+                                            prefix_version=prompt_version, retriever=retriever)
+    except Exception as e:
+        print(f"Exception: {e}")
+        generated_sql = None
     
     if not generated_sql:
         print("  ERROR: Could not generate SQL")
         continue
     
     try:
-        actual_count = len(conn.execute(generated_sql).df())
-        if actual_count == expected_rows:
-            print(f"  PASSED: {actual_count} rows")
-            passed += 1
-        else:
-            print(f"  FAILED: Got {actual_count}, expected {expected_rows}")
+        result_df = conn.execute(generated_sql).df()
     except Exception as e:
         print(f"  ERROR: {str(e)[:60]}")
+        continue
+
+    # Same rows and values as the ground truth, in any order and under any column aliases
+    comparison = compare_results(conn, result_df, load_expected(test_case))
+    if comparison:
+        print(f"  PASSED: {len(result_df)} rows match")
+        passed += 1
+    else:
+        print("  FAILED: " + comparison.diff(limit=3).replace("\n", "\n    "))
 
 print(f"\n{'='*80}")
 print(f"Passed: {passed}/11 = {100*passed/11:.1f}%")
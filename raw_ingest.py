@@ -0,0 +1,301 @@
+"""
+Bulk loader for the raw intake and outcome exports.
+
+    python raw_ingest.py [--db path/to/animal_shelter.duckdb] FILE_OR_DIR [...]
+
+Accepts CSV (optionally gzipped) and Parquet files, or directories holding
+them. Each file is classified as intakes or outcomes from its columns.
+All new files of one kind are read in a single DuckDB scan, so the
+multi-threaded CSV/Parquet readers work through them in parallel.
+
+- Schema: CSV files are read with every column as text (no type sniffing)
+  and converted to the types declared in INTAKE_SCHEMA / OUTCOME_SCHEMA;
+  timestamps and dates are parsed with explicit formats. A file missing
+  a required column is rejected before anything is loaded. Rows without
+  an Animal ID or a parsable DateTime are counted as rejected.
+- Deduplication: one row per (Animal ID, DateTime), both within the new
+  files and against rows already in the raw table.
+- Idempotence: the SHA-256 of every loaded file is recorded in
+  raw_ingest_files; files whose checksum is already there are skipped,
+  whatever their name or location.
+
+Each kind is loaded in one transaction together with its checksum
+records. After loading, `python star_build.py --incremental` appends the
+new outcomes to the consolidated table and the star schema.
+"""
+
+import hashlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import duckdb
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+INGEST_LOG_TABLE = "raw_ingest_files"
+
+INTAKE_SCHEMA = {
+    "Animal ID": "VARCHAR",
+    "Name": "VARCHAR",
+    "DateTime": "TIMESTAMP",
+    "MonthYear": "VARCHAR",
+    "Found Location": "VARCHAR",
+    "Intake Type": "VARCHAR",
+    "Intake Condition": "VARCHAR",
+    "Animal Type": "VARCHAR",
+    "Sex upon Intake": "VARCHAR",
+    "Age upon Intake": "VARCHAR",
+    "Breed": "VARCHAR",
+    "Color": "VARCHAR",
+}
+
+OUTCOME_SCHEMA = {
+    "Animal ID": "VARCHAR",
+    "Name": "VARCHAR",
+    "DateTime": "TIMESTAMP",
+    "MonthYear": "VARCHAR",
+    "Date of Birth": "DATE",
+    "Outcome Type": "VARCHAR",
+    "Outcome Subtype": "VARCHAR",
+    "Animal Type": "VARCHAR",
+    "Sex upon Outcome": "VARCHAR",
+    "Age upon Outcome": "VARCHAR",
+    "Breed": "VARCHAR",
+    "Color": "VARCHAR",
+}
+
+# kind -> (raw table, schema, column that identifies the kind)
+KINDS = {
+    "intakes": ("raw_animal_intakes", INTAKE_SCHEMA, "Intake Type"),
+    "outcomes": ("raw_animal_outcomes", OUTCOME_SCHEMA, "Outcome Type"),
+}
+
+# City portal exports have used both US-style and ISO timestamps
+TIMESTAMP_FORMATS = [
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %H:%M",
+    "%Y-%m-%dT%H:%M:%S.%g",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%g",
+    "%Y-%m-%d %H:%M:%S",
+]
+DATE_FORMATS = ["%m/%d/%Y", "%Y-%m-%d", *TIMESTAMP_FORMATS]
+
+FILE_SUFFIXES = {".csv": "csv", ".gz": "csv", ".parquet": "parquet"}
+
+CHECKSUM_WORKERS = 4
+
+
+class IngestError(Exception):
+    """A file cannot be loaded (unknown format or missing columns)"""
+
+
+# ==============================================================================
+# FILE DISCOVERY / CHECKSUMS
+# ==============================================================================
+
+def expand_paths(paths):
+    """Files under the given files/directories with a supported suffix, sorted"""
+    files = []
+    for path in map(Path, paths):
+        candidates = sorted(path.rglob("*")) if path.is_dir() else [path]
+        files += [f for f in candidates if f.is_file() and f.suffix.lower() in FILE_SUFFIXES]
+    return files
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _quote(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def _reader_sql(format, files):
+    file_list = "[" + ", ".join(_quote(f) for f in files) + "]"
+    if format == "csv":
+        # all_varchar turns off type sniffing; types come from the declared schema
+        return (f"read_csv({file_list}, header = true, all_varchar = true, delim = ',', quote = '\"', "
+                f"escape = '\"', union_by_name = true, filename = true)")
+    return f"read_parquet({file_list}, union_by_name = true, filename = true)"
+
+
+def _file_format(path):
+    return FILE_SUFFIXES[path.suffix.lower()]
+
+
+def classify_file(conn, path):
+    """'intakes' or 'outcomes' from the file's columns; raises IngestError"""
+    columns = [row[0] for row in conn.execute(
+        f"DESCRIBE SELECT * FROM {_reader_sql(_file_format(path), [path])}"
+    ).fetchall()]
+    for kind, (_, schema, marker) in KINDS.items():
+        if marker in columns:
+            missing = [c for c in schema if c not in columns]
+            if missing:
+                raise IngestError(f"{path}: missing {kind} columns {missing}")
+            return kind
+    raise IngestError(f"{path}: neither an intake nor an outcome export (columns: {columns})")
+
+
+# ==============================================================================
+# LOADING
+# ==============================================================================
+
+def _typed_column(column, data_type):
+    cast = f'TRY_CAST("{column}" AS {data_type})'
+    text = f'CAST("{column}" AS VARCHAR)'
+    # The native cast covers Parquet timestamps and ISO text; the formats cover the rest
+    if data_type == "TIMESTAMP":
+        formats = "[" + ", ".join(_quote(f) for f in TIMESTAMP_FORMATS) + "]"
+        return f'COALESCE({cast}, try_strptime({text}, {formats})) AS "{column}"'
+    if data_type == "DATE":
+        formats = "[" + ", ".join(_quote(f) for f in DATE_FORMATS) + "]"
+        return f'COALESCE({cast}, CAST(try_strptime({text}, {formats}) AS DATE)) AS "{column}"'
+    return f'{cast} AS "{column}"'
+
+
+def _ensure_tables(conn, table, schema):
+    columns = ", ".join(f'"{name}" {data_type}' for name, data_type in schema.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {INGEST_LOG_TABLE} (
+            file_name VARCHAR,
+            sha256 VARCHAR,
+            kind VARCHAR,
+            rows_read BIGINT,
+            rows_inserted BIGINT,
+            rows_rejected BIGINT,
+            loaded_at TIMESTAMP
+        )
+    """)
+
+
+def load_kind(conn, kind, files):
+    """Load files of one kind in one transaction
+
+    `files` is [(path, sha256)]. Returns {path: (rows read, rows inserted, rows rejected)}.
+    """
+    table, schema, _ = KINDS[kind]
+    typed = ", ".join(_typed_column(c, t) for c, t in schema.items())
+    by_format = {}
+    for path, _ in files:
+        by_format.setdefault(_file_format(path), []).append(path)
+    scans = " UNION ALL BY NAME ".join(
+        f"SELECT {typed}, filename FROM {_reader_sql(fmt, paths)}" for fmt, paths in by_format.items()
+    )
+    names = ", ".join(f'"{c}"' for c in schema)
+
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        _ensure_tables(conn, table, schema)
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE ingest_batch AS {scans}")
+        # First row per (Animal ID, DateTime) that the raw table does not have yet
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE ingest_new AS
+            SELECT * FROM (
+                SELECT * FROM ingest_batch
+                WHERE "Animal ID" IS NOT NULL AND "DateTime" IS NOT NULL
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY "Animal ID", "DateTime" ORDER BY filename) = 1
+            ) b
+            ANTI JOIN {table} r ON r."Animal ID" = b."Animal ID" AND r."DateTime" = b."DateTime"
+        """)
+        conn.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM ingest_new")
+
+        counts = dict.fromkeys((str(path) for path, _ in files), (0, 0, 0))
+        for file_name, read, rejected in conn.execute("""
+            SELECT filename, COUNT(*), COUNT(*) FILTER ("Animal ID" IS NULL OR "DateTime" IS NULL)
+            FROM ingest_batch GROUP BY filename
+        """).fetchall():
+            counts[file_name] = (read, 0, rejected)
+        for file_name, inserted in conn.execute(
+            "SELECT filename, COUNT(*) FROM ingest_new GROUP BY filename"
+        ).fetchall():
+            read, _, rejected = counts[file_name]
+            counts[file_name] = (read, inserted, rejected)
+
+        for path, checksum in files:
+            read, inserted, rejected = counts[str(path)]
+            conn.execute(
+                f"INSERT INTO {INGEST_LOG_TABLE} VALUES (?, ?, ?, ?, ?, ?, current_timestamp::TIMESTAMP)",
+                [str(path), checksum, kind, read, inserted, rejected]
+            )
+        conn.execute("DROP TABLE ingest_batch")
+        conn.execute("DROP TABLE ingest_new")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return {path: counts[str(path)] for path, _ in files}
+
+
+def ingest(conn, paths):
+    """Load every new file under `paths`
+
+    Returns {path: (kind, rows read, rows inserted, rows rejected)} for the
+    files loaded and {path: reason} for the files skipped.
+    """
+    files = expand_paths(paths)
+    with ThreadPoolExecutor(max_workers=CHECKSUM_WORKERS) as pool:
+        checksums = dict(zip(files, pool.map(file_checksum, files)))
+
+    loaded_checksums = set()
+    if conn.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [INGEST_LOG_TABLE]
+    ).fetchone()[0]:
+        loaded_checksums = {row[0] for row in conn.execute(f"SELECT sha256 FROM {INGEST_LOG_TABLE}").fetchall()}
+
+    skipped, pending = {}, {kind: [] for kind in KINDS}
+    for path in files:
+        checksum = checksums[path]
+        if checksum in loaded_checksums:
+            skipped[path] = "already loaded"
+            continue
+        loaded_checksums.add(checksum)  # identical copies within this run load once
+        pending[classify_file(conn, path)].append((path, checksum))
+
+    results = {}
+    for kind, kind_files in pending.items():
+        if kind_files:
+            for path, counts in load_kind(conn, kind, kind_files).items():
+                results[path] = (kind, *counts)
+    return results, skipped
+
+
+def main(argv):
+    args = list(argv)
+    db_path = DEFAULT_DB_PATH
+    if "--db" in args:
+        index = args.index("--db")
+        db_path = args[index + 1]
+        del args[index:index + 2]
+    if not args:
+        print(__doc__)
+        return 1
+
+    conn = duckdb.connect(str(db_path))
+    try:
+        started = time.perf_counter()
+        try:
+            results, skipped = ingest(conn, args)
+        except IngestError as e:
+            print(f"✗ {e}")
+            return 1
+        for path, reason in skipped.items():
+            print(f"  skipped {path} ({reason})")
+        for path, (kind, read, inserted, rejected) in results.items():
+            print(f"  {kind:8s} {path}: {read:,} read, {inserted:,} new, {rejected:,} rejected")
+        print(f"\nLoaded {len(results)} file(s), skipped {len(skipped)} in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
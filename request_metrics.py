@@ -0,0 +1,276 @@
+"""
+Per-request latency instrumentation for the agent web app.
+
+Every question answered by agent_web_app.py gets a RequestTrace that
+collects:
+- stage durations: LLM queue wait, prompt evaluation (time to the first
+  streamed token), token generation, fix_common_sql_errors, DuckDB
+  execution, DataFrame rendering and the background summary call
+- Ollama's prompt_eval_count / eval_count / eval_duration for each LLM call
+  (only present when the stream ran to its final chunk; a generation
+  stopped early once the SQL was complete reports the streamed chunk count)
+- result row counts and SQL / result cache hits
+
+RequestMetrics receives finished traces and:
+- appends each one as a JSON line to a size-rotated log
+- keeps Prometheus histograms/counters, served in the text exposition
+  format from a small HTTP thread (GET /metrics)
+- keeps the most recent traces for the sidebar latency panel
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_LOG_PATH = PROJECT_DIR / "logs" / "request_metrics.jsonl"
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUPS = 5
+DEFAULT_RECENT_REQUESTS = 200
+
+# Display order of the stages
+STAGES = ("llm_queue", "prompt_eval", "generation", "sql_fix", "execution", "render", "summary", "total")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+
+# OllamaClient.generate stats copied into the Prometheus token/eval counters
+OLLAMA_FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+
+
+class RequestTrace:
+    """Timings and counters of one question, from SQL generation to summary"""
+
+    def __init__(self, question):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.question = question
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.fields = {}
+        self.llm_calls = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as `name` (repeated stages add up)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + max(seconds, 0.0)
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add_llm_call(self, call, stats, split_stages=False):
+        """Record the stats dict filled by OllamaClient.generate
+
+        With `split_stages` the call's time is booked as prompt_eval (until
+        the first token) and generation (the rest), and fix_seconds from
+        ollama_client.mistral_text_to_sql as sql_fix.
+        """
+        if not stats:
+            return
+        self.llm_calls[call] = dict(stats)
+        if split_stages and "seconds" in stats:
+            first_token = stats.get("first_token_seconds") or stats["seconds"]
+            self.add_stage("prompt_eval", first_token)
+            self.add_stage("generation", stats["seconds"] - first_token)
+        if split_stages and "fix_seconds" in stats:
+            self.add_stage("sql_fix", stats["fix_seconds"])
+
+    def to_record(self):
+        total = time.perf_counter() - self._started
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "question": self.question,
+            "stages": {**self.stages, "total": total},
+            **self.fields,
+            "llm_calls": self.llm_calls,
+        }
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list: the ceil(fraction * n)-th smallest value"""
+    ordered = sorted(values)
+    # Rounded first: 0.07 * 100 is 7.000000000000001 in floating point
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(round(fraction * len(ordered), 9)) - 1))]
+
+
+class RequestMetrics:
+    """Collects finished traces into a JSONL log, Prometheus metrics and a recent-requests window"""
+
+    def __init__(self, log_path=DEFAULT_LOG_PATH, max_bytes=DEFAULT_LOG_MAX_BYTES,
+                 backups=DEFAULT_LOG_BACKUPS, recent=DEFAULT_RECENT_REQUESTS):
+        self.log_path = Path(log_path)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self._logger = logging.getLogger(f"request_metrics.{self.log_path}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = RotatingFileHandler(self.log_path, maxBytes=max_bytes, backupCount=backups,
+                                          encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        self._stage_histograms = {}  # stage -> _Histogram
+        self._rows = _Histogram(ROW_BUCKETS)
+        self._counters = {}  # (name, labels) -> value
+        self._server = None
+
+    # --------------------------------------------------------------------------
+    # Recording
+    # --------------------------------------------------------------------------
+
+    def _count(self, name, labels, value=1):
+        key = (name, tuple(labels))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def record(self, trace):
+        """Log a finished trace and add it to the aggregates; returns its record"""
+        record = trace.to_record()
+        self._logger.info(json.dumps(record, default=str))
+        with self._lock:
+            self._recent.append(record)
+            for stage, seconds in record["stages"].items():
+                self._stage_histograms.setdefault(stage, _Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self._count("agent_requests_total", [("status", record.get("status", "unknown"))])
+            for cache in ("sql", "result"):
+                hit = record.get(f"{cache}_cache_hit")
+                if hit is not None:
+                    self._count("agent_cache_lookups_total",
+                                [("cache", cache), ("result", "hit" if hit else "miss")])
+            if record.get("rows") is not None:
+                self._rows.observe(record["rows"])
+            for call, stats in record["llm_calls"].items():
+                for field in OLLAMA_FIELDS:
+                    if stats.get(field) is not None:
+                        self._count(f"agent_llm_{field}_total", [("call", call)], stats[field])
+                self._count("agent_llm_calls_total",
+                            [("call", call), ("stopped_early", str(bool(stats.get("stopped_early"))).lower())])
+        return record
+
+    # --------------------------------------------------------------------------
+    # Reading
+    # --------------------------------------------------------------------------
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+    def stage_table(self):
+        """[{stage, last_ms, p50_ms, p95_ms, requests}] over the recent requests, for display"""
+        recent = self.recent()
+        if not recent:
+            return []
+        last = recent[-1]["stages"]
+        rows = []
+        for stage in STAGES:
+            values = [r["stages"][stage] for r in recent if stage in r["stages"]]
+            if not values:
+                continue
+            rows.append({
+                "stage": stage,
+                "last_ms": round(last[stage] * 1000) if stage in last else None,
+                "p50_ms": round(percentile(values, 0.50) * 1000),
+                "p95_ms": round(percentile(values, 0.95) * 1000),
+                "requests": len(values),
+            })
+        return rows
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines += ["# HELP agent_stage_duration_seconds Time spent per request stage",
+                      "# TYPE agent_stage_duration_seconds histogram"]
+            for stage, histogram in sorted(self._stage_histograms.items()):
+                lines += self._histogram_lines("agent_stage_duration_seconds", [("stage", stage)], histogram)
+            lines += ["# HELP agent_result_rows Rows returned per query",
+                      "# TYPE agent_result_rows histogram"]
+            lines += self._histogram_lines("agent_result_rows", [], self._rows)
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        label_text = "{" + _labels(labels) + "}" if labels else ""
+                        lines.append(f"{name}{label_text} {value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(name, labels, histogram):
+        prefix = _labels(labels) + "," if labels else ""
+        suffix = "{" + _labels(labels) + "}" if labels else ""
+        lines = [f'{name}_bucket{{{prefix}le="{bound}"}} {count}'
+                 for bound, count in zip(histogram.buckets, histogram.counts)]
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{suffix} {histogram.sum}")
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+        return lines
+
+    # --------------------------------------------------------------------------
+    # Prometheus endpoint
+    # --------------------------------------------------------------------------
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """Serve GET /metrics from a daemon thread; returns the server (None if the port is taken)"""
+        if self._server is not None:
+            return self._server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # scrapes are not worth a log line each
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            return None
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
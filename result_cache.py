@@ -0,0 +1,221 @@
+"""
+Query result cache tied to a fingerprint of animal_shelter.duckdb.
+
+Results are keyed by the canonicalized SQL text plus a fingerprint of the
+database file (mtime + size, including the WAL file), so they stay valid
+until the ETL notebooks rebuild the star schema. Recent results live in
+memory; when the in-memory budget is exceeded the least recently used
+results are spilled to Parquet files on disk, which are themselves kept
+under a size budget.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_SPILL_DIR = PROJECT_DIR / ".cache" / "query_results"
+
+DEFAULT_MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+DEFAULT_DISK_BUDGET_BYTES = 2 * 1024 * 1024 * 1024
+
+try:
+    import pyarrow  # noqa: F401  (required by DataFrame.to_parquet)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+# String literals, quoted identifiers and comments, matched in the order they start
+SQL_TOKEN_PATTERN = re.compile(
+    r"""(?P<literal>'(?:[^']|'')*'?)|(?P<identifier>"(?:[^"]|"")*"?)|(?P<comment>--[^\n]*|/\*.*?(?:\*/|$))""",
+    re.DOTALL,
+)
+
+
+def canonicalize_sql(sql):
+    """Canonical form of a SQL statement for cache keys
+
+    Comments are removed, whitespace outside string literals is collapsed
+    and trailing semicolons are dropped. Literals are split out before
+    comments are looked for, so their contents (including any '--' or
+    '/*') are left as-is.
+    """
+    canonical = []
+    code = []  # text since the last literal or identifier, comments replaced by a space
+
+    def flush():
+        canonical.append(re.sub(r"\s+", " ", "".join(code).lower()))
+        code.clear()
+
+    position = 0
+    for match in SQL_TOKEN_PATTERN.finditer(sql):
+        code.append(sql[position:match.start()])
+        if match.group("literal") is not None:
+            flush()
+            canonical.append(match.group("literal"))
+        elif match.group("identifier") is not None:
+            flush()
+            canonical.append(match.group("identifier").lower())  # case-insensitive in DuckDB
+        else:
+            code.append(" ")
+        position = match.end()
+    code.append(sql[position:])
+    flush()
+    return "".join(canonical).strip().rstrip(";").strip()
+
+
+def sql_hash(sql):
+    """Stable short hash of the canonical SQL text"""
+    return hashlib.sha256(canonicalize_sql(sql).encode("utf-8")).hexdigest()[:32]
+
+
+def database_fingerprint(db_path):
+    """Fingerprint of the DuckDB file that changes whenever it is rewritten"""
+    db_path = Path(db_path)
+    parts = []
+    for path in (db_path, Path(str(db_path) + ".wal")):
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{path.name}:{stat.st_mtime_ns}:{stat.st_size}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class QueryResultCache:
+    """In-memory LRU of query results with a size-bounded Parquet spill"""
+
+    def __init__(self, db_path, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES,
+                 disk_budget_bytes=DEFAULT_DISK_BUDGET_BYTES, spill_dir=DEFAULT_SPILL_DIR):
+        self.db_path = Path(db_path)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self.spill_dir = Path(spill_dir)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # sql hash -> (DataFrame, nbytes)
+        self._memory_bytes = 0
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+
+    # --------------------------------------------------------------------------
+    # Fingerprint handling
+    # --------------------------------------------------------------------------
+
+    def _current_fingerprint(self):
+        """Check the database fingerprint and drop everything cached for an older build"""
+        fingerprint = database_fingerprint(self.db_path)
+        if fingerprint != self._fingerprint:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self.spill_dir.exists():
+                for child in self.spill_dir.iterdir():
+                    if child.is_dir() and child.name != fingerprint:
+                        shutil.rmtree(child, ignore_errors=True)
+            self._fingerprint = fingerprint
+        return fingerprint
+
+    def _spill_path(self, fingerprint, key):
+        return self.spill_dir / fingerprint / f"{key}.parquet"
+
+    # --------------------------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------------------------
+
+    def get(self, sql):
+        """Return the cached DataFrame for this SQL, or None on a miss"""
+        key = sql_hash(sql)
+        with self._lock:
+            fingerprint = self._current_fingerprint()
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][0]
+            spill_path = self._spill_path(fingerprint, key)
+            if PARQUET_AVAILABLE and spill_path.exists():
+                try:
+                    df = pd.read_parquet(spill_path)
+                except Exception:
+                    spill_path.unlink(missing_ok=True)
+                else:
+                    os.utime(spill_path)  # mark as recently used for disk eviction
+                    self._store_in_memory(fingerprint, key, df)
+                    self.hits += 1
+                    return df
+            self.misses += 1
+            return None
+
+    def put(self, sql, df):
+        """Cache a query result for the current database build"""
+        key = sql_hash(sql)
+        with self._lock:
+            fingerprint = self._current_fingerprint()
+            self._store_in_memory(fingerprint, key, df)
+
+    def clear(self):
+        """Drop all cached results from memory and disk"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def stats(self):
+        """Return hit/miss counts and memory usage for display"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries_in_memory": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+    # --------------------------------------------------------------------------
+    # Memory / disk budget management
+    # --------------------------------------------------------------------------
+
+    def _store_in_memory(self, fingerprint, key, df):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        if nbytes > self.memory_budget_bytes:
+            # Too large to keep in memory at all - go straight to disk
+            self._spill(fingerprint, key, df)
+            return
+        self._memory[key] = (df, nbytes)
+        self._memory_bytes += nbytes
+        while self._memory_bytes > self.memory_budget_bytes and len(self._memory) > 1:
+            old_key, (old_df, old_bytes) = self._memory.popitem(last=False)
+            self._memory_bytes -= old_bytes
+            self._spill(fingerprint, old_key, old_df)
+
+    def _spill(self, fingerprint, key, df):
+        if not PARQUET_AVAILABLE:
+            return
+        spill_path = self._spill_path(fingerprint, key)
+        if spill_path.exists():
+            return
+        spill_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = spill_path.with_suffix(".tmp")
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, spill_path)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._enforce_disk_budget(fingerprint)
+
+    def _enforce_disk_budget(self, fingerprint):
+        files = sorted(
+            (self.spill_dir / fingerprint).glob("*.parquet"),
+            key=lambda p: p.stat().st_mtime
+        )
+        total = sum(p.stat().st_size for p in files)
+        while files and total > self.disk_budget_bytes:
+            oldest = files.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink(missing_ok=True)
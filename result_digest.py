@@ -0,0 +1,97 @@
+"""
+Compact digest of a query result for the natural language summary prompt.
+
+Formatting the whole DataFrame and cutting the text at a fixed length
+spends time on rows that are thrown away and shows the model an arbitrary
+prefix. The digest instead states what the summary needs, computed with
+vectorized pandas operations and only ever formatting a handful of rows:
+- shape and column types
+- the top rows by the leading measure (or all rows for small results)
+- totals of additive columns and min / max / mean of every measure
+"""
+
+import pandas as pd
+
+DEFAULT_TOP_N = 10
+DEFAULT_MAX_CHARS = 2000
+MAX_CELL_CHARS = 40
+
+# Identifier-like numeric columns are not measures
+KEY_SUFFIXES = ("_key", "_id", "_year", "_month")
+KEY_NAMES = {"id", "year", "month", "quarter", "day", "week", "day_of_week", "day_of_month", "week_of_year"}
+# Columns whose sum means nothing (rates, averages, ...)
+NON_ADDITIVE_WORDS = ("rate", "pct", "percent", "avg", "average", "mean", "median", "ratio", "share")
+
+
+def measure_columns(df):
+    """Numeric columns that hold measures rather than identifiers"""
+    measures = []
+    for column in df.select_dtypes(include="number").columns:
+        name = str(column).lower()
+        if df[column].dtype == bool or name in KEY_NAMES or name.endswith(KEY_SUFFIXES):
+            continue
+        measures.append(column)
+    return measures
+
+
+def is_additive(df, column):
+    name = str(column).lower()
+    return pd.api.types.is_integer_dtype(df[column]) and not any(w in name for w in NON_ADDITIVE_WORDS)
+
+
+def _format_number(value):
+    if pd.isna(value):
+        return "NULL"
+    if float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+
+def _format_rows(rows):
+    """Format a few rows, shortening long text cells"""
+    rows = rows.copy()
+    for column in rows.select_dtypes(include=["object", "string"]).columns:
+        rows[column] = rows[column].astype(str).str.slice(0, MAX_CELL_CHARS)
+    for column in rows.select_dtypes(include="floating").columns:
+        rows[column] = rows[column].round(2)
+    return rows.to_string(index=False)
+
+
+def build_result_digest(result_df, top_n=DEFAULT_TOP_N, max_chars=DEFAULT_MAX_CHARS):
+    """Return a bounded text digest of a query result"""
+    n_rows, n_cols = result_df.shape
+    lines = [f"Rows: {n_rows:,}{'+ (display limit reached)' if result_df.attrs.get('truncated') else ''}, "
+             f"columns: {n_cols}"]
+    lines.append("Columns: " + ", ".join(f"{c} ({result_df[c].dtype})" for c in result_df.columns))
+
+    if n_rows == 0:
+        return "\n".join(lines)
+
+    measures = measure_columns(result_df)
+    if n_rows <= top_n:
+        lines.append("\nAll rows:")
+        lines.append(_format_rows(result_df))
+    elif measures:
+        leading = measures[0]
+        lines.append(f"\nTop {top_n} rows by {leading}:")
+        lines.append(_format_rows(result_df.nlargest(top_n, leading)))
+    else:
+        lines.append(f"\nFirst {top_n} rows:")
+        lines.append(_format_rows(result_df.head(top_n)))
+
+    if measures and n_rows > 1:
+        stats = result_df[measures].agg(["min", "max", "mean"])
+        lines.append("\nStatistics:")
+        for column in measures:
+            line = (f"- {column}: min {_format_number(stats.at['min', column])}, "
+                    f"max {_format_number(stats.at['max', column])}, "
+                    f"mean {_format_number(stats.at['mean', column])}")
+            if is_additive(result_df, column):
+                line += f", total {_format_number(result_df[column].sum())}"
+            lines.append(line)
+
+    digest = "\n".join(lines)
+    if len(digest) > max_chars:
+        # Only reachable with very wide rows; the input here is already small
+        digest = digest[:max_chars] + "\n... (truncated)"
+    return digest
@@ -0,0 +1,268 @@
+"""
+Result-set equivalence checks for validating generated SQL.
+
+Comparing row counts lets a query pass with the wrong values, and the
+validation notebook compared values row by row in Python. Here both the
+actual result and the expected rows are registered in DuckDB and compared
+there:
+- columns are matched by name ignoring case, quoting and table prefixes;
+  columns still unmatched (the generated SQL used another alias) are
+  matched by identical value multisets, then by position. Extra actual
+  columns are allowed and reported.
+- rows are compared as multisets (order-insensitive): each normalized row
+  is hashed and numbered within its hash, and an anti join on
+  (hash, occurrence) in both directions leaves only the differing rows
+- numbers are compared after rounding to ROUND_DECIMALS, the precision the
+  ground-truth SQL in generate_test_cases.py rounds to; rows left over by
+  the exact comparison are paired again allowing a difference of up to
+  half a unit in that last decimal, so unrounded or differently rounded
+  values still match
+- mismatches come back as the expected rows that are missing and the
+  actual rows that were not expected, with a printable diff
+
+    comparison = compare_results(conn, df, test_case["expected_results"], test_case["expected_columns"])
+    if not comparison:
+        print(comparison.diff())
+"""
+
+import pandas as pd
+
+ROUND_DECIMALS = 1  # ROUND(..., 1) in the ground-truth SQL of generate_test_cases.py
+TOLERANCE = 0.5 * 10 ** -ROUND_DECIMALS + 1e-9
+
+NUMERIC_TYPES = {
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "UHUGEINT",
+    "FLOAT", "DOUBLE", "DECIMAL",
+}
+
+ACTUAL_VIEW = "_equivalence_actual"
+EXPECTED_VIEW = "_equivalence_expected"
+
+
+class Comparison:
+    """Outcome of comparing an actual result with the expected rows; truthy when equivalent"""
+
+    def __init__(self, equivalent, reason, column_mapping=None, missing=None, unexpected=None,
+                 extra_columns=()):
+        self.equivalent = equivalent
+        self.reason = reason
+        self.column_mapping = column_mapping or {}  # expected column -> actual column
+        self.missing = missing if missing is not None else pd.DataFrame()  # expected rows not produced
+        self.unexpected = unexpected if unexpected is not None else pd.DataFrame()  # produced rows not expected
+        self.extra_columns = list(extra_columns)
+
+    def __bool__(self):
+        return self.equivalent
+
+    def diff(self, limit=10):
+        """Readable summary: '-' rows were expected but missing, '+' rows were not expected"""
+        lines = [self.reason]
+        renamed = {e: a for e, a in self.column_mapping.items() if e != a}
+        if renamed:
+            lines.append("columns matched by value/position: "
+                         + ", ".join(f"{e} <- {a}" for e, a in renamed.items()))
+        if self.extra_columns:
+            lines.append("extra columns ignored: " + ", ".join(self.extra_columns))
+        for sign, rows in (("-", self.missing), ("+", self.unexpected)):
+            for row in rows.head(limit).itertuples(index=False):
+                lines.append(f"{sign} " + ", ".join(f"{c}={_format_value(v)}" for c, v in zip(rows.columns, row)))
+            if len(rows) > limit:
+                lines.append(f"{sign} ... {len(rows) - limit} more")
+        return "\n".join(lines)
+
+
+def _format_value(value):
+    """Numbers were compared as DOUBLE; show whole ones without the '.0'"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# ==============================================================================
+# COLUMN MATCHING
+# ==============================================================================
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def normalize_column_name(name):
+    """'s.\"Total\" ' -> 'total'"""
+    return str(name).strip().split(".")[-1].strip('"').strip().lower()
+
+
+def _column_types(conn, relation):
+    """[(name, is numeric)] of a registered relation"""
+    return [(row[0], row[1].split("(")[0] in NUMERIC_TYPES)
+            for row in conn.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+
+
+def _normalized(column, numeric, decimals=ROUND_DECIMALS):
+    """Comparable form of a column: rounded DOUBLE for numbers, text otherwise"""
+    if numeric:
+        return f"ROUND(TRY_CAST({_quote(column)} AS DOUBLE), {decimals})"
+    return f"CAST({_quote(column)} AS VARCHAR)"
+
+
+def _value_fingerprints(conn, relation, columns, numeric):
+    """{column: order-independent hash of its normalized values}"""
+    if not columns:
+        return {}
+    sums = ", ".join(f"SUM(hash({_normalized(c, numeric[c])}))" for c in columns)
+    return dict(zip(columns, conn.execute(f"SELECT {sums} FROM {relation}").fetchone()))
+
+
+def match_columns(conn, expected=EXPECTED_VIEW, actual=ACTUAL_VIEW):
+    """(expected column -> actual column, extra actual columns, expected column -> is numeric)
+
+    Names are matched first; then an unmatched expected column takes an
+    unmatched actual column of the same kind (number/text) holding the same
+    values; the rest are paired in position order. Expected columns left
+    without a partner are absent from the mapping.
+    """
+    expected_types = _column_types(conn, expected)
+    actual_types = _column_types(conn, actual)
+    numeric = {("e", c): n for c, n in expected_types}
+    numeric.update({("a", c): n for c, n in actual_types})
+
+    mapping = {}
+    by_name = {normalize_column_name(c): c for c, _ in reversed(actual_types)}
+    for column, _ in expected_types:
+        match = by_name.get(normalize_column_name(column))
+        if match is not None and match not in mapping.values():
+            mapping[column] = match
+
+    unmatched_expected = [c for c, _ in expected_types if c not in mapping]
+    unmatched_actual = [c for c, _ in actual_types if c not in mapping.values()]
+    if unmatched_expected and unmatched_actual:
+        expected_fps = _value_fingerprints(conn, expected, unmatched_expected,
+                                           {c: numeric[("e", c)] for c in unmatched_expected})
+        # Actual columns are normalized as numbers or text; only same-kind pairs can match
+        actual_fps = _value_fingerprints(conn, actual, unmatched_actual,
+                                         {c: numeric[("a", c)] for c in unmatched_actual})
+        for column in unmatched_expected:
+            for candidate in unmatched_actual:
+                if (candidate not in mapping.values()
+                        and numeric[("e", column)] == numeric[("a", candidate)]
+                        and expected_fps[column] == actual_fps[candidate]):
+                    mapping[column] = candidate
+                    break
+
+    remaining_actual = [c for c, _ in actual_types if c not in mapping.values()]
+    for column in [c for c, _ in expected_types if c not in mapping]:
+        if not remaining_actual:
+            break
+        mapping[column] = remaining_actual.pop(0)
+
+    ordered = {c: mapping[c] for c, _ in expected_types if c in mapping}
+    extra = [c for c, _ in actual_types if c not in ordered.values()]
+    return ordered, extra, {c: n for c, n in expected_types}
+
+
+# ==============================================================================
+# ROW COMPARISON
+# ==============================================================================
+
+def _leftover_rows(conn, mapping, numeric):
+    """(missing, unexpected) DataFrames after exact and tolerant multiset matching"""
+    columns = list(mapping)
+    aliases = [f"c{i}" for i in range(len(columns))]
+    expected_select = ", ".join(
+        f"{_normalized(c, numeric[c])} AS {a}" for c, a in zip(columns, aliases)
+    )
+    # Actual columns take the kind of the expected column they stand for
+    actual_select = ", ".join(
+        f"{_normalized(mapping[c], numeric[c])} AS {a}" for c, a in zip(columns, aliases)
+    )
+    row_hash = f"hash({', '.join(aliases)})"
+    for side, select, relation in (("expected", expected_select, EXPECTED_VIEW),
+                                   ("actual", actual_select, ACTUAL_VIEW)):
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE _equivalence_{side}_rows AS
+            SELECT *, {row_hash} AS row_hash, ROW_NUMBER() OVER (PARTITION BY {row_hash}) AS occurrence
+            FROM (SELECT {select} FROM {relation})
+        """)
+    for side, other in (("expected", "actual"), ("actual", "expected")):
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE _equivalence_{side}_left AS
+            SELECT * FROM _equivalence_{side}_rows
+            ANTI JOIN _equivalence_{other}_rows USING (row_hash, occurrence)
+        """)
+
+    numbers = [a for c, a in zip(columns, aliases) if numeric[c]]
+    texts = [a for c, a in zip(columns, aliases) if not numeric[c]]
+    if numbers and conn.execute("SELECT COUNT(*) FROM _equivalence_expected_left").fetchone()[0]:
+        # Pair leftovers with the same text values in numeric order, then accept pairs within tolerance
+        key = f"hash({', '.join(texts)})" if texts else "0"
+        order = ", ".join(numbers)
+        within = " AND ".join(
+            f"(e.{a} IS NOT DISTINCT FROM x.{a} OR abs(e.{a} - x.{a}) <= {TOLERANCE})" for a in numbers
+        )
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE _equivalence_tolerated AS
+            SELECT e.row_hash AS expected_hash, e.occurrence AS expected_occurrence,
+                   x.row_hash AS actual_hash, x.occurrence AS actual_occurrence
+            FROM (SELECT *, {key} AS key_hash, ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY {order}) AS rank
+                  FROM _equivalence_expected_left) e
+            JOIN (SELECT *, {key} AS key_hash, ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY {order}) AS rank
+                  FROM _equivalence_actual_left) x
+                USING (key_hash, rank)
+            WHERE {within}
+        """)
+        for side in ("expected", "actual"):
+            conn.execute(f"""
+                CREATE OR REPLACE TEMP TABLE _equivalence_{side}_left AS
+                SELECT * FROM _equivalence_{side}_left l
+                ANTI JOIN _equivalence_tolerated t
+                    ON l.row_hash = t.{side}_hash AND l.occurrence = t.{side}_occurrence
+            """)
+
+    names = ", ".join(f"{a} AS {_quote(c)}" for c, a in zip(columns, aliases))
+    missing = conn.execute(f"SELECT {names} FROM _equivalence_expected_left").df()
+    unexpected = conn.execute(f"SELECT {names} FROM _equivalence_actual_left").df()
+    return missing, unexpected
+
+
+def _drop_temp(conn):
+    for table in ("expected_rows", "actual_rows", "expected_left", "actual_left", "tolerated"):
+        conn.execute(f"DROP TABLE IF EXISTS _equivalence_{table}")
+
+
+def compare_results(conn, actual_df, expected_rows, expected_columns=None):
+    """Compare a query result with the expected rows of a ground-truth test case
+
+    `conn` is any DuckDB connection or cursor (a read-only one works; only
+    temporary objects are created). `expected_rows` is a list of dicts as
+    stored in agent_ground_truth_test_cases.json, or a DataFrame / Arrow
+    table such as ground_truth_store.load_expected() returns, which is
+    registered without copying. Returns a Comparison.
+    """
+    if actual_df is None:
+        return Comparison(False, "query execution failed")
+    if isinstance(expected_rows, list):
+        expected_df = pd.DataFrame(expected_rows, columns=expected_columns)
+    else:
+        expected_df = expected_rows
+    if len(actual_df) != len(expected_df):
+        reason = f"row count mismatch: got {len(actual_df)}, expected {len(expected_df)}"
+    else:
+        reason = None
+
+    conn.register(ACTUAL_VIEW, actual_df)
+    conn.register(EXPECTED_VIEW, expected_df)
+    try:
+        mapping, extra, numeric = match_columns(conn)
+        absent = [c for c in numeric if c not in mapping]
+        if absent:
+            return Comparison(False, f"missing column(s): {', '.join(absent)}", mapping, extra_columns=extra)
+        missing, unexpected = _leftover_rows(conn, mapping, numeric)
+    finally:
+        _drop_temp(conn)
+        conn.unregister(ACTUAL_VIEW)
+        conn.unregister(EXPECTED_VIEW)
+
+    if len(missing) or len(unexpected):
+        reason = reason or f"{len(missing)} expected row(s) missing, {len(unexpected)} unexpected"
+        return Comparison(False, reason, mapping, missing, unexpected, extra)
+    return Comparison(True, "results match", mapping, missing, unexpected, extra)
@@ -0,0 +1,124 @@
+"""
+On-demand export of query results as CSV, Parquet or Arrow IPC.
+
+Exports are produced only when the user asks for them and are written
+straight from DuckDB to a file, without building a pandas DataFrame or an
+in-memory CSV string first:
+- CSV and Parquet use DuckDB's `COPY (query) TO file`, which streams the
+  result to disk with DuckDB's own (parallel) writers
+- Arrow IPC reads the result as Arrow record batches and writes them one
+  batch at a time
+
+Files are named after the SQL hash and the database fingerprint, so asking
+for the same export again reuses the existing file until the star schema
+is rebuilt.
+"""
+
+import os
+import shutil
+import time
+from pathlib import Path
+
+from query_executor import strip_sql_tail
+from result_cache import database_fingerprint, sql_hash
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_EXPORT_DIR = PROJECT_DIR / ".cache" / "exports"
+
+DEFAULT_MAX_AGE_SECONDS = 24 * 3600
+ARROW_BATCH_ROWS = 100_000
+
+# Display name -> file extension, MIME type
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+
+def available_formats():
+    """Export formats usable in this environment"""
+    return [name for name in EXPORT_FORMATS if name != "Arrow IPC" or ARROW_AVAILABLE]
+
+
+def export_path(db_path, sql, export_format, export_dir=DEFAULT_EXPORT_DIR):
+    """Where the export of this SQL in this format lives for the current database build"""
+    extension = EXPORT_FORMATS[export_format][0]
+    return Path(export_dir) / database_fingerprint(db_path) / f"{sql_hash(sql)}{extension}"
+
+
+def _copy_to(conn, sql, path, export_format):
+    options = "FORMAT csv, HEADER true" if export_format == "CSV" else "FORMAT parquet, COMPRESSION zstd"
+    target = str(path).replace("'", "''")
+    conn.execute(f"COPY ({sql}) TO '{target}' ({options})")
+
+
+def _write_arrow(conn, sql, path, batch_rows=ARROW_BATCH_ROWS):
+    reader = conn.execute(sql).fetch_record_batch(batch_rows)
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+
+
+def export_query(conn, sql, export_format, db_path, executor=None, export_dir=DEFAULT_EXPORT_DIR):
+    """Write the full result of `sql` to a file and return its path
+
+    `executor` is an optional GuardedExecutor; when given, the export runs
+    under its plan check, memory limit and timeout. An existing export of
+    the same SQL for the current database build is reused.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if export_format == "Arrow IPC" and not ARROW_AVAILABLE:
+        raise RuntimeError("Arrow export requires pyarrow (pip install pyarrow)")
+
+    path = export_path(db_path, sql, export_format, export_dir)
+    if path.exists():
+        os.utime(path)
+        return path
+
+    sql = strip_sql_tail(sql)  # a trailing -- comment would swallow COPY's closing parenthesis
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        if executor is not None:
+            executor.check_plan(conn, sql)
+            executor.apply_settings(conn)
+            with executor.deadline(conn):
+                _write(conn, sql, tmp_path, export_format)
+        else:
+            _write(conn, sql, tmp_path, export_format)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return path
+
+
+def _write(conn, sql, path, export_format):
+    if export_format == "Arrow IPC":
+        _write_arrow(conn, sql, path)
+    else:
+        _copy_to(conn, sql, path, export_format)
+
+
+def cleanup_exports(db_path, export_dir=DEFAULT_EXPORT_DIR, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+    """Remove exports of older database builds and files not used for a while"""
+    export_dir = Path(export_dir)
+    if not export_dir.exists():
+        return
+    current = database_fingerprint(db_path)
+    cutoff = time.time() - max_age_seconds
+    for child in export_dir.iterdir():
+        if child.is_dir() and child.name != current:
+            shutil.rmtree(child, ignore_errors=True)
+        elif child.is_dir():
+            for file in child.iterdir():
+                if file.stat().st_mtime < cutoff:
+                    file.unlink(missing_ok=True)
@@ -0,0 +1,481 @@
+"""
+Pre-aggregated rollup tables and a router that answers queries from them.
+
+Most dashboard-style questions are a GROUP BY over fact_animal_outcome
+joined to one or two dimensions. build_star_schema_tables.ipynb builds a
+few rollup tables at common dimension grains, each holding per-group
+measures:
+- animal_count: number of fact rows
+- total_days_in_shelter / days_in_shelter_count: for SUM, COUNT and AVG
+- min_days_in_shelter / max_days_in_shelter: for MIN and MAX
+- live_outcome_count: rows with is_live_outcome = 1
+
+RollupRouter recognizes generated SQL of the canonical star-query shape
+(fact table joined to dimensions on their keys, aggregates over dimension
+columns and days_in_shelter) and rewrites it to read the smallest rollup
+that covers every referenced column, re-aggregating the stored measures:
+COUNT(*) -> SUM(animal_count), AVG(days_in_shelter) -> SUM(total) / SUM(count),
+SUM(<dimension expression>) -> SUM(<expression> * animal_count), ...
+Anything it cannot prove equivalent (other fact columns, subqueries, CTEs,
+days_in_shelter outside an aggregate, ...) is left alone.
+
+The catalog records a content fingerprint of the fact and dimension tables
+the rollups were built from (row counts and order-independent row hashes);
+the router only uses rollups whose fingerprint matches the current tables, so
+a rebuild or refresh that changes values or keys without changing the row
+count does not serve stale aggregates. merge_into_rollups() folds fact
+rows appended by an incremental refresh into the existing rollups.
+"""
+
+import re
+import time
+
+FACT_TABLE = "fact_animal_outcome"
+CATALOG_TABLE = "rollup_catalog"
+
+# Dimension table -> (fact foreign key, dimension primary key)
+DIMENSION_KEYS = {
+    "dim_outcome_type": ("outcome_key", "outcome_key"),
+    "dim_animal_attributes": ("animal_attributes_key", "animal_attributes_key"),
+    "dim_sex_on_outcome": ("sex_key", "sex_key"),
+    "dim_intake_details": ("intake_details_key", "intake_details_key"),
+    "dim_date": ("outcome_date_key", "date_key"),  # rollups use the OUTCOME date
+}
+
+# Rollup table -> dimension columns forming its grain
+ROLLUP_DEFINITIONS = {
+    "rollup_outcome_by_month": {
+        "dim_date": ["year", "quarter", "month", "month_name"],
+        "dim_animal_attributes": ["animal_type"],
+        "dim_outcome_type": ["outcome_type", "is_live_outcome"],
+    },
+    "rollup_outcome_by_breed": {
+        "dim_animal_attributes": ["animal_type", "primary_breed", "breed_group", "is_mixed_breed"],
+        "dim_outcome_type": ["outcome_type", "is_live_outcome"],
+    },
+    "rollup_breed_by_intake": {
+        "dim_animal_attributes": ["animal_type", "primary_breed", "breed_group"],
+        "dim_intake_details": ["intake_type", "intake_condition", "condition_severity", "has_condition_flag"],
+    },
+    "rollup_outcome_by_intake": {
+        "dim_animal_attributes": ["animal_type"],
+        "dim_intake_details": ["intake_type", "intake_condition", "condition_severity", "has_condition_flag"],
+        "dim_outcome_type": ["outcome_type", "is_live_outcome", "stay_duration_category"],
+    },
+    "rollup_outcome_by_sex_age": {
+        "dim_animal_attributes": ["animal_type"],
+        "dim_sex_on_outcome": ["sex_upon_outcome", "is_intact", "is_male", "is_female", "age_group"],
+        "dim_outcome_type": ["outcome_type", "is_live_outcome", "stay_duration_category"],
+    },
+}
+
+MEASURE_COLUMNS = (
+    "animal_count", "total_days_in_shelter", "days_in_shelter_count",
+    "min_days_in_shelter", "max_days_in_shelter", "live_outcome_count",
+)
+
+DIMENSION_ALIASES = {
+    "dim_outcome_type": "o",
+    "dim_animal_attributes": "a",
+    "dim_sex_on_outcome": "s",
+    "dim_intake_details": "i",
+    "dim_date": "d",
+}
+
+
+# ==============================================================================
+# BUILD
+# ==============================================================================
+
+def rollup_select_sql(name, fact_source=FACT_TABLE):
+    """SELECT of one rollup's groups and measures over the fact rows of `fact_source`"""
+    grain = ROLLUP_DEFINITIONS[name]
+    # dim_outcome_type is always joined for live_outcome_count
+    tables = list(grain) + ([] if "dim_outcome_type" in grain else ["dim_outcome_type"])
+    columns = [f"{DIMENSION_ALIASES[table]}.{column}" for table, cols in grain.items() for column in cols]
+    joins = "\n".join(
+        f"JOIN {table} {DIMENSION_ALIASES[table]} "
+        f"ON f.{DIMENSION_KEYS[table][0]} = {DIMENSION_ALIASES[table]}.{DIMENSION_KEYS[table][1]}"
+        for table in tables
+    )
+    return f"""
+        SELECT
+            {', '.join(columns)},
+            COUNT(*) AS animal_count,
+            CAST(SUM(f.days_in_shelter) AS BIGINT) AS total_days_in_shelter,
+            COUNT(f.days_in_shelter) AS days_in_shelter_count,
+            MIN(f.days_in_shelter) AS min_days_in_shelter,
+            MAX(f.days_in_shelter) AS max_days_in_shelter,
+            COUNT(*) FILTER (WHERE o.is_live_outcome = 1) AS live_outcome_count
+        FROM {fact_source} f
+        {joins}
+        GROUP BY ALL
+        ORDER BY ALL
+    """
+
+
+def rollup_sql(name):
+    """CREATE TABLE statement for one rollup"""
+    return f"CREATE OR REPLACE TABLE {name} AS {rollup_select_sql(name)}"
+
+
+def _content_fingerprint(conn, table):
+    """Row count and an order-independent hash of every row
+
+    Unlike feature_pipeline.table_fingerprint, rowids are left out: rows
+    appended in a transaction get different rowids once it commits.
+    """
+    count, total = conn.execute(f"SELECT COUNT(*), SUM(hash(t)) FROM {table} t").fetchone()
+    return f"{count}:{total}"
+
+
+def star_fingerprint(conn):
+    """Content fingerprint of the fact table and every dimension the rollups join"""
+    return "|".join(f"{table}={_content_fingerprint(conn, table)}" for table in [FACT_TABLE] + list(DIMENSION_KEYS))
+
+
+def build_rollups(conn):
+    """(Re)build every rollup table and the catalog the router reads
+
+    Returns {rollup name: (row count, seconds)}.
+    """
+    fact_rows = conn.execute(f"SELECT COUNT(*) FROM {FACT_TABLE}").fetchone()[0]
+    source_fingerprint = star_fingerprint(conn)
+    conn.execute(f"DROP TABLE IF EXISTS {CATALOG_TABLE}")
+    conn.execute(f"""
+        CREATE TABLE {CATALOG_TABLE} (
+            rollup_name VARCHAR,
+            grain_columns VARCHAR[],
+            row_count BIGINT,
+            fact_row_count BIGINT,
+            source_fingerprint VARCHAR,
+            built_at TIMESTAMP
+        )
+    """)
+    built = {}
+    for name, grain in ROLLUP_DEFINITIONS.items():
+        started = time.perf_counter()
+        conn.execute(rollup_sql(name))
+        rows = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        conn.execute(
+            f"INSERT INTO {CATALOG_TABLE} VALUES (?, ?, ?, ?, ?, current_timestamp::TIMESTAMP)",
+            [name, [c for cols in grain.values() for c in cols], rows, fact_rows, source_fingerprint]
+        )
+        built[name] = (rows, time.perf_counter() - started)
+    return built
+
+
+def catalog_fingerprints(conn):
+    """{rollup name: fingerprint of the star tables it was built from}; empty without a usable catalog"""
+    try:
+        return dict(conn.execute(f"SELECT rollup_name, source_fingerprint FROM {CATALOG_TABLE}").fetchall())
+    except Exception:
+        return {}  # rollups not built yet (or built before the catalog had fingerprints)
+
+
+def _column_types(conn, table):
+    return {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info('{table}')").fetchall()}
+
+
+def merge_into_rollups(conn, new_facts, fingerprint_before):
+    """Fold fact rows just appended to the fact table into every rollup
+
+    `new_facts` holds the appended rows and `fingerprint_before` is
+    star_fingerprint() from before the append. Each rollup is re-aggregated
+    from its own groups plus the groups of the new rows, so the fact table
+    is not scanned again (only fingerprinted). Rollups that were not current
+    before the append cannot be patched and are all rebuilt instead.
+    Returns {rollup name: (row count, seconds)}.
+    """
+    recorded = catalog_fingerprints(conn)
+    if set(recorded) != set(ROLLUP_DEFINITIONS) or set(recorded.values()) != {fingerprint_before}:
+        return build_rollups(conn)
+
+    fact_rows = conn.execute(f"SELECT COUNT(*) FROM {FACT_TABLE}").fetchone()[0]
+    source_fingerprint = star_fingerprint(conn)
+    merged = {}
+    for name, grain in ROLLUP_DEFINITIONS.items():
+        started = time.perf_counter()
+        # Dimensions re-compacted by the refresh have new ENUM types; cast both sides to them
+        casts = ", ".join(
+            f"CAST({column} AS {_column_types(conn, table)[column]}) AS {column}"
+            for table, cols in grain.items() for column in cols
+        )
+        columns = ", ".join(column for cols in grain.values() for column in cols)
+        measures = ", ".join(MEASURE_COLUMNS)
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE {name} AS
+            WITH groups AS (
+                SELECT {casts}, {measures} FROM {name}
+                UNION ALL
+                SELECT {casts}, {measures} FROM ({rollup_select_sql(name, new_facts)})
+            )
+            SELECT
+                {columns},
+                CAST(SUM(animal_count) AS BIGINT) AS animal_count,
+                CAST(SUM(total_days_in_shelter) AS BIGINT) AS total_days_in_shelter,
+                CAST(SUM(days_in_shelter_count) AS BIGINT) AS days_in_shelter_count,
+                MIN(min_days_in_shelter) AS min_days_in_shelter,
+                MAX(max_days_in_shelter) AS max_days_in_shelter,
+                CAST(SUM(live_outcome_count) AS BIGINT) AS live_outcome_count
+            FROM groups
+            GROUP BY ALL
+            ORDER BY ALL
+        """)
+        rows = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        conn.execute(f"""
+            UPDATE {CATALOG_TABLE}
+            SET row_count = ?, fact_row_count = ?, source_fingerprint = ?, built_at = current_timestamp::TIMESTAMP
+            WHERE rollup_name = ?
+        """, [rows, fact_rows, source_fingerprint, name])
+        merged[name] = (rows, time.perf_counter() - started)
+    return merged
+
+
+# ==============================================================================
+# ROUTING
+# ==============================================================================
+
+class NotRoutable(Exception):
+    """The query does not have a shape the router can rewrite safely"""
+
+
+AGGREGATE_FUNCTIONS = {
+    "count", "sum", "avg", "mean", "min", "max", "count_if", "bool_and", "bool_or",
+    # Aggregates that cannot be recomputed from the stored measures
+    "median", "mode", "quantile", "quantile_cont", "quantile_disc", "approx_quantile",
+    "percentile_cont", "percentile_disc", "stddev", "stddev_pop", "stddev_samp", "variance",
+    "var_pop", "var_samp", "string_agg", "group_concat", "list", "array_agg", "first", "last",
+    "any_value", "arbitrary", "arg_min", "arg_max", "argmin", "argmax", "min_by", "max_by",
+    "product", "entropy", "kurtosis", "skewness", "histogram", "approx_count_distinct",
+    "fsum", "sumkahan", "kahan_sum", "favg", "corr", "covar_pop", "covar_samp", "regr_slope",
+}
+
+CLAUSE_END = r"(?=\bwhere\b|\bgroup\s+by\b|\bhaving\b|\border\s+by\b|\blimit\b|\bwindow\b|\bqualify\b|$)"
+JOIN_PATTERN = re.compile(
+    r"\s*(?:inner\s+|left\s+(?:outer\s+)?)?join\s+(\w+)(?:\s+(?:as\s+)?(?!on\b)(\w+))?"
+    r"\s+on\s+\(?\s*(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)\s*\)?",
+    re.IGNORECASE
+)
+
+
+def _matching_paren(text, open_idx):
+    depth = 0
+    for idx in range(open_idx, len(text)):
+        if text[idx] == "(":
+            depth += 1
+        elif text[idx] == ")":
+            depth -= 1
+            if depth == 0:
+                return idx
+    raise NotRoutable("unbalanced parentheses")
+
+
+def _split_top_level(text):
+    """Split a select list on commas that are not inside parentheses"""
+    items, depth, start = [], 0, 0
+    for idx, char in enumerate(text):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(text[start:idx])
+            start = idx + 1
+    items.append(text[start:])
+    return [item.strip() for item in items]
+
+
+class RollupRouter:
+    """Rewrites star queries to read a covering rollup table"""
+
+    def __init__(self, conn):
+        self.rollups = []  # (row count, name, grain columns), smallest first
+        self.known_columns = set()
+        self.enabled = False
+
+        tables = [FACT_TABLE] + list(DIMENSION_KEYS)
+        placeholders = ", ".join("?" for _ in tables)
+        self.known_columns = {
+            row[0].lower() for row in conn.execute(
+                f"SELECT column_name FROM information_schema.columns WHERE table_name IN ({placeholders})",
+                tables
+            ).fetchall()
+        }
+        try:
+            catalog = conn.execute(
+                f"SELECT rollup_name, grain_columns, row_count, source_fingerprint FROM {CATALOG_TABLE}"
+            ).fetchall()
+        except Exception:
+            return  # rollups not built yet (or built before the catalog had fingerprints)
+        current = star_fingerprint(conn)
+        # Rollups from an older build of the star schema would give wrong answers
+        self.rollups = sorted(
+            (rows, name, {c.lower() for c in grain})
+            for name, grain, rows, built_for in catalog if built_for == current
+        )
+        self.enabled = bool(self.rollups)
+
+    def route(self, sql):
+        """Return (rewritten SQL, rollup name), or None if the query must hit the fact table"""
+        if not self.enabled:
+            return None
+        try:
+            return self._rewrite(sql)
+        except NotRoutable:
+            return None
+
+    # --------------------------------------------------------------------------
+    # Rewriting
+    # --------------------------------------------------------------------------
+
+    def _rewrite(self, sql):
+        text = sql.strip().rstrip(";").strip()
+        if ";" in text or '"' in text:
+            raise NotRoutable("multiple statements or quoted identifiers")
+
+        # Mask string literals so they are never rewritten or mistaken for columns
+        literals = []
+
+        def mask(match):
+            literals.append(match.group(0))
+            return f"__lit{len(literals) - 1}__"
+
+        text = re.sub(r"'(?:[^']|'')*'", mask, text)
+        text = re.sub(r"--[^\n]*|/\*.*?\*/", " ", text, flags=re.DOTALL)
+
+        if len(re.findall(r"\bselect\b", text, re.I)) != 1:
+            raise NotRoutable("subqueries are not supported")
+        if re.search(r"\b(with|union|intersect|except|using|filter|qualify|lateral|natural)\b", text, re.I):
+            raise NotRoutable("unsupported construct")
+        if re.search(r"select\s+(distinct\s+)?\*|,\s*\*|\w\.\*", text, re.I):
+            raise NotRoutable("SELECT * returns fact rows")
+
+        from_match = re.search(r"\bfrom\s+(.*?)" + CLAUSE_END, text, re.DOTALL | re.I)
+        if not from_match:
+            raise NotRoutable("no FROM clause")
+        alias, aliases = self._parse_from(from_match.group(1).strip())
+
+        has_aggregation = bool(re.search(r"\bgroup\s+by\b|\bselect\s+distinct\b", text, re.I))
+        head = text[:from_match.start()]
+        tail = text[from_match.end():]
+
+        # Rewritten aggregates would get different generated column names
+        select_list = re.sub(r"^\s*select\s+(distinct\s+)?", "", head, flags=re.I)
+        for item in _split_top_level(select_list):
+            if not re.fullmatch(r"(?:\w+\.)?\w+|.*\s+as\s+\w+", item, re.I | re.DOTALL):
+                raise NotRoutable("computed select items need an explicit alias")
+
+        # Qualify every joined table's columns with the single rollup alias
+        qualifier = re.compile(r"\b(" + "|".join(re.escape(a) for a in aliases) + r")\.(?=\w)", re.I)
+        head, tail = qualifier.sub(f"{alias}.", head), qualifier.sub(f"{alias}.", tail)
+
+        if any(re.search(rf"\b{m}\b", head + tail, re.I) for m in MEASURE_COLUMNS):
+            raise NotRoutable("query uses a name reserved for rollup measures")
+
+        state = {"aggregates": 0}
+        head = self._rewrite_calls(head, alias, state)
+        tail = self._rewrite_calls(tail, alias, state)
+        if not (has_aggregation or state["aggregates"]):
+            raise NotRoutable("query returns individual fact rows")
+
+        referenced = {
+            token.lower() for token in re.findall(r"\b[a-z_][a-z0-9_]*\b", head + tail, re.I)
+            if token.lower() in self.known_columns
+        }
+        for rows, name, grain in self.rollups:
+            if referenced <= grain:
+                rewritten = f"{head}from {name} {alias} {tail}".strip()
+                for idx, literal in enumerate(literals):
+                    rewritten = rewritten.replace(f"__lit{idx}__", literal)
+                return rewritten + ";", name
+        raise NotRoutable("no rollup covers the referenced columns")
+
+    def _parse_from(self, from_clause):
+        """Validate `fact f JOIN dim x ON f.key = x.key ...`; returns (alias, names to requalify)"""
+        match = re.match(rf"{FACT_TABLE}(?:\s+(?:as\s+)?(?!(?:inner|left|join)\b)(\w+))?", from_clause, re.I)
+        if not match:
+            raise NotRoutable("base table is not the fact table")
+        fact_alias = match.group(1) or FACT_TABLE
+        aliases = {FACT_TABLE, fact_alias.lower()}
+        seen = set()
+        position = match.end()
+        while position < len(from_clause):
+            join = JOIN_PATTERN.match(from_clause, position)
+            if not join:
+                raise NotRoutable("unsupported join")
+            table, table_alias, left_alias, left_col, right_alias, right_col = (
+                group.lower() if group else group for group in join.groups()
+            )
+            table_alias = table_alias or table
+            if table not in DIMENSION_KEYS or table in seen:
+                raise NotRoutable(f"unsupported or repeated join of {table}")
+            fact_key, dim_key = DIMENSION_KEYS[table]
+            sides = {(left_alias, left_col), (right_alias, right_col)}
+            if sides != {(fact_alias.lower(), fact_key), (table_alias, dim_key)}:
+                raise NotRoutable(f"{table} is not joined on its key")
+            seen.add(table)
+            aliases.update({table, table_alias})
+            position = join.end()
+        return fact_alias, aliases
+
+    def _rewrite_calls(self, text, alias, state):
+        """Rewrite aggregate calls in `text` into aggregates over rollup measures"""
+        out, position = [], 0
+        call = re.compile(r"\b([a-z_][a-z0-9_]*)\s*\(", re.I)
+        while True:
+            match = call.search(text, position)
+            if not match:
+                out.append(text[position:])
+                return "".join(out)
+            name = match.group(1).lower()
+            open_idx = match.end() - 1
+            close_idx = _matching_paren(text, open_idx)
+            inner = self._rewrite_calls(text[open_idx + 1:close_idx], alias, state)
+            is_window = re.match(r"\s*over\b", text[close_idx + 1:], re.I)
+            out.append(text[position:match.start()])
+            if name in AGGREGATE_FUNCTIONS and not is_window:
+                state["aggregates"] += 1
+                out.append(self._rewrite_aggregate(name, inner.strip(), alias))
+            else:
+                out.append(text[match.start():open_idx + 1] + inner + ")")
+            position = close_idx + 1
+
+    def _rewrite_aggregate(self, name, arg, alias):
+        qualified = rf"(?:{re.escape(alias)}\.)?"
+        is_days = re.fullmatch(qualified + r"days_in_shelter", arg, re.I) is not None
+        is_live = re.fullmatch(
+            qualified + r"is_live_outcome|case\s+when\s+" + qualified +
+            r"is_live_outcome\s*=\s*1\s+then\s+1\s+else\s+0\s+end", arg, re.I
+        ) is not None
+        distinct = re.match(r"distinct\s", arg, re.I) is not None
+        count = f"{alias}.animal_count"
+
+        if name == "count":
+            if arg in ("*", "1", ""):
+                return f"cast(sum({count}) as bigint)"
+            if distinct:
+                return f"count({arg})"  # duplicate-insensitive; columns are checked afterwards
+            if is_days:
+                return f"cast(sum({alias}.days_in_shelter_count) as bigint)"
+            return f"cast(sum(case when ({arg}) is not null then {count} else 0 end) as bigint)"
+        if name == "count_if" and not distinct:
+            return f"cast(sum(case when ({arg}) then {count} else 0 end) as bigint)"
+        if name == "sum" and not distinct:
+            if is_days:
+                return f"sum({alias}.total_days_in_shelter)"
+            if is_live:
+                return f"sum({alias}.live_outcome_count)"
+            return f"sum(({arg}) * {count})"
+        if name in ("avg", "mean") and not distinct:
+            if is_days:
+                return f"(sum({alias}.total_days_in_shelter) / sum({alias}.days_in_shelter_count))"
+            return (f"(sum(({arg}) * {count}) / "
+                    f"sum(case when ({arg}) is not null then {count} end))")
+        if name in ("min", "max"):
+            if is_days:
+                return f"{name}({alias}.{name}_days_in_shelter)"
+            return f"{name}({arg})"
+        if name in ("bool_and", "bool_or"):
+            return f"{name}({arg})"
+        raise NotRoutable(f"aggregate {name} cannot be computed from the rollup")
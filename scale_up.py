@@ -0,0 +1,252 @@
+"""
+Synthetic scale-up of the star schema for capacity testing.
+
+create_scaled_copy() writes a new DuckDB file holding the star schema of
+an existing one at `factor` times the fact rows:
+- the dimension tables are copied unchanged, so every dimension keeps its
+  cardinality (and its ENUM / INTEGER key types)
+- each fact row is emitted `factor` times. Copy 0 is the original row;
+  the other copies stand for other shelters: their animal_id gets a
+  "-<copy>" suffix, their fact_id is offset past the source ids, and their
+  outcome and intake dates are shifted together by -MAX_DATE_JITTER..
+  +MAX_DATE_JITTER days (one shift per animal and copy, so an animal's
+  visits stay in order and days_in_shelter is unchanged). A shift that
+  would leave the calendar in dim_date is not applied.
+- the joint distribution of the dimension keys, and so the skew of every
+  breed, outcome, intake and sex/age group, is exactly the source's;
+  dates keep their seasonality up to the jitter
+- the fact table is written in outcome_date_key order (star_layout's
+  physical sort), one shifted outcome year at a time to bound memory (each
+  batch reads the source rows from the adjacent Decembers/Januaries too,
+  since the jitter moves rows across New Year), and the rollups are
+  rebuilt when the source has them
+
+Raw and consolidated tables are not copied; the scaled files only serve
+star schema queries. Each file records the source file fingerprint
+(result_cache.database_fingerprint) and factor in `scale_info`, and
+ensure_scaled_copy() regenerates it only when those no longer match.
+distribution_profile() summarizes key cardinalities and skew so a scaled
+copy can be checked against its source.
+
+    python scale_up.py [path/to/animal_shelter.duckdb] [--factors 10,100,1000] [--force]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+from result_cache import database_fingerprint
+from star_layout import SORT_ORDER
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+SCALED_DIR = PROJECT_DIR / "scaled"
+SCALE_FACTORS = (10, 100, 1000)
+MAX_DATE_JITTER = 7  # days
+DEFAULT_SEED = 42
+
+FACT_TABLE = "fact_animal_outcome"
+DIMENSION_TABLES = [table for table in SORT_ORDER if table != FACT_TABLE]
+INFO_TABLE = "scale_info"
+
+# Fact foreign keys whose distribution distribution_profile() reports
+PROFILED_KEYS = [
+    "animal_attributes_key", "sex_key", "outcome_key", "intake_details_key",
+    "outcome_date_key", "intake_date_key",
+]
+
+
+def scaled_path(factor, scaled_dir=SCALED_DIR):
+    return Path(scaled_dir) / f"animal_shelter_x{factor}.duckdb"
+
+
+def _quote(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+# ==============================================================================
+# GENERATION
+# ==============================================================================
+
+def _scaled_fact_sql(factor, id_stride, seed, year):
+    """Rows of the scaled fact table whose shifted outcome falls in `year`"""
+    return f"""
+        WITH copies AS (
+            SELECT f.*, copy,
+                   CASE WHEN copy = 0 THEN 0
+                        ELSE CAST(hash(f.animal_id, copy, {seed}) % {2 * MAX_DATE_JITTER + 1} AS INTEGER)
+                             - {MAX_DATE_JITTER}
+                   END AS shift_days
+            FROM source.{FACT_TABLE} f, range({factor}) AS copies(copy)
+            -- a shift of up to MAX_DATE_JITTER days only reaches across the adjacent New Years
+            WHERE f.outcome_date_key BETWEEN {(year - 1) * 10000 + 1201} AND {(year + 1) * 10000 + 131}
+        ),
+        shifted AS (
+            SELECT c.*, o.shifted_key AS shifted_outcome_key, i.shifted_key AS shifted_intake_key,
+                   o.shifted_key IS NOT NULL
+                       AND (c.intake_date_key IS NULL OR i.shifted_key IS NOT NULL) AS can_shift
+            FROM copies c
+            LEFT JOIN date_shift o ON o.date_key = c.outcome_date_key AND o.shift_days = c.shift_days
+            LEFT JOIN date_shift i ON i.date_key = c.intake_date_key AND i.shift_days = c.shift_days
+        )
+        SELECT * FROM (
+            SELECT * EXCLUDE (copy, shift_days, shifted_outcome_key, shifted_intake_key, can_shift)
+                     REPLACE (
+                         fact_id + copy * {id_stride} AS fact_id,
+                         CASE WHEN copy = 0 THEN animal_id ELSE animal_id || '-' || copy END AS animal_id,
+                         CASE WHEN can_shift THEN shifted_outcome_key ELSE outcome_date_key END AS outcome_date_key,
+                         CASE WHEN can_shift THEN shifted_intake_key ELSE intake_date_key END AS intake_date_key
+                     )
+            FROM shifted
+        )
+        WHERE outcome_date_key // 10000 = {year}
+        ORDER BY {", ".join(SORT_ORDER[FACT_TABLE])}
+    """
+
+
+def create_scaled_copy(source_path, target_path, factor, seed=DEFAULT_SEED):
+    """Write the star schema of `source_path` at `factor` times the fact rows to `target_path`
+
+    Returns {table: row count}.
+    """
+    target_path = Path(target_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target_path.with_suffix(".tmp")
+    temp_path.unlink(missing_ok=True)
+    source_fingerprint = database_fingerprint(source_path)
+
+    conn = duckdb.connect(str(temp_path))
+    try:
+        conn.execute(f"ATTACH {_quote(source_path)} AS source (READ_ONLY)")
+        for table in DIMENSION_TABLES:
+            conn.execute(f"""
+                CREATE TABLE {table} AS
+                SELECT * FROM source.{table} ORDER BY {", ".join(SORT_ORDER[table])}
+            """)
+
+        # date_key -> date_key shifted by each jitter, where the shifted day is in the calendar
+        conn.execute(f"""
+            CREATE TEMP TABLE date_shift AS
+            SELECT d.date_key, s.shift_days, t.date_key AS shifted_key
+            FROM dim_date d, range(-{MAX_DATE_JITTER}, {MAX_DATE_JITTER + 1}) AS s(shift_days)
+            JOIN dim_date t ON t.date = d.date + CAST(s.shift_days AS INTEGER)
+        """)
+
+        conn.execute(f"CREATE TABLE {FACT_TABLE} AS SELECT * FROM source.{FACT_TABLE} LIMIT 0")
+        id_stride = conn.execute(f"SELECT COALESCE(MAX(fact_id), 0) + 1 FROM source.{FACT_TABLE}").fetchone()[0]
+        # Every year a shifted outcome can land in (the calendar may extend past the outcomes)
+        years = [row[0] for row in conn.execute(f"""
+            SELECT DISTINCT date_key // 10000 FROM dim_date ORDER BY 1
+        """).fetchall()]
+        for year in years:
+            conn.execute(f"INSERT INTO {FACT_TABLE} {_scaled_fact_sql(factor, id_stride, seed, year)}")
+
+        has_rollups = conn.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE database_name = 'source' AND table_name = 'rollup_catalog'"
+        ).fetchone()[0]
+        conn.execute("DETACH source")
+        if has_rollups:
+            from rollups import build_rollups
+            build_rollups(conn)
+
+        conn.execute(f"""
+            CREATE TABLE {INFO_TABLE} AS
+            SELECT {_quote(Path(source_path).resolve())} AS source_path,
+                   {_quote(source_fingerprint)} AS source_fingerprint,
+                   {int(factor)} AS factor, {int(seed)} AS seed,
+                   current_timestamp::TIMESTAMP AS built_at
+        """)
+        conn.execute("CHECKPOINT")
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in [FACT_TABLE] + DIMENSION_TABLES}
+    finally:
+        conn.close()
+    temp_path.replace(target_path)
+    return counts
+
+
+def scaled_copy_is_current(source_path, target_path, factor, seed=DEFAULT_SEED):
+    """True when `target_path` was generated from the current source file with these settings"""
+    if not Path(target_path).exists():
+        return False
+    conn = duckdb.connect(str(target_path), read_only=True)
+    try:
+        info = conn.execute(f"SELECT source_fingerprint, factor, seed FROM {INFO_TABLE}").fetchone()
+    except duckdb.CatalogException:
+        return False
+    finally:
+        conn.close()
+    return info == (database_fingerprint(source_path), factor, seed)
+
+
+def ensure_scaled_copy(source_path, factor, scaled_dir=SCALED_DIR, seed=DEFAULT_SEED, force=False):
+    """Path of the scaled copy, generated first if missing or outdated; factor 1 is the source itself"""
+    if factor == 1:
+        return Path(source_path)
+    target_path = scaled_path(factor, scaled_dir)
+    if force or not scaled_copy_is_current(source_path, target_path, factor, seed):
+        create_scaled_copy(source_path, target_path, factor, seed)
+    return target_path
+
+
+# ==============================================================================
+# DISTRIBUTION CHECK
+# ==============================================================================
+
+def distribution_profile(conn):
+    """{fact key: (distinct values, share of the most common value, share of the top 10)}"""
+    profile = {}
+    for key in PROFILED_KEYS:
+        profile[key] = conn.execute(f"""
+            WITH counts AS (
+                SELECT {key}, COUNT(*) AS n FROM {FACT_TABLE} GROUP BY {key}
+            )
+            SELECT COUNT(*),
+                   MAX(n) / SUM(n),
+                   SUM(n) FILTER (WHERE rank <= 10) / SUM(n)
+            FROM (SELECT n, ROW_NUMBER() OVER (ORDER BY n DESC) AS rank FROM counts)
+        """).fetchone()
+    return profile
+
+
+def print_profiles(profiles):
+    """Side-by-side distribution profiles: {label: distribution_profile()}"""
+    labels = list(profiles)
+    print(f"{'Key':22s} " + " ".join(f"{label:>26s}" for label in labels))
+    print(f"{'':22s} " + " ".join(f"{'distinct  top1%  top10%':>26s}" for _ in labels))
+    for key in PROFILED_KEYS:
+        cells = []
+        for label in labels:
+            distinct, top1, top10 = profiles[label][key]
+            cells.append(f"{distinct:>11,} {100 * top1:6.2f} {100 * top10:7.2f}")
+        print(f"{key:22s} " + " ".join(f"{cell:>26s}" for cell in cells))
+
+
+def main(db_path=DEFAULT_DB_PATH, factors=SCALE_FACTORS, force=False):
+    profiles = {}
+    for factor in (1,) + tuple(factors):
+        started = time.perf_counter()
+        path = ensure_scaled_copy(db_path, factor, force=force)
+        conn = duckdb.connect(str(path), read_only=True)
+        try:
+            rows = conn.execute(f"SELECT COUNT(*) FROM {FACT_TABLE}").fetchone()[0]
+            profiles[f"x{factor}"] = distribution_profile(conn)
+        finally:
+            conn.close()
+        size_mb = path.stat().st_size / 1024 ** 2
+        print(f"x{factor:<5} {rows:>13,} fact rows  {size_mb:9.1f} MB  {path.name}"
+              f"  ({time.perf_counter() - started:.1f}s)")
+    print()
+    print_profiles(profiles)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    factors = SCALE_FACTORS
+    if "--factors" in args:
+        index = args.index("--factors")
+        factors = tuple(int(f) for f in args[index + 1].split(","))
+        del args[index:index + 2]
+    main(args[0] if args else DEFAULT_DB_PATH, factors, force="--force" in sys.argv[1:])
@@ -0,0 +1,132 @@
+"""
+Persistent question -> SQL cache for the analytics agent.
+
+Generated SQL is stored in a small SQLite file keyed by the normalized
+question text and the prompt version from mindsdb_agent_config.json, so
+bumping the config version automatically invalidates old entries.
+Entries expire after a TTL and the least recently used ones are evicted
+once the cache grows past its size limit.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent
+CACHE_DIR = PROJECT_DIR / ".cache"
+DEFAULT_CACHE_PATH = CACHE_DIR / "question_sql_cache.sqlite"
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600  # one week
+
+
+def normalize_question(question):
+    """Normalize a question so trivially different phrasings share a cache key"""
+    text = question.lower()
+    # Punctuation carries no meaning for SQL generation ("spayed/neutered" -> "spayed neutered")
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+class QuestionSQLCache:
+    """SQLite-backed LRU/TTL cache mapping (prompt version, question) to SQL"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS question_sql (
+                    prompt_version TEXT NOT NULL,
+                    question_key TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (prompt_version, question_key)
+                )
+            """)
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_question_sql_access ON question_sql (last_access)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(str(self.path), timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, question, prompt_version):
+        """Return cached SQL for the question, or None on a miss or expired entry"""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT sql, created_at FROM question_sql WHERE prompt_version = ? AND question_key = ?",
+                (str(prompt_version), key)
+            ).fetchone()
+            if row is None:
+                return None
+            sql, created_at = row
+            if now - created_at > self.ttl_seconds:
+                db.execute(
+                    "DELETE FROM question_sql WHERE prompt_version = ? AND question_key = ?",
+                    (str(prompt_version), key)
+                )
+                return None
+            db.execute(
+                "UPDATE question_sql SET last_access = ?, hits = hits + 1 "
+                "WHERE prompt_version = ? AND question_key = ?",
+                (now, str(prompt_version), key)
+            )
+            return sql
+
+    def put(self, question, prompt_version, sql):
+        """Store generated SQL and evict expired / least recently used entries"""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO question_sql "
+                "(prompt_version, question_key, question, sql, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (str(prompt_version), key, question, sql, now, now)
+            )
+            db.execute("DELETE FROM question_sql WHERE created_at < ?", (now - self.ttl_seconds,))
+            db.execute("""
+                DELETE FROM question_sql WHERE rowid IN (
+                    SELECT rowid FROM question_sql
+                    ORDER BY last_access DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def purge_other_versions(self, prompt_version):
+        """Drop entries generated with any prompt version other than the current one"""
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM question_sql WHERE prompt_version != ?", (str(prompt_version),))
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM question_sql")
+
+    def stats(self):
+        """Return entry and hit counts for display"""
+        with self._lock, self._connect() as db:
+            entries, hits = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM question_sql"
+            ).fetchone()
+        return {"entries": entries, "hits": hits}
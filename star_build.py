@@ -0,0 +1,513 @@
+"""
+Set-based star schema build, run entirely inside DuckDB.
+
+Produces the same six tables as build_star_schema_tables.ipynb without
+pulling animal_outcomes_consolidated into pandas: every dimension is a
+GROUP BY over the consolidated table, the fact table is one join, and
+dim_date is a contiguous calendar from generate_series.
+
+Surrogate keys are persisted in one key map per dimension
+(<dimension>_key_map: the key and the dimension's source columns). A build
+keeps the key of every member already in the map and numbers new members
+after its largest key, in order of first appearance in the consolidated
+table (its rowid). On a first build that is the order the pandas build's
+drop_duplicates() assigned, so keys match the notebook's; afterwards keys
+never change, whatever order later rows arrive in. A dimension only holds
+the members its source has now, so keys of members that disappear leave
+gaps. fact_id is a row number in consolidated-table order, reassigned by
+every full build. Joins use IS NOT DISTINCT FROM because pandas merges
+NULL join values onto NULL dimension values (e.g. a missing
+outcome_subtype).
+
+All tables are replaced in one transaction, so readers never see a
+half-built schema.
+
+refresh_star_schema() is the incremental alternative for daily loads. It
+finds new outcomes by watermark: raw outcomes dated at or after the latest
+outcome already loaded. Only those rows, and the intakes of their animals,
+go through the stage SQL of feature_pipeline.py (into temporary tables);
+the resulting rows not yet in animal_outcomes_consolidated are appended to
+it. Their new dimension members get keys from the key maps, dim_date is
+extended, and the fact rows are appended and folded into the rollups
+(rollups.merge_into_rollups). The materialized feature tables are left
+alone: the next pipeline run sees the changed raw tables and rebuilds them
+and the consolidated table, and a full build after that keeps every
+dimension key. Outcomes older than the watermark that arrive late (e.g.
+once their intake is loaded) need a full build.
+
+Run as a script to run the feature pipeline and rebuild the star schema
+(or refresh it with --incremental), apply the compact layout and rebuild
+the rollups:
+
+    python star_build.py [path/to/animal_shelter.duckdb] [--incremental]
+"""
+
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+SOURCE_TABLE = "animal_outcomes_consolidated"
+REFRESH_LOG_TABLE = "star_refresh_log"
+
+# dimension -> (surrogate key, [(consolidated column, dimension column)])
+DIMENSIONS = {
+    "dim_animal_attributes": ("animal_attributes_key", [
+        ('"Animal Type"', "animal_type"),
+        ("primary_breed", "primary_breed"),
+        ("secondary_breed", "secondary_breed"),
+        ("is_mixed_breed", "is_mixed_breed"),
+        ("breed_group", "breed_group"),
+        ('"Color"', "color"),
+    ]),
+    "dim_sex_on_outcome": ("sex_key", [
+        ('"Sex upon Outcome"', "sex_upon_outcome"),
+        ("is_intact", "is_intact"),
+        ("is_male", "is_male"),
+        ("is_female", "is_female"),
+        ("age_group", "age_group"),
+    ]),
+    "dim_outcome_type": ("outcome_key", [
+        ('"Outcome Type"', "outcome_type"),
+        ('"Outcome Subtype"', "outcome_subtype"),
+        ("is_live_outcome", "is_live_outcome"),
+        ("stay_duration_category", "stay_duration_category"),
+    ]),
+    "dim_intake_details": ("intake_details_key", [
+        ('"Intake Type"', "intake_type"),
+        ('"Intake Condition"', "intake_condition"),
+    ]),
+}
+
+# Engineered columns appended to a dimension, computed from its own columns
+DERIVED_COLUMNS = {
+    "dim_intake_details": [
+        """CASE intake_condition
+            WHEN 'Normal' THEN 'Healthy'
+            WHEN 'Injured' THEN 'Sick/Injured'
+            WHEN 'Nursing' THEN 'Pregnant/Nursing'
+            WHEN 'Pregnant' THEN 'Pregnant/Nursing'
+            WHEN 'Feral' THEN 'Feral'
+            WHEN 'Aged' THEN 'Elderly'
+            WHEN 'Behavior Issue' THEN 'Behavioral'
+            WHEN 'Other' THEN 'Other'
+            ELSE intake_condition
+        END AS condition_severity""",
+        "CAST(intake_condition IS DISTINCT FROM 'Normal' AS BIGINT) AS has_condition_flag",
+    ],
+}
+
+FACT_MEASURES = ["days_in_shelter", "age_at_outcome_days", "age_at_outcome_years"]
+
+def _date_key(expression):
+    """YYYYMMDD integer key of a DATE/TIMESTAMP expression"""
+    return f"CAST(year({expression}) * 10000 + month({expression}) * 100 + day({expression}) AS BIGINT)"
+
+
+def _table_exists(conn, table):
+    return conn.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [table]).fetchone()[0] > 0
+
+
+def _enum_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info('{table}')").fetchall()
+            if row[2].startswith("ENUM")]
+
+
+# ==============================================================================
+# TABLE SQL
+# ==============================================================================
+
+def _date_bounds_sql(source):
+    """first_date/last_date over the outcome and intake dates of a table"""
+    return f"""
+        SELECT
+            LEAST(MIN(CAST("DateTime" AS DATE)), MIN(CAST(intake_date AS DATE))) AS first_date,
+            GREATEST(MAX(CAST("DateTime" AS DATE)), MAX(CAST(intake_date AS DATE))) AS last_date
+        FROM {source}
+    """
+
+
+def _calendar_sql(bounds_sql):
+    """dim_date rows for every day between the bounds' first_date and last_date"""
+    return f"""
+        WITH bounds AS ({bounds_sql}),
+        calendar AS (
+            SELECT CAST(day AS DATE) AS date
+            FROM bounds, generate_series(first_date, last_date, INTERVAL 1 DAY) AS days(day)
+        )
+        SELECT
+            {_date_key("date")} AS date_key,
+            date,
+            year(date) AS year,
+            quarter(date) AS quarter,
+            month(date) AS month,
+            monthname(date) AS month_name,
+            day(date) AS day_of_month,
+            isodow(date) - 1 AS day_of_week,  -- 0=Monday, 6=Sunday
+            dayname(date) AS day_of_week_name,
+            weekofyear(date) AS week_of_year,
+            CAST(isodow(date) >= 6 AS BIGINT) AS is_weekend
+        FROM calendar
+    """
+
+
+def dim_date_sql(source=SOURCE_TABLE):
+    """One row per calendar day between the earliest and latest outcome/intake date"""
+    return f"""
+        CREATE OR REPLACE TABLE dim_date AS
+        {_calendar_sql(_date_bounds_sql(source))}
+        ORDER BY date_key
+    """
+
+
+def key_map_table(table):
+    return f"{table}_key_map"
+
+
+def _distinct_members_sql(table, source):
+    """Distinct attribute combinations of `source` with the rowid they first appear at"""
+    _, columns = DIMENSIONS[table]
+    distinct_columns = ", ".join(f"{src} AS {dst}" for src, dst in columns)
+    return f"""
+        SELECT {distinct_columns}, MIN(rowid) AS first_row
+        FROM {source}
+        GROUP BY ALL
+    """
+
+
+def key_map_sql(table, source=SOURCE_TABLE):
+    """Add the members of `source` missing from the key map, numbered after its largest key"""
+    key, columns = DIMENSIONS[table]
+    key_map = key_map_table(table)
+    selected = ", ".join(dst for _, dst in columns)
+    known = " AND ".join(f"k.{dst} IS NOT DISTINCT FROM m.{dst}" for _, dst in columns)
+    return f"""
+        INSERT INTO {key_map}
+        SELECT
+            (SELECT COALESCE(MAX({key}), 0) FROM {key_map}) + ROW_NUMBER() OVER (ORDER BY first_row) AS {key},
+            {selected}
+        FROM ({_distinct_members_sql(table, source)}) m
+        WHERE NOT EXISTS (SELECT 1 FROM {key_map} k WHERE {known})
+        ORDER BY first_row
+    """
+
+
+def ensure_key_map(conn, table, source=SOURCE_TABLE):
+    """Create the key map of a dimension if missing, seeded with the keys of the existing dimension"""
+    key, columns = DIMENSIONS[table]
+    key_map = key_map_table(table)
+    if _table_exists(conn, key_map):
+        return
+    if _table_exists(conn, table):
+        selected = ", ".join(dst for _, dst in columns)
+        conn.execute(f"CREATE TABLE {key_map} AS SELECT {key}, {selected} FROM {table}")
+        for column in _enum_columns(conn, key_map):
+            conn.execute(f"ALTER TABLE {key_map} ALTER {column} TYPE VARCHAR")
+    else:
+        conn.execute(f"""
+            CREATE TABLE {key_map} AS
+            SELECT CAST(0 AS BIGINT) AS {key}, * EXCLUDE (first_row)
+            FROM ({_distinct_members_sql(table, source)})
+            LIMIT 0
+        """)
+
+
+def _members_sql(table, source):
+    """Distinct attribute combinations of `source` with their keys from the key map"""
+    key, columns = DIMENSIONS[table]
+    selected = ", ".join(dst for _, dst in columns)
+    derived = "".join(f",\n            {expression}" for expression in DERIVED_COLUMNS.get(table, []))
+    mapped = " AND ".join(f"k.{dst} IS NOT DISTINCT FROM m.{dst}" for _, dst in columns)
+    return f"""
+        SELECT
+            {key},
+            {selected}{derived}
+        FROM (
+            SELECT k.{key}, m.* EXCLUDE (first_row)
+            FROM ({_distinct_members_sql(table, source)}) m
+            JOIN {key_map_table(table)} k ON {mapped}
+        )
+        ORDER BY {key}
+    """
+
+
+def dimension_sql(table, source=SOURCE_TABLE):
+    """Distinct attribute combinations, keyed by the key map (run key_map_sql first)"""
+    return f"CREATE OR REPLACE TABLE {table} AS {_members_sql(table, source)}"
+
+
+def _fact_select_sql(source, fact_id_offset="0"):
+    """One row per consolidated outcome with its dimension keys and measures"""
+    joins, keys = [], []
+    for n, (table, (key, columns)) in enumerate(DIMENSIONS.items(), 1):
+        alias = f"d{n}"
+        condition = " AND ".join(f"{alias}.{dst} IS NOT DISTINCT FROM c.{src}" for src, dst in columns)
+        joins.append(f"LEFT JOIN {table} {alias} ON {condition}")
+        keys.append(f"{alias}.{key}")
+    animal_key, sex_key, outcome_key, intake_key = keys
+    measures = ", ".join(f"c.{m}" for m in FACT_MEASURES)
+    joined = "\n        ".join(joins)
+    return f"""
+        SELECT
+            {fact_id_offset} + ROW_NUMBER() OVER (ORDER BY c.rowid) AS fact_id,
+            c."Animal ID" AS animal_id,
+            {animal_key},
+            {sex_key},
+            {_date_key('c."DateTime"')} AS outcome_date_key,
+            {_date_key("c.intake_date")} AS intake_date_key,
+            {outcome_key},
+            {intake_key},
+            {measures}
+        FROM {source} c
+        {joined}
+        ORDER BY fact_id
+    """
+
+
+def fact_sql(source=SOURCE_TABLE):
+    """One row per consolidated outcome with its dimension keys and measures"""
+    return f"CREATE OR REPLACE TABLE fact_animal_outcome AS {_fact_select_sql(source)}"
+
+
+# ==============================================================================
+# BUILD
+# ==============================================================================
+
+def build_star_schema(conn, source=SOURCE_TABLE):
+    """(Re)build every star-schema table from the consolidated table
+
+    Returns {table: (row count, seconds)} in build order.
+    """
+    statements = [("dim_date", [dim_date_sql(source)])]
+    statements += [(table, [key_map_sql(table, source), dimension_sql(table, source)]) for table in DIMENSIONS]
+    statements.append(("fact_animal_outcome", [fact_sql(source)]))
+
+    results = {}
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        for table in DIMENSIONS:
+            ensure_key_map(conn, table, source)
+        for table, sqls in statements:
+            started = time.perf_counter()
+            for sql in sqls:
+                conn.execute(sql)
+            row_count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            results[table] = (row_count, time.perf_counter() - started)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return results
+
+
+def foreign_key_violations(conn):
+    """{fact column: rows whose key has no dimension row (or is NULL)}"""
+    references = [(key, table, key) for table, (key, _) in DIMENSIONS.items()]
+    references += [("outcome_date_key", "dim_date", "date_key"), ("intake_date_key", "dim_date", "date_key")]
+    violations = {}
+    for column, table, key in references:
+        violations[column] = conn.execute(f"""
+            SELECT COUNT(*) FROM fact_animal_outcome f
+            ANTI JOIN {table} d ON f.{column} = d.{key}
+        """).fetchone()[0]
+    return violations
+
+
+# ==============================================================================
+# INCREMENTAL REFRESH
+# ==============================================================================
+
+REFRESH_INPUTS = ["raw_animal_outcomes", "raw_animal_intakes"]
+
+
+def _refresh_table(name):
+    return f"star_refresh_{name}"
+
+
+def _load_new_outcomes(conn, batch_table):
+    """Stage consolidated rows of the raw outcomes newer than the watermark
+
+    Runs the feature pipeline's stage SQL over temporary copies of just
+    those raw outcomes and the intakes of their animals. Returns
+    (watermark, new watermark, rows).
+    """
+    from feature_pipeline import OUTPUT_TABLE, STAGES
+
+    watermark = conn.execute(f'SELECT MAX("DateTime") FROM {SOURCE_TABLE}').fetchone()[0]
+    # rowid order keeps the first-appearance order (and duplicate handling) of a full run
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {_refresh_table("raw_animal_outcomes")} AS
+        SELECT * FROM raw_animal_outcomes WHERE "DateTime" >= ? ORDER BY rowid
+    """, [watermark])
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {_refresh_table("raw_animal_intakes")} AS
+        SELECT * FROM raw_animal_intakes
+        SEMI JOIN {_refresh_table("raw_animal_outcomes")} USING ("Animal ID")
+        ORDER BY rowid
+    """)
+    names = REFRESH_INPUTS + list(STAGES)
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b")
+    for stage, (_, sql) in STAGES.items():
+        sql = pattern.sub(lambda match: _refresh_table(match.group(1)), sql)
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE {_refresh_table(stage)} AS {sql}")
+
+    # >= plus the anti join picks up outcomes that share the watermark's timestamp
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {batch_table} AS
+        SELECT v.* FROM {_refresh_table(OUTPUT_TABLE)} v
+        ANTI JOIN {SOURCE_TABLE} c ON c."Animal ID" = v."Animal ID" AND c."DateTime" = v."DateTime"
+        ORDER BY v.rowid
+    """)
+    for name in names:
+        conn.execute(f"DROP TABLE {_refresh_table(name)}")
+    rows, new_watermark = conn.execute(f'SELECT COUNT(*), MAX("DateTime") FROM {batch_table}').fetchone()
+    return watermark, new_watermark or watermark, rows
+
+
+def _widen_enums(conn, table):
+    """ENUM types cannot gain values: make them VARCHAR until compact_table() runs again"""
+    enum_columns = _enum_columns(conn, table)
+    for column in enum_columns:
+        conn.execute(f"ALTER TABLE {table} ALTER {column} TYPE VARCHAR")
+    return bool(enum_columns)
+
+
+def refresh_star_schema(conn):
+    """Append outcomes newer than the watermark without rebuilding the star schema
+
+    Works on the new raw outcomes only: it keys their unseen dimension
+    members through the key maps, extends dim_date, appends the fact rows
+    and merges them into the rollups, all in one transaction. Tables with
+    ENUM columns that gain rows are re-compacted. Returns
+    {table: (rows added, seconds)}; empty when nothing is new.
+    """
+    from rollups import CATALOG_TABLE, merge_into_rollups, star_fingerprint
+    from star_layout import compact_table
+
+    batch = "star_refresh_batch"
+    new_facts = "star_refresh_facts"
+    started_refresh = time.perf_counter()
+    results = {}
+    has_rollups = _table_exists(conn, CATALOG_TABLE)
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        started = time.perf_counter()
+        watermark, new_watermark, new_rows = _load_new_outcomes(conn, batch)
+        if not new_rows:
+            conn.execute("ROLLBACK")
+            return results
+        fingerprint_before = star_fingerprint(conn) if has_rollups else None
+        conn.execute(f"INSERT INTO {SOURCE_TABLE} BY NAME SELECT * FROM {batch} ORDER BY rowid")
+        results[SOURCE_TABLE] = (new_rows, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        bounds = f"""
+            SELECT LEAST(b.first_date, d.first_date) AS first_date, GREATEST(b.last_date, d.last_date) AS last_date
+            FROM ({_date_bounds_sql(batch)}) b, (SELECT MIN(date) AS first_date, MAX(date) AS last_date FROM dim_date) d
+        """
+        new_dates = f"SELECT * FROM ({_calendar_sql(bounds)}) ANTI JOIN dim_date USING (date_key)"
+        added = 0
+        if conn.execute(f"SELECT COUNT(*) FROM ({new_dates})").fetchone()[0]:
+            widened = _widen_enums(conn, "dim_date")
+            added = conn.execute(f"INSERT INTO dim_date {new_dates} ORDER BY date_key").fetchone()[0]
+            if widened:
+                compact_table(conn, "dim_date")
+        results["dim_date"] = (added, time.perf_counter() - started)
+
+        for table, (key, _) in DIMENSIONS.items():
+            started = time.perf_counter()
+            ensure_key_map(conn, table)
+            conn.execute(key_map_sql(table, batch))
+            new_members = f"SELECT * FROM ({_members_sql(table, batch)}) ANTI JOIN {table} USING ({key})"
+            added = 0
+            if conn.execute(f"SELECT COUNT(*) FROM ({new_members})").fetchone()[0]:
+                widened = _widen_enums(conn, table)
+                added = conn.execute(f"INSERT INTO {table} BY NAME {new_members} ORDER BY {key}").fetchone()[0]
+                if widened:
+                    compact_table(conn, table)
+            results[table] = (added, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        offset = "(SELECT COALESCE(MAX(fact_id), 0) FROM fact_animal_outcome)"
+        # Same column types as the fact table, so the rollups merge like-typed measures
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE {new_facts} AS SELECT * FROM fact_animal_outcome LIMIT 0")
+        conn.execute(f"INSERT INTO {new_facts} BY NAME {_fact_select_sql(batch, fact_id_offset=offset)}")
+        added = conn.execute(f"INSERT INTO fact_animal_outcome SELECT * FROM {new_facts}").fetchone()[0]
+        results["fact_animal_outcome"] = (added, time.perf_counter() - started)
+
+        if has_rollups:
+            started = time.perf_counter()
+            rollups = merge_into_rollups(conn, new_facts, fingerprint_before)
+            results["rollups (merged)"] = (sum(rows for rows, _ in rollups.values()), time.perf_counter() - started)
+
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {REFRESH_LOG_TABLE} (
+                refreshed_at TIMESTAMP,
+                watermark_before TIMESTAMP,
+                watermark_after TIMESTAMP,
+                rows_added VARCHAR,
+                seconds DOUBLE
+            )
+        """)
+        conn.execute(
+            f"INSERT INTO {REFRESH_LOG_TABLE} VALUES (current_timestamp::TIMESTAMP, ?, ?, ?, ?)",
+            [watermark, new_watermark, json.dumps({t: rows for t, (rows, _) in results.items()}),
+             time.perf_counter() - started_refresh]
+        )
+        conn.execute(f"DROP TABLE {batch}")
+        conn.execute(f"DROP TABLE {new_facts}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return results
+
+
+def main(db_path=DEFAULT_DB_PATH, incremental=False):
+    from feature_pipeline import print_run, run_pipeline
+    from rollups import build_rollups
+    from star_layout import apply_compact_layout
+
+    conn = duckdb.connect(str(db_path))
+    try:
+        total_started = time.perf_counter()
+        if incremental:
+            results = refresh_star_schema(conn)
+            for table, (row_count, seconds) in results.items():
+                print(f"{table:28s}: {row_count:>10,} rows added ({seconds:.2f}s)")
+            if not results:
+                print("No new outcomes since the last load")
+            print(f"\nStar schema refreshed in {time.perf_counter() - total_started:.2f}s")
+            return
+
+        print_run(run_pipeline(conn))
+        for table, (row_count, seconds) in build_star_schema(conn).items():
+            print(f"{table:28s}: {row_count:>10,} rows ({seconds:.2f}s)")
+
+        violations = foreign_key_violations(conn)
+        for column, count in violations.items():
+            if count:
+                print(f"  WARNING: {count:,} fact rows with invalid {column}")
+        if not any(violations.values()):
+            print("✓ All foreign keys valid")
+
+        started = time.perf_counter()
+        apply_compact_layout(conn)
+        print(f"{'compact layout':28s}: ({time.perf_counter() - started:.2f}s)")
+
+        for rollup_name, (row_count, seconds) in build_rollups(conn).items():
+            print(f"{rollup_name:28s}: {row_count:>10,} rows ({seconds:.2f}s)")
+
+        print(f"\nStar schema built in {time.perf_counter() - total_started:.2f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--incremental"]
+    main(args[0] if args else DEFAULT_DB_PATH, incremental="--incremental" in sys.argv[1:])
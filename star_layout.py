@@ -0,0 +1,256 @@
+"""
+Compact physical layout for the star schema.
+
+The pandas-based build writes every string as VARCHAR, every integer as
+BIGINT and the fact table in merge order. This stage rewrites the tables
+in place so they scan faster and take less space:
+- low-cardinality categorical columns become DuckDB ENUMs (stored as a
+  1-byte dictionary code; comparisons with string literals keep working)
+- surrogate keys and dim_date parts become INTEGER instead of BIGINT (a
+  column keeps its type if its data does not fit); measures and flags
+  keep their types, so arithmetic in generated SQL cannot overflow
+- fact_animal_outcome is sorted by outcome_date_key, so DuckDB's per-row-
+  group min/max zone maps can skip row groups in date-range queries
+
+benchmark_ground_truth() times the queries from
+agent_ground_truth_test_cases.json so the effect can be measured before
+and after. Replaced tables free their old blocks for reuse, but the
+database file itself does not shrink in place. Run as a script to apply
+the layout to animal_shelter.duckdb with a before/after report:
+
+    python star_layout.py [path/to/animal_shelter.duckdb]
+"""
+
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+PROJECT_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = PROJECT_DIR / "animal_shelter.duckdb"
+TEST_CASES_PATH = PROJECT_DIR / "agent_ground_truth_test_cases.json"
+
+MAX_ENUM_VALUES = 255  # keeps the dictionary code in one byte
+
+# Categorical columns stored as ENUM, per table
+ENUM_COLUMNS = {
+    "dim_outcome_type": ["outcome_type", "outcome_subtype", "stay_duration_category"],
+    "dim_animal_attributes": ["animal_type", "breed_group"],
+    "dim_sex_on_outcome": ["sex_upon_outcome", "age_group"],
+    "dim_intake_details": ["intake_type", "intake_condition", "condition_severity"],
+    "dim_date": ["month_name", "day_of_week_name"],
+}
+
+# Narrow integer types, per table. Only surrogate keys and dim_date parts
+# are narrowed, and not below INTEGER: DuckDB does arithmetic in the
+# operands' type, so generated SQL such as `age_at_outcome_years * 12` or
+# `year * 100 + month` overflows TINYINT/SMALLINT. Measures and flags keep
+# the types MINDSDB_SCHEMA_CONTEXT.txt documents; small values are
+# bit-packed in storage anyway.
+INTEGER_TYPES = {
+    "fact_animal_outcome": {
+        "fact_id": "INTEGER",
+        "animal_attributes_key": "INTEGER",
+        "sex_key": "INTEGER",
+        "outcome_date_key": "INTEGER",
+        "intake_date_key": "INTEGER",
+        "outcome_key": "INTEGER",
+        "intake_details_key": "INTEGER",
+    },
+    "dim_outcome_type": {"outcome_key": "INTEGER"},
+    "dim_animal_attributes": {"animal_attributes_key": "INTEGER"},
+    "dim_sex_on_outcome": {"sex_key": "INTEGER"},
+    "dim_intake_details": {"intake_details_key": "INTEGER"},
+    "dim_date": {
+        "date_key": "INTEGER", "year": "INTEGER", "quarter": "INTEGER", "month": "INTEGER",
+        "day_of_month": "INTEGER", "day_of_week": "INTEGER", "week_of_year": "INTEGER",
+    },
+}
+
+# Measures and flags an earlier version of this layout narrowed to
+# TINYINT/SMALLINT, with the type they are restored to
+RESTORED_TYPES = {
+    "fact_animal_outcome": {
+        "days_in_shelter": "BIGINT", "age_at_outcome_days": "INTEGER", "age_at_outcome_years": "BIGINT",
+    },
+    "dim_outcome_type": {"is_live_outcome": "INTEGER"},
+    "dim_animal_attributes": {"is_mixed_breed": "INTEGER"},
+    "dim_sex_on_outcome": {"is_intact": "INTEGER", "is_male": "INTEGER", "is_female": "INTEGER"},
+    "dim_intake_details": {"has_condition_flag": "INTEGER"},
+    "dim_date": {"is_weekend": "BIGINT"},
+}
+
+INTEGER_RANGES = {
+    "TINYINT": (-2**7, 2**7 - 1),
+    "SMALLINT": (-2**15, 2**15 - 1),
+    "INTEGER": (-2**31, 2**31 - 1),
+}
+
+# Physical sort order, per table
+SORT_ORDER = {
+    "fact_animal_outcome": ["outcome_date_key", "fact_id"],
+    "dim_outcome_type": ["outcome_key"],
+    "dim_animal_attributes": ["animal_attributes_key"],
+    "dim_sex_on_outcome": ["sex_key"],
+    "dim_intake_details": ["intake_details_key"],
+    "dim_date": ["date_key"],
+}
+
+
+def _columns(conn, table):
+    """[(name, type)] of a table in column order"""
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info('{table}')").fetchall()]
+
+
+def _enum_expression(conn, table, column, current_type):
+    """Cast expression to an ENUM of the column's values, or None to keep it as-is"""
+    if current_type.startswith("ENUM"):
+        return None  # already compact
+    distinct = conn.execute(f"SELECT COUNT(DISTINCT {column}) FROM {table}").fetchone()[0]
+    if distinct > MAX_ENUM_VALUES:
+        return None
+    type_name = f"{table}_{column}_enum"
+    # Sorted values keep ORDER BY on the ENUM identical to ORDER BY on the string
+    conn.execute(f"DROP TYPE IF EXISTS {type_name}")
+    conn.execute(
+        f"CREATE TYPE {type_name} AS ENUM "
+        f"(SELECT DISTINCT CAST({column} AS VARCHAR) FROM {table} WHERE {column} IS NOT NULL ORDER BY 1)"
+    )
+    return f"CAST({column} AS {type_name}) AS {column}"
+
+
+def _integer_expression(conn, table, column, current_type, target_type):
+    """Cast expression to the narrower integer type if every value fits, else None"""
+    if current_type == target_type:
+        return None
+    low, high = INTEGER_RANGES[target_type]
+    minimum, maximum = conn.execute(f"SELECT MIN({column}), MAX({column}) FROM {table}").fetchone()
+    if minimum is not None and (minimum < low or maximum > high):
+        return None
+    return f"CAST({column} AS {target_type}) AS {column}"
+
+
+def compact_table(conn, table):
+    """Rewrite one table with ENUMs, narrow integers and its sort order
+
+    Returns {column: new type} for the columns that changed.
+    """
+    enum_columns = set(ENUM_COLUMNS.get(table, []))
+    integer_types = INTEGER_TYPES.get(table, {})
+    restored_types = RESTORED_TYPES.get(table, {})
+    expressions, changed = [], {}
+    for column, current_type in _columns(conn, table):
+        expression = None
+        if column in enum_columns:
+            expression = _enum_expression(conn, table, column, current_type)
+        elif column in integer_types:
+            expression = _integer_expression(conn, table, column, current_type, integer_types[column])
+        elif column in restored_types and current_type in ("TINYINT", "SMALLINT"):
+            expression = f"CAST({column} AS {restored_types[column]}) AS {column}"
+        if expression is None:
+            expressions.append(column)
+        else:
+            expressions.append(expression)
+            changed[column] = expression.split(" AS ")[1].rstrip(")")
+    order_by = ", ".join(SORT_ORDER.get(table, [])) or "ALL"
+    conn.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT {', '.join(expressions)} FROM {table} ORDER BY {order_by}")
+    return changed
+
+
+def apply_compact_layout(conn):
+    """Compact every star-schema table; returns {table: {column: new type}}"""
+    changes = {}
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        for table in SORT_ORDER:
+            changes[table] = compact_table(conn, table)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("CHECKPOINT")
+    return changes
+
+
+# ==============================================================================
+# MEASUREMENT
+# ==============================================================================
+
+def table_storage_bytes(conn, tables=tuple(SORT_ORDER)):
+    """Bytes of storage blocks used by each table (after a checkpoint)"""
+    conn.execute("CHECKPOINT")
+    block_size = conn.execute("SELECT block_size FROM pragma_database_size()").fetchone()[0]
+    sizes = {}
+    for table in tables:
+        blocks = conn.execute(
+            f"SELECT COUNT(DISTINCT block_id) FROM pragma_storage_info('{table}') WHERE block_id >= 0"
+        ).fetchone()[0]
+        sizes[table] = blocks * block_size
+    return sizes
+
+
+def load_ground_truth_queries(path=TEST_CASES_PATH):
+    """[(test case name, SQL)] from the ground-truth test case file"""
+    with open(path, "r", encoding="utf-8") as f:
+        cases = json.load(f)["test_cases"]
+    return [(case["name"], case["ground_truth_sql"]) for case in cases]
+
+
+def benchmark_ground_truth(conn, queries=None, repeat=5):
+    """Time each ground-truth query: {name: (first run ms, median of `repeat` warm runs ms)}"""
+    queries = load_ground_truth_queries() if queries is None else queries
+    timings = {}
+    for name, sql in queries:
+        runs = []
+        for _ in range(repeat + 1):
+            started = time.perf_counter()
+            conn.execute(sql).fetchall()
+            runs.append((time.perf_counter() - started) * 1000)
+        timings[name] = (runs[0], statistics.median(runs[1:]))
+    return timings
+
+
+def print_comparison(before, after, sizes_before=None, sizes_after=None):
+    """Print a before/after table of query timings and table sizes"""
+    print(f"{'Query':55s} {'before ms':>10s} {'after ms':>10s} {'speedup':>8s}")
+    for name, (_, warm_before) in before.items():
+        warm_after = after[name][1]
+        print(f"{name[:55]:55s} {warm_before:10.2f} {warm_after:10.2f} {warm_before / warm_after:7.2f}x")
+    total_before = sum(t for _, t in before.values())
+    total_after = sum(t for _, t in after.values())
+    print(f"{'TOTAL':55s} {total_before:10.2f} {total_after:10.2f} {total_before / total_after:7.2f}x")
+
+    if sizes_before and sizes_after:
+        print(f"\n{'Table':55s} {'before KB':>10s} {'after KB':>10s}")
+        for table, size in sizes_before.items():
+            print(f"{table:55s} {size / 1024:10.0f} {sizes_after[table] / 1024:10.0f}")
+
+
+def main(db_path=DEFAULT_DB_PATH):
+    conn = duckdb.connect(str(db_path))
+    try:
+        sizes_before = table_storage_bytes(conn)
+        before = benchmark_ground_truth(conn)
+        started = time.perf_counter()
+        changes = apply_compact_layout(conn)
+        print(f"Layout applied in {time.perf_counter() - started:.2f}s")
+        for table, columns in changes.items():
+            if columns:
+                print(f"  {table}: " + ", ".join(f"{c} -> {t}" for c, t in columns.items()))
+        if conn.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'rollup_catalog'").fetchone()[0]:
+            # Rebuild the rollups so they pick up the new column types
+            from rollups import build_rollups
+            build_rollups(conn)
+        sizes_after = table_storage_bytes(conn)
+        after = benchmark_ground_truth(conn)
+        print()
+        print_comparison(before, after, sizes_before, sizes_after)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH)
@@ -0,0 +1,51 @@
+import ollama_client
+from llm_scheduler import LLMScheduler
+
+ANSWER = "```sql\nSELECT COUNT(*) FROM fact_animal_outcome;\n```"
+
+
+class StubClient:
+    """Stands in for OllamaClient: streams a canned answer and records the call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def prime_prefix(self, prefix, version, timeout=300):
+        return None
+
+    def generate(self, prompt, temperature, timeout=60, stream=True, stop_when=None, on_token=None,
+                 context=None, raw=False, stats=None):
+        self.calls.append({"stream": stream, "on_token": on_token})
+        if on_token is not None:
+            on_token(ANSWER)
+        return ANSWER
+
+
+def test_submit_passes_stream_to_fn():
+    scheduler = LLMScheduler()
+    for stream in (True, False):
+        client = StubClient()
+        flight = scheduler.submit(
+            ("sql", stream), ollama_client.mistral_text_to_sql,
+            client, "How many outcomes?", "system prompt", timeout=5, stream=stream, stats={}
+        )
+        assert flight.result(timeout=5) == "SELECT COUNT(*) FROM fact_animal_outcome;"
+        assert client.calls == [{"stream": stream, "on_token": None}], client.calls
+    print("✓ stream reaches mistral_text_to_sql unchanged")
+
+
+def test_track_partial():
+    scheduler = LLMScheduler()
+    client = StubClient()
+    flight = scheduler.submit(
+        "sql", ollama_client.mistral_text_to_sql,
+        client, "How many outcomes?", "system prompt", stream=True, track_partial=True
+    )
+    assert flight.result(timeout=5) == "SELECT COUNT(*) FROM fact_animal_outcome;"
+    assert flight.partial == ANSWER
+    print("✓ track_partial feeds flight.partial through on_token")
+
+
+if __name__ == "__main__":
+    test_submit_passes_stream_to_fn()
+    test_track_partial()
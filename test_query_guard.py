@@ -0,0 +1,71 @@
+import duckdb
+
+from query_executor import GuardedExecutor, QueryRejectedError
+
+# Same sizes as the real star schema: 172,044 facts and ~4,000 calendar days
+FACT_ROWS = 172_044
+DATE_ROWS = 4_000
+
+EXPLOSIVE_QUERIES = {
+    "cross join": "SELECT COUNT(*) FROM fact_animal_outcome f, dim_date d",
+    "OR join on both date keys": """
+        SELECT COUNT(*) FROM fact_animal_outcome f
+        JOIN dim_date d ON f.outcome_date_key = d.date_key OR f.intake_date_key = d.date_key
+    """,
+    "inequality join": """
+        SELECT COUNT(*) FROM fact_animal_outcome f
+        JOIN dim_date d ON f.outcome_date_key < d.date_key
+    """,
+}
+
+SAFE_QUERIES = {
+    "key join": """
+        SELECT d.year, COUNT(*) FROM fact_animal_outcome f
+        JOIN dim_date d ON f.outcome_date_key = d.date_key
+        GROUP BY d.year
+    """,
+    "window total": "SELECT COUNT(*), SUM(COUNT(*)) OVER () FROM fact_animal_outcome",
+}
+
+
+def create_star(conn):
+    conn.execute(f"""
+        CREATE TABLE dim_date AS
+        SELECT CAST(strftime(DATE '2013-10-01' + CAST(i AS INTEGER), '%Y%m%d') AS INTEGER) AS date_key,
+               year(DATE '2013-10-01' + CAST(i AS INTEGER)) AS year
+        FROM range({DATE_ROWS}) t(i)
+    """)
+    conn.execute(f"""
+        CREATE TABLE fact_animal_outcome AS
+        SELECT i AS fact_id,
+               CAST(strftime(DATE '2013-10-01' + CAST(i % {DATE_ROWS} AS INTEGER), '%Y%m%d') AS INTEGER) AS outcome_date_key,
+               CAST(strftime(DATE '2013-10-01' + CAST((i * 7) % {DATE_ROWS} AS INTEGER), '%Y%m%d') AS INTEGER) AS intake_date_key
+        FROM range({FACT_ROWS}) t(i)
+    """)
+
+
+def test_query_guard():
+    conn = duckdb.connect()
+    create_star(conn)
+    executor = GuardedExecutor()
+
+    failures = []
+    for name, sql in EXPLOSIVE_QUERIES.items():
+        try:
+            executor.check_plan(conn, sql)
+            failures.append(f"{name}: not rejected")
+        except QueryRejectedError as e:
+            print(f"✓ {name} rejected: {e}")
+    for name, sql in SAFE_QUERIES.items():
+        try:
+            executor.check_plan(conn, sql)
+            print(f"✓ {name} allowed")
+        except QueryRejectedError as e:
+            failures.append(f"{name}: rejected ({e})")
+
+    conn.close()
+    assert not failures, "; ".join(failures)
+
+
+if __name__ == "__main__":
+    test_query_guard()
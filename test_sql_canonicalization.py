@@ -0,0 +1,21 @@
+from result_cache import canonicalize_sql, sql_hash
+
+
+def test_sql_canonicalization():
+    # Formatting, keyword case, comments and trailing semicolons do not change the key
+    assert sql_hash("SELECT *\n  FROM t -- all rows\nWHERE x = 1;") == sql_hash("select * from t where x = 1")
+    assert sql_hash("SELECT /* note */ 1") == sql_hash("SELECT 1")
+
+    # Comment markers inside literals are part of the value
+    assert sql_hash("SELECT * FROM t WHERE name = 'a--b'") != sql_hash("SELECT * FROM t WHERE name = 'a'")
+    assert sql_hash("SELECT * FROM t WHERE name = 'a /* b */ c'") != sql_hash("SELECT * FROM t WHERE name = 'a  c'")
+    assert canonicalize_sql("SELECT 'x -- y' -- comment") == "select 'x -- y'"
+
+    # Literal case and spacing matter
+    assert sql_hash("SELECT * FROM t WHERE name = 'Dog'") != sql_hash("SELECT * FROM t WHERE name = 'dog'")
+    assert sql_hash("SELECT 'a  b'") != sql_hash("SELECT 'a b'")
+    print("✓ SQL canonicalization keeps literals intact")
+
+
+if __name__ == "__main__":
+    test_sql_canonicalization()
@@ -0,0 +1,48 @@
+import duckdb
+
+from star_layout import compact_table
+
+# Arithmetic generated SQL does on measures, flags and date parts; each
+# overflowed once these columns were stored as TINYINT/SMALLINT
+ARITHMETIC = [
+    "SELECT MAX(age_at_outcome_years * 12) FROM fact_animal_outcome",
+    "SELECT MAX(days_in_shelter * 100) FROM fact_animal_outcome",
+    "SELECT MAX(year * 100 + month) FROM dim_date",
+    "SELECT SUM(is_live_outcome * 1000) FROM dim_outcome_type",
+]
+
+
+def create_tables(conn):
+    conn.execute("""
+        CREATE TABLE fact_animal_outcome AS
+        SELECT CAST(i AS BIGINT) AS fact_id, CAST(20200101 + i AS BIGINT) AS outcome_date_key,
+               CAST(i * 5 AS BIGINT) AS days_in_shelter, CAST(i AS BIGINT) AS age_at_outcome_years
+        FROM range(1, 21) t(i)
+    """)
+    conn.execute("""
+        CREATE TABLE dim_date AS
+        SELECT CAST(20200101 + i AS BIGINT) AS date_key, CAST(2020 AS BIGINT) AS year,
+               CAST(1 AS BIGINT) AS month, CAST(i % 7 >= 5 AS BIGINT) AS is_weekend
+        FROM range(1, 21) t(i)
+    """)
+    conn.execute("""
+        CREATE TABLE dim_outcome_type AS
+        SELECT CAST(i AS BIGINT) AS outcome_key, 1 AS is_live_outcome FROM range(1, 101) t(i)
+    """)
+
+
+def test_compact_layout_keeps_arithmetic_working():
+    conn = duckdb.connect()
+    create_tables(conn)
+    for table in ["fact_animal_outcome", "dim_date", "dim_outcome_type"]:
+        compact_table(conn, table)
+    for sql in ARITHMETIC:
+        conn.execute(sql).fetchone()  # raises on overflow
+    key_type = conn.execute("SELECT typeof(fact_id) FROM fact_animal_outcome LIMIT 1").fetchone()[0]
+    assert key_type == "INTEGER", key_type
+    conn.close()
+    print("✓ Compacted measures, flags and date parts survive arithmetic; keys are INTEGER")
+
+
+if __name__ == "__main__":
+    test_compact_layout_keeps_arithmetic_working()
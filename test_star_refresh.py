@@ -0,0 +1,110 @@
+import duckdb
+
+from feature_pipeline import run_pipeline
+from rollups import ROLLUP_DEFINITIONS, RollupRouter, build_rollups, rollup_select_sql
+from star_build import DIMENSIONS, build_star_schema, foreign_key_violations, refresh_star_schema
+from star_layout import apply_compact_layout
+
+INTAKES = [
+    ("A1", "2020-01-01 09:00", "Stray", "Normal"),
+    ("A2", "2020-01-05 09:00", "Owner Surrender", "Injured"),
+    ("A3", "2020-02-01 09:00", "Stray", "Normal"),
+    ("A4", "2021-03-01 09:00", "Stray", "Sick"),
+    ("A5", "2021-03-02 09:00", "Public Assist", "Normal"),
+]
+
+OUTCOMES = [
+    ("A1", "2020-01-10 12:00", "Adoption", "Dog", "Neutered Male", "Labrador Retriever Mix"),
+    ("A2", "2020-01-20 12:00", "Transfer", "Cat", "Spayed Female", "Domestic Shorthair"),
+    ("A3", "2020-02-03 12:00", "Adoption", "Dog", "Intact Female", "Beagle/Dachshund"),
+]
+
+# Loaded after the first build; the later outcome comes first in the raw table
+NEW_OUTCOMES = [
+    ("A5", "2021-03-20 12:00", "Foster Program", "Dog", "Intact Male", "Border Collie"),
+    ("A4", "2021-03-10 12:00", "Return to Owner", "Bird", "Unknown", "Parakeet"),
+]
+
+
+def insert_outcomes(conn, rows):
+    for animal_id, when, outcome, animal_type, sex, breed in rows:
+        conn.execute(
+            "INSERT INTO raw_animal_outcomes VALUES (?, 'Name', ?, 'x', DATE '2018-06-01', ?, NULL, ?, ?, '2 years', ?, 'Black')",
+            [animal_id, when, outcome, animal_type, sex, breed]
+        )
+
+
+def create_raw_tables(conn):
+    conn.execute("""
+        CREATE TABLE raw_animal_intakes ("Animal ID" VARCHAR, "DateTime" TIMESTAMP,
+                                         "Intake Type" VARCHAR, "Intake Condition" VARCHAR)
+    """)
+    conn.executemany("INSERT INTO raw_animal_intakes VALUES (?, ?, ?, ?)", INTAKES)
+    conn.execute("""
+        CREATE TABLE raw_animal_outcomes ("Animal ID" VARCHAR, "Name" VARCHAR, "DateTime" TIMESTAMP,
+            "MonthYear" VARCHAR, "Date of Birth" DATE, "Outcome Type" VARCHAR, "Outcome Subtype" VARCHAR,
+            "Animal Type" VARCHAR, "Sex upon Outcome" VARCHAR, "Age upon Outcome" VARCHAR,
+            "Breed" VARCHAR, "Color" VARCHAR)
+    """)
+    insert_outcomes(conn, OUTCOMES)
+
+
+def full_build(conn):
+    run_pipeline(conn)
+    build_star_schema(conn)
+    apply_compact_layout(conn)
+    build_rollups(conn)
+
+
+def dimension_keys(conn):
+    """{dimension: {member: key}}"""
+    keys = {}
+    for table, (key, columns) in DIMENSIONS.items():
+        selected = ", ".join(f"CAST({dst} AS VARCHAR)" for _, dst in columns)
+        keys[table] = {tuple(row[1:]): row[0] for row in conn.execute(f"SELECT {key}, {selected} FROM {table}").fetchall()}
+    return keys
+
+
+def stale_rollups(conn):
+    """Rollups whose groups differ from a fresh aggregation of the fact table"""
+    stale = []
+    for name in ROLLUP_DEFINITIONS:
+        fresh = f"SELECT * FROM ({rollup_select_sql(name)})"
+        differing = conn.execute(f"""
+            SELECT COUNT(*) FROM (
+                (SELECT * FROM {name} EXCEPT ALL {fresh})
+                UNION ALL
+                ({fresh} EXCEPT ALL SELECT * FROM {name})
+            )
+        """).fetchone()[0]
+        if differing:
+            stale.append(name)
+    return stale
+
+
+def test_star_refresh():
+    conn = duckdb.connect()
+    create_raw_tables(conn)
+    full_build(conn)
+    keys_before = dimension_keys(conn)
+
+    insert_outcomes(conn, NEW_OUTCOMES)
+    added = refresh_star_schema(conn)
+    assert added["fact_animal_outcome"][0] == len(NEW_OUTCOMES), added
+    assert refresh_star_schema(conn) == {}, "second refresh found rows again"
+    assert not any(foreign_key_violations(conn).values()), foreign_key_violations(conn)
+    assert stale_rollups(conn) == [], stale_rollups(conn)
+    assert RollupRouter(conn).enabled, "router distrusts the merged rollups"
+    keys_refreshed = dimension_keys(conn)
+    for table, members in keys_before.items():
+        assert all(keys_refreshed[table][member] == key for member, key in members.items()), table
+    print("✓ Refresh appends the new outcomes, keeps existing keys and merges the rollups")
+
+    full_build(conn)
+    assert dimension_keys(conn) == keys_refreshed, "full build renumbered refreshed members"
+    print("✓ A full build after the refresh keeps every dimension key")
+    conn.close()
+
+
+if __name__ == "__main__":
+    test_star_refresh()